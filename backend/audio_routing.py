@@ -0,0 +1,588 @@
+"""
+Audio Routing Module
+Virtual audio device over named pipes or UNIX sockets carrying raw PCM
+
+The device reads mono PCM from a source endpoint, runs it through the
+processing chain block by block and writes the result to a sink endpoint:
+
+    source reader thread -> input ring -> DSP thread -> output ring -> sink thread
+
+Endpoints are `fifo:/path` (created if missing; the same kind of FIFO that
+PulseAudio/PipeWire pipe sources and sinks use) or `unix:/path` (the device
+listens and serves one client at a time; giving the same socket for source
+and sink makes one duplex connection). Samples are `s16le` or `f32le`.
+
+The rings are single-producer/single-consumer: each index has one writer
+thread, so no lock guards the audio. The sink is clocked at the sample rate
+like a hardware device: it starts once PREFILL_BLOCKS are buffered, takes one
+block per period and counts an underrun (and plays silence) when the DSP
+thread has not delivered it. The DSP thread asks for SCHED_FIFO priority
+where the OS allows it.
+"""
+
+import logging
+import os
+import select
+import socket
+import stat
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE
+from processing_state import ProcessingState
+
+VIRTUAL_DEVICE_SOURCE = os.environ.get('VIRTUAL_DEVICE_SOURCE', 'fifo:/tmp/voice-processor.in')
+VIRTUAL_DEVICE_SINK = os.environ.get('VIRTUAL_DEVICE_SINK', 'fifo:/tmp/voice-processor.out')
+VIRTUAL_DEVICE_FORMAT = os.environ.get('VIRTUAL_DEVICE_FORMAT', 's16le')
+VIRTUAL_DEVICE_RATE = int(os.environ.get('VIRTUAL_DEVICE_RATE', 16000))
+VIRTUAL_DEVICE_BLOCK = int(os.environ.get('VIRTUAL_DEVICE_BLOCK', 1024))  # samples per DSP block and sink period
+VIRTUAL_DEVICE_RT_PRIORITY = int(os.environ.get('VIRTUAL_DEVICE_RT_PRIORITY', 10))  # 0 leaves the DSP thread as is
+PREFILL_BLOCKS = 2  # output blocks buffered before the sink clock starts
+RING_SECONDS = 2.0
+LATENCY_WINDOW = 500  # recent blocks kept for latency percentiles
+
+SAMPLE_FORMATS = {'s16le': np.dtype('<i2'), 'f32le': np.dtype('<f4')}
+ROUTING_AVAILABLE = hasattr(os, 'mkfifo') and hasattr(socket, 'AF_UNIX')
+
+# process_fn(block, settings, state) -> processed block
+ProcessFn = Callable[[np.ndarray, object, ProcessingState], np.ndarray]
+
+
+class RingBuffer:
+    """Single-producer/single-consumer float32 ring
+
+    `write` is only called from one thread and `read_into` from one other.
+    Each side publishes its index after copying, and an int assignment is
+    atomic, so the reader never sees samples that are not written yet.
+    """
+
+    def __init__(self, capacity: int):
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.capacity = size
+        self._mask = size - 1
+        self._buffer = np.zeros(size, dtype=AUDIO_DTYPE)
+        self._write = 0  # total samples written; only the producer assigns it
+        self._read = 0  # total samples read; only the consumer assigns it
+        self.overflows = 0  # samples the producer had to drop
+
+    @property
+    def available(self) -> int:
+        return self._write - self._read
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.available
+
+    @property
+    def write_index(self) -> int:
+        return self._write
+
+    @property
+    def read_index(self) -> int:
+        return self._read
+
+    def write(self, samples: np.ndarray) -> int:
+        """Append as many samples as fit; the rest are dropped and counted"""
+        count = min(len(samples), self.free)
+        self.overflows += len(samples) - count
+        start = self._write & self._mask
+        first = min(count, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:count - first] = samples[first:count]
+        self._write += count
+        return count
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Fill `out` from the oldest samples; returns how many were available"""
+        count = min(len(out), self.available)
+        start = self._read & self._mask
+        first = min(count, self.capacity - start)
+        out[:first] = self._buffer[start:start + first]
+        out[first:count] = self._buffer[:count - first]
+        self._read += count
+        return count
+
+
+def _parse_spec(spec: str) -> Tuple[str, str]:
+    kind, _, path = spec.partition(':')
+    if not path:
+        return 'fifo', spec
+    if kind not in ('fifo', 'unix'):
+        raise ValueError(f"Unknown endpoint kind '{kind}' in '{spec}' (use fifo: or unix:)")
+    return kind, path
+
+
+def _ensure_fifo(path: str):
+    if os.path.exists(path):
+        if not stat.S_ISFIFO(os.stat(path).st_mode):
+            raise ValueError(f"{path} exists and is not a FIFO")
+        return
+    os.mkfifo(path, 0o660)
+
+
+class UnixSocketLink:
+    """Listening UNIX socket serving one client at a time
+
+    Shared by the source and sink when both name the same path, so the
+    client sends PCM and receives the processed PCM on one connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen(1)
+        self._listener.setblocking(False)
+        self._connection: Optional[socket.socket] = None
+        self._lock = threading.Lock()  # accept/drop only; audio never waits on it
+
+    def connection(self) -> Optional[socket.socket]:
+        with self._lock:
+            if self._connection is None:
+                try:
+                    self._connection, _ = self._listener.accept()
+                    self._connection.setblocking(False)
+                except BlockingIOError:
+                    return None
+            return self._connection
+
+    def drop(self, connection: socket.socket):
+        with self._lock:
+            if self._connection is connection:
+                self._connection = None
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        self._listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class PcmSource:
+    """Reads raw PCM bytes from a FIFO or a UNIX socket client"""
+
+    def __init__(self, kind: str, path: str, link: Optional[UnixSocketLink] = None):
+        self.kind = kind
+        self.path = path
+        self.link = link
+        self.connected = False
+        self._fd: Optional[int] = None
+        if kind == 'fifo':
+            _ensure_fifo(path)
+            # Non-blocking so opening never waits for a writer
+            self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+
+    def read(self, size: int, timeout: float) -> bytes:
+        """Up to `size` bytes, or b'' if nothing arrived within `timeout`"""
+        if self.kind == 'fifo':
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return b''
+            data = os.read(self._fd, size)
+            self.connected = bool(data)
+            if not data:
+                # No writer: a FIFO reads as end-of-file until one connects
+                time.sleep(timeout)
+            return data
+
+        connection = self.link.connection()
+        if connection is None:
+            self.connected = False
+            time.sleep(timeout)
+            return b''
+        ready, _, _ = select.select([connection], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            data = connection.recv(size)
+        except (BlockingIOError, InterruptedError):
+            return b''
+        except OSError:
+            data = b''
+        self.connected = bool(data)
+        if not data:
+            self.link.drop(connection)
+        return data
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class PcmSink:
+    """Writes raw PCM bytes to a FIFO reader or a UNIX socket client"""
+
+    def __init__(self, kind: str, path: str, link: Optional[UnixSocketLink] = None):
+        self.kind = kind
+        self.path = path
+        self.link = link
+        self._fd: Optional[int] = None
+        if kind == 'fifo':
+            _ensure_fifo(path)
+
+    @property
+    def connected(self) -> bool:
+        if self.kind == 'fifo':
+            return self._fd is not None
+        return self.link.connection() is not None
+
+    def _fifo_fd(self) -> Optional[int]:
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # ENXIO: no reader has the FIFO open yet
+                return None
+        return self._fd
+
+    def write(self, data: bytes, timeout: float) -> Optional[int]:
+        """Bytes written within `timeout`, or None when no reader is connected"""
+        if self.kind == 'fifo':
+            fd = self._fifo_fd()
+            if fd is None:
+                return None
+            _, ready, _ = select.select([], [fd], [], timeout)
+            if not ready:
+                return 0
+            try:
+                return os.write(fd, data)
+            except BlockingIOError:
+                return 0
+            except OSError:
+                # EPIPE: the reader went away
+                os.close(fd)
+                self._fd = None
+                return None
+
+        connection = self.link.connection()
+        if connection is None:
+            return None
+        _, ready, _ = select.select([], [connection], [], timeout)
+        if not ready:
+            return 0
+        try:
+            return connection.send(data)
+        except BlockingIOError:
+            return 0
+        except OSError:
+            self.link.drop(connection)
+            return None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class RoutingMetrics:
+    """Counters and recent timings of one running device"""
+
+    def __init__(self):
+        self.blocks_processed = 0
+        self.underruns = 0
+        self.output_overflows = 0  # processed blocks dropped because the output ring was full
+        self.sink_dropped_bytes = 0  # bytes the sink reader did not take in time
+        self.dsp_seconds: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.realtime_priority = False
+        self.gain_latency = 0  # lookahead of the session's gain stage, samples
+        self.vad = None  # the session's StreamingVAD, once the chain has created it
+
+
+class PipeAudioDevice:
+    """Virtual audio device routing PCM between pipe/socket endpoints through the DSP chain
+
+    Exposes the same start/stop/get_status interface as the simulated devices.
+    The device owns its endpoints, so it only runs in the worker that started it.
+    """
+
+    exclusive = True
+
+    def __init__(self, process_fn: Optional[ProcessFn] = None, source: str = VIRTUAL_DEVICE_SOURCE,
+                 sink: str = VIRTUAL_DEVICE_SINK, sample_format: str = VIRTUAL_DEVICE_FORMAT,
+                 sample_rate: int = VIRTUAL_DEVICE_RATE, block_size: int = VIRTUAL_DEVICE_BLOCK):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format '{sample_format}' (use {', '.join(SAMPLE_FORMATS)})")
+        self.process_fn = process_fn
+        self.source_spec = source
+        self.sink_spec = sink
+        self.sample_dtype = SAMPLE_FORMATS[sample_format]
+        self.sample_format = sample_format
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.settings = None  # processing settings; None passes audio through
+        self.is_active = False
+        self.input_device = None
+        self.output_device = None
+        self.processing_enabled = False
+        self.metrics = RoutingMetrics()
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._input_ready = threading.Event()
+        self._source: Optional[PcmSource] = None
+        self._sink: Optional[PcmSink] = None
+        self._links: Dict[str, UnixSocketLink] = {}
+        self._input: Optional[RingBuffer] = None
+        self._output: Optional[RingBuffer] = None
+        # (input sample index, arrival time) per read, and (output sample index, arrival time) per block
+        self._arrivals: Deque[Tuple[int, float]] = deque()
+        self._stamps: Deque[Tuple[int, float]] = deque()
+
+    def list_devices(self) -> List[dict]:
+        return [
+            {'device_id': 0, 'name': f"PCM source ({self.source_spec})", 'channels': 1,
+             'is_input': True, 'is_output': False},
+            {'device_id': 1, 'name': f"PCM sink ({self.sink_spec})", 'channels': 1,
+             'is_input': False, 'is_output': True},
+        ]
+
+    def update_settings(self, settings):
+        """Swap the processing settings; the DSP thread picks them up at its next block"""
+        self.settings = settings
+
+    def _endpoint(self, spec: str, direction: str):
+        kind, path = _parse_spec(spec)
+        link = None
+        if kind == 'unix':
+            link = self._links.get(path)
+            if link is None:
+                link = self._links[path] = UnixSocketLink(path)
+        return (PcmSource if direction == 'source' else PcmSink)(kind, path, link)
+
+    def start_virtual_device(self, input_device_id: Optional[int] = None,
+                             output_device_id: Optional[int] = None) -> bool:
+        """Open the endpoints and start the I/O and DSP threads"""
+        if self.is_active:
+            return True
+        if input_device_id not in (None, 0) or output_device_id not in (None, 1):
+            logging.warning(f"Unknown virtual device ids ({input_device_id}, {output_device_id}); "
+                            f"using {self.source_spec} -> {self.sink_spec}")
+        try:
+            self._source = self._endpoint(self.source_spec, 'source')
+            self._sink = self._endpoint(self.sink_spec, 'sink')
+        except (OSError, ValueError) as e:
+            logging.error(f"Error opening virtual device endpoints: {e}")
+            self._close_endpoints()
+            return False
+
+        capacity = int(RING_SECONDS * self.sample_rate)
+        self._input = RingBuffer(capacity)
+        self._output = RingBuffer(capacity)
+        self._arrivals.clear()
+        self._stamps.clear()
+        self.metrics = RoutingMetrics()
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._source_loop, name='virtual-device-source', daemon=True),
+            threading.Thread(target=self._dsp_loop, name='virtual-device-dsp', daemon=True),
+            threading.Thread(target=self._sink_loop, name='virtual-device-sink', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+        self.input_device = 0
+        self.output_device = 1
+        self.is_active = True
+        self.processing_enabled = True
+        logging.info(f"Virtual audio device routing {self.source_spec} -> {self.sink_spec} "
+                     f"({self.sample_format}, {self.sample_rate} Hz, {self.block_size}-sample blocks)")
+        return True
+
+    def stop_virtual_device(self):
+        """Stop the threads and close the endpoints"""
+        self._stop.set()
+        self._input_ready.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+        self._close_endpoints()
+        self.is_active = False
+        self.processing_enabled = False
+        logging.info("Virtual audio device stopped")
+
+    def _close_endpoints(self):
+        for endpoint in (self._source, self._sink):
+            if endpoint is not None:
+                endpoint.close()
+        for link in self._links.values():
+            link.close()
+        self._source = self._sink = None
+        self._links = {}
+
+    def _source_loop(self):
+        """I/O thread: decode incoming PCM into the input ring"""
+        sample_bytes = self.sample_dtype.itemsize
+        remainder = b''
+        while not self._stop.is_set():
+            data = self._source.read(self.block_size * sample_bytes, timeout=0.05)
+            if not data:
+                continue
+            data = remainder + data
+            usable = len(data) - len(data) % sample_bytes
+            remainder = data[usable:]
+            samples = np.frombuffer(data[:usable], dtype=self.sample_dtype)
+            if self.sample_dtype.kind == 'i':
+                samples = samples.astype(AUDIO_DTYPE) / AUDIO_DTYPE(32768.0)
+            self._input.write(samples)
+            self._arrivals.append((self._input.write_index, time.monotonic()))
+            self._input_ready.set()
+
+    def _arrival_time(self, index: int) -> float:
+        """When the input sample at `index` arrived (the read that delivered it)"""
+        while self._arrivals and self._arrivals[0][0] <= index:
+            self._arrivals.popleft()
+        return self._arrivals[0][1] if self._arrivals else time.monotonic()
+
+    def _request_realtime(self):
+        if VIRTUAL_DEVICE_RT_PRIORITY <= 0:
+            return
+        try:
+            # pid 0 is the calling thread on Linux
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(VIRTUAL_DEVICE_RT_PRIORITY))
+            self.metrics.realtime_priority = True
+        except (AttributeError, OSError) as e:
+            logging.info(f"Virtual device DSP thread runs without real-time priority: {e}")
+
+    def _dsp_loop(self):
+        """DSP thread: process whole blocks from the input ring into the output ring"""
+        self._request_realtime()
+        state = ProcessingState(self.sample_rate, streaming=True, chunk_size=self.block_size)
+        block = np.empty(self.block_size, dtype=AUDIO_DTYPE)
+        while not self._stop.is_set():
+            if self._input.available < self.block_size:
+                self._input_ready.wait(timeout=0.1)
+                self._input_ready.clear()
+                continue
+            arrived = self._arrival_time(self._input.read_index)
+            self._input.read_into(block)
+
+            started = time.perf_counter()
+            processed = block
+            settings = self.settings
+            if settings is not None and self.process_fn is not None:
+                try:
+                    processed = np.asarray(self.process_fn(block, settings, state), dtype=AUDIO_DTYPE)
+                except Exception as e:
+                    logging.error(f"Virtual device processing error: {e}")
+                    processed = block
+                if len(processed) != self.block_size:
+                    processed = np.resize(processed, self.block_size)
+            self.metrics.dsp_seconds.append(time.perf_counter() - started)
+            self.metrics.blocks_processed += 1
+            if state.gain_stage is not None:
+                self.metrics.gain_latency = state.gain_stage.latency
+            self.metrics.vad = state.vad
+
+            # Whole blocks only, so output blocks stay aligned with their stamps
+            if self._output.free < self.block_size:
+                self.metrics.output_overflows += 1
+                continue
+            self._stamps.append((self._output.write_index, arrived))
+            self._output.write(processed)
+
+    def _encode(self, samples: np.ndarray) -> bytes:
+        if self.sample_dtype.kind == 'i':
+            return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(self.sample_dtype).tobytes()
+        return samples.astype(self.sample_dtype).tobytes()
+
+    def _sink_loop(self):
+        """I/O thread: take one block per period from the output ring, like a device clock"""
+        period = self.block_size / self.sample_rate
+        block = np.empty(self.block_size, dtype=AUDIO_DTYPE)
+        pending = b''
+        max_pending = PREFILL_BLOCKS * self.block_size * self.sample_dtype.itemsize
+        running = False
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            next_tick += period
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif delay < -PREFILL_BLOCKS * period:
+                next_tick = time.monotonic()  # fell far behind: resync the clock
+
+            if not running:
+                running = self._output.available >= PREFILL_BLOCKS * self.block_size
+                if not running:
+                    continue
+
+            start_index = self._output.read_index
+            count = self._output.read_into(block)
+            if count < self.block_size:
+                self.metrics.underruns += 1
+                block[count:] = 0.0
+                running = False  # rebuild the prefill before resuming
+            while self._stamps and self._stamps[0][0] < start_index:
+                self._stamps.popleft()
+            if count and self._stamps and self._stamps[0][0] == start_index:
+                self.metrics.latencies.append(time.monotonic() - self._stamps.popleft()[1])
+
+            pending += self._encode(block)
+            if len(pending) > max_pending:
+                dropped = len(pending) - max_pending
+                dropped -= dropped % self.sample_dtype.itemsize
+                self.metrics.sink_dropped_bytes += dropped
+                pending = pending[dropped:]
+            written = self._sink.write(pending, timeout=period / 4)
+            if written is None:
+                pending = b''  # no consumer: the device still runs on its own clock
+            else:
+                pending = pending[written:]
+
+    def get_status(self) -> dict:
+        """Device status with measured buffer fill, underruns and latency"""
+        status = {
+            'active': self.is_active,
+            'input_device': self.input_device,
+            'output_device': self.output_device,
+            'processing_enabled': self.processing_enabled,
+        }
+        if not self.is_active:
+            return status
+
+        metrics = self.metrics
+        to_ms = 1000.0 / self.sample_rate
+        period_ms = self.block_size * to_ms
+        dsp_ms = [seconds * 1000.0 for seconds in list(metrics.dsp_seconds)]
+        latencies_ms = [seconds * 1000.0 for seconds in list(metrics.latencies)]
+        status['metrics'] = {
+            'source': self.source_spec,
+            'sink': self.sink_spec,
+            'format': self.sample_format,
+            'sample_rate': self.sample_rate,
+            'block_size': self.block_size,
+            'source_connected': self._source.connected if self._source else False,
+            'sink_connected': self._sink.connected if self._sink else False,
+            'realtime_priority': metrics.realtime_priority,
+            'input_fill_ms': self._input.available * to_ms,
+            'output_fill_ms': self._output.available * to_ms,
+            'ring_capacity_ms': self._input.capacity * to_ms,
+            'blocks_processed': metrics.blocks_processed,
+            'underruns': metrics.underruns,
+            'input_overflow_samples': self._input.overflows,
+            'output_overflow_blocks': metrics.output_overflows,
+            'sink_dropped_bytes': metrics.sink_dropped_bytes,
+            'dsp_ms_mean': float(np.mean(dsp_ms)) if dsp_ms else None,
+            'dsp_ms_max': float(np.max(dsp_ms)) if dsp_ms else None,
+            'dsp_load': float(np.mean(dsp_ms)) / period_ms if dsp_ms else None,
+            'latency_ms_mean': float(np.mean(latencies_ms)) if latencies_ms else None,
+            'latency_ms_p95': float(np.percentile(latencies_ms, 95)) if latencies_ms else None,
+            'latency_ms_max': float(np.max(latencies_ms)) if latencies_ms else None,
+            # Algorithmic delay inside the chain, on top of the buffering measured above
+            'gain_latency_ms': metrics.gain_latency * to_ms,
+            'vad': metrics.vad.get_stats() if metrics.vad is not None else None,
+        }
+        return status
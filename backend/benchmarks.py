@@ -0,0 +1,433 @@
+"""
+Processing Benchmarks
+Micro-benchmarks comparing optimized processing stages against the original implementations
+
+Usage:
+    python benchmarks.py                 # run every benchmark
+    python benchmarks.py oscillator      # run selected benchmarks
+    python benchmarks.py --json          # machine-readable output
+
+`dtype_policy` also checks every stage against dtype_policy and exits
+non-zero if any stage leaves float32.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+from typing import Callable, Dict, Tuple
+
+import librosa
+import numpy as np
+
+from buffer_pool import normalize_peak
+from dtype_policy import AUDIO_DTYPE, check_audio_dtype
+from effect_tail import NUMBA_AVAILABLE, EffectTail
+from enhanced_voice_processor import AdvancedVoiceProcessor, get_voice_processor
+from live_pipeline import LivePipeline, PipelineStage
+from noise_reduction import NOISE_REDUCTION_ENGINES, create_noise_engine
+from oscillator import OscillatorBank, WavetableOscillator
+from processing_state import ProcessingState
+from segmented import get_worker_context, process_segmented
+from spectral import get_fft_workers, istft, set_fft_workers, stft
+from world_vocoder import PYWORLD_AVAILABLE, WorldAnalysisCache, shift_pitch_and_formants
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 4096
+
+
+def _time_call(func: Callable[[], object], repeats: int) -> float:
+    """Return the best per-call time in seconds over several runs"""
+    func()  # warm up caches
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        best = min(best, (time.perf_counter() - start) / repeats)
+    return best
+
+
+def synthetic_speech(duration: float = 4.0, sample_rate: int = SAMPLE_RATE,
+                     seed: int = 0) -> np.ndarray:
+    """Deterministic speech-like signal: a gliding harmonic source with vowel
+    formants and a syllabic envelope broken by pauses"""
+    rng = np.random.default_rng(seed)
+    n = int(duration * sample_rate)
+    t = np.arange(n) / sample_rate
+
+    f0 = 140 + 40 * np.sin(2 * np.pi * 0.7 * t) + 10 * rng.standard_normal()
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    source = np.zeros(n)
+    for harmonic in range(1, 30):
+        freq = harmonic * f0
+        # Vowel-like formant weighting around 700, 1200 and 2600 Hz
+        weight = sum(np.exp(-((freq - formant) / width) ** 2)
+                     for formant, width in ((700, 200), (1200, 250), (2600, 400)))
+        weight = np.where(freq < sample_rate / 2, weight + 0.05, 0.0)
+        source += weight * np.sin(harmonic * phase) / harmonic ** 0.5
+
+    # Syllables at ~4 Hz with a pause every second
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    envelope *= (t % 1.0) < 0.7
+    speech = source * envelope
+    return (0.5 * speech / np.max(np.abs(speech))).astype(np.float32)
+
+
+def add_noise(clean: np.ndarray, snr_db: float = 5.0, seed: int = 1) -> np.ndarray:
+    """Mix white and low-frequency rumble noise into a signal at the given SNR"""
+    rng = np.random.default_rng(seed)
+    white = rng.standard_normal(len(clean))
+    rumble = np.convolve(rng.standard_normal(len(clean)), np.ones(32) / 32, mode='same')
+    noise = white + 4 * rumble
+    scale = np.sqrt(np.mean(clean ** 2) / np.mean(noise ** 2) / 10 ** (snr_db / 10))
+    return (clean + scale * noise).astype(np.float32)
+
+
+def si_snr(reference: np.ndarray, estimate: np.ndarray) -> float:
+    """Scale-invariant SNR in dB, so engines that change the overall level compare fairly"""
+    n = min(len(reference), len(estimate))
+    reference = reference[:n].astype(np.float64)
+    estimate = estimate[:n].astype(np.float64)
+    target = np.dot(estimate, reference) / (np.dot(reference, reference) + 1e-12) * reference
+    error = estimate - target
+    return float(10 * np.log10(np.sum(target ** 2) / (np.sum(error ** 2) + 1e-12)))
+
+
+def bench_oscillator(chunk_size: int = CHUNK_SIZE, repeats: int = 2000) -> Dict[str, float]:
+    """Wavetable oscillator vs. rebuilding the time axis and calling np.sin per chunk"""
+    carrier_freq = 220
+
+    def sin_path():
+        t = np.arange(chunk_size) / SAMPLE_RATE
+        return np.sin(2 * np.pi * carrier_freq * t)
+
+    oscillator = WavetableOscillator(carrier_freq, SAMPLE_RATE)
+    out = np.empty(chunk_size, dtype=np.float32)
+
+    def wavetable_path():
+        return oscillator.generate(chunk_size, out=out)
+
+    def alien_sin_path():
+        t = np.arange(chunk_size) / SAMPLE_RATE
+        mod_freq = 8 + 3 * np.sin(2 * np.pi * 0.5 * t)
+        return np.sin(2 * np.pi * mod_freq * t)
+
+    lfo = WavetableOscillator(0.5, SAMPLE_RATE)
+    carrier = WavetableOscillator(8, SAMPLE_RATE)
+
+    def alien_wavetable_path():
+        return carrier.generate_fm(8 + 3 * lfo.generate(chunk_size), out=out)
+
+    sin_time = _time_call(sin_path, repeats)
+    table_time = _time_call(wavetable_path, repeats)
+    alien_sin_time = _time_call(alien_sin_path, repeats)
+    alien_table_time = _time_call(alien_wavetable_path, repeats)
+
+    return {
+        'chunk_size': chunk_size,
+        'np_sin_us': sin_time * 1e6,
+        'wavetable_us': table_time * 1e6,
+        'np_sin_msamples_per_s': chunk_size / sin_time / 1e6,
+        'wavetable_msamples_per_s': chunk_size / table_time / 1e6,
+        'alien_np_sin_us': alien_sin_time * 1e6,
+        'alien_wavetable_us': alien_table_time * 1e6,
+    }
+
+
+def _process_in_chunks(engine, audio: np.ndarray, chunk_size: int) -> Tuple[np.ndarray, float]:
+    """Feed an engine chunk by chunk like a live session; returns latency-aligned output
+    and the mean time per chunk"""
+    engine.reset()
+    outputs = []
+    start = time.perf_counter()
+    num_chunks = len(audio) // chunk_size
+    for i in range(num_chunks):
+        outputs.append(engine.process_chunk(audio[i * chunk_size:(i + 1) * chunk_size]))
+    elapsed = (time.perf_counter() - start) / max(num_chunks, 1)
+    output = np.concatenate(outputs)[engine.latency:]
+    return output, elapsed
+
+
+def bench_noise_reduction(duration: float = 8.0, snr_db: float = 5.0,
+                          chunk_size: int = CHUNK_SIZE) -> Dict[str, float]:
+    """Quality (SI-SNR on synthetic noisy speech) and speed of every noise reduction engine"""
+    clean = synthetic_speech(duration)
+    noisy = add_noise(clean, snr_db)
+    results = {'input_si_snr_db': si_snr(clean, noisy)}
+
+    for name in NOISE_REDUCTION_ENGINES:
+        engine = create_noise_engine(name, SAMPLE_RATE)
+
+        start = time.perf_counter()
+        batch_output = engine.process(noisy)
+        batch_time = time.perf_counter() - start
+
+        live_output, chunk_time = _process_in_chunks(engine, noisy, chunk_size)
+
+        results[f'{name}_batch_si_snr_db'] = si_snr(clean, batch_output)
+        results[f'{name}_batch_realtime_factor'] = batch_time / duration
+        results[f'{name}_live_si_snr_db'] = si_snr(clean, live_output)
+        results[f'{name}_live_ms_per_chunk'] = chunk_time * 1e3
+
+    return results
+
+
+class DtypePolicyError(Exception):
+    """Raised when a stage violates the audio dtype policy"""
+
+
+def _check_stages(processor: AdvancedVoiceProcessor, audio: np.ndarray):
+    """Run every stage and preset on float32 input and collect dtype violations"""
+    stages = {
+        'spectral_subtraction': lambda: processor._spectral_subtraction(audio),
+        'formant_shift': lambda: processor._apply_formant_shift(audio, 1.4),
+        'brightness_up': lambda: processor._adjust_brightness(audio, 1.3),
+        'brightness_down': lambda: processor._adjust_brightness(audio, 0.6),
+        'robotize': lambda: processor._robotize_voice(audio),
+        'alien_modulation': lambda: processor._apply_alien_modulation(audio),
+        'horror_distortion': lambda: processor._apply_horror_distortion(audio),
+        'radio_compression': lambda: processor._apply_radio_compression(audio),
+        'vocoder': lambda: processor._apply_vocoder_effect(audio),
+        'echo': lambda: processor._apply_echo_effect(audio),
+        'reverb': lambda: processor._apply_reverb_effect(audio),
+    }
+    for name in NOISE_REDUCTION_ENGINES:
+        stages[f'noise_reduction_{name}'] = lambda name=name: processor.apply_noise_reduction(audio, name)
+    for effect in processor.voice_effects:
+        stages[f'preset_{effect}'] = lambda effect=effect: processor.process_audio_chunk(
+            audio, {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': effect})
+
+    violations = []
+    for name, stage in stages.items():
+        try:
+            check_audio_dtype(stage(), name)
+        except TypeError as e:
+            violations.append(str(e))
+    return violations
+
+
+def bench_dtype_policy(duration: float = 120.0,
+                       presets: Tuple[str, ...] = ('female', 'horror', 'computer')) -> Dict[str, float]:
+    """Check the float32 policy on every stage, then measure time and peak memory
+    for a long upload through a few heavy presets"""
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    violations = _check_stages(processor, add_noise(synthetic_speech(2.0)))
+    if violations:
+        raise DtypePolicyError("; ".join(violations))
+
+    audio = add_noise(synthetic_speech(duration))
+    results = {'duration_s': duration, 'input_mb': audio.nbytes / 1e6}
+    for effect in presets:
+        settings = {'noise_reduction_enabled': False, 'voice_change_enabled': True, 'voice_effect': effect}
+        tracemalloc.start()
+        start = time.perf_counter()
+        output = processor.process_audio_chunk(audio, settings)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'{effect}_seconds'] = elapsed
+        results[f'{effect}_peak_mb'] = peak / 1e6
+        results[f'{effect}_output_dtype'] = str(output.dtype)
+    return results
+
+
+def bench_segmented(duration: float = 180.0, effect: str = 'female') -> Dict[str, float]:
+    """Wall-clock scaling of segmented processing with worker count, and how close
+    the stitched output stays to processing the file in one piece"""
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    audio = add_noise(synthetic_speech(duration))
+    settings = {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': effect}
+    segment_settings = SimpleNamespace(noise_reduction_enabled=True, noise_reduction_engine='noisereduce',
+                                       echo_enabled=False)
+    process_fn = partial(processor.process_audio_chunk, settings={**settings, 'normalize': False})
+
+    start = time.perf_counter()
+    whole = processor.process_audio_chunk(audio, settings)
+    results = {'duration_s': duration, 'single_seconds': time.perf_counter() - start}
+
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_worker_context()) as executor:
+            start = time.perf_counter()
+            stitched = process_segmented(audio, SAMPLE_RATE, segment_settings, process_fn, executor)
+            elapsed = time.perf_counter() - start
+        results[f'workers_{workers}_seconds'] = elapsed
+        results[f'workers_{workers}_speedup'] = results['single_seconds'] / elapsed
+        workers *= 2
+    results['stitched_vs_whole_si_snr_db'] = si_snr(whole, stitched)
+    return results
+
+
+def bench_effect_tail(repeats: int = 200) -> Dict[str, float]:
+    """Fused effect tail (numba and NumPy backends) vs. the separate per-stage passes,
+    each followed by peak normalization, on a live chunk and a 60 s upload"""
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    chains = {
+        'robotic': (lambda audio, bank: processor._robotize_voice(audio, bank),
+                    lambda tail, bank: tail.robotize(bank)),
+        'alien': (lambda audio, bank: processor._apply_alien_modulation(audio, bank),
+                  lambda tail, bank: tail.alien_modulation(bank)),
+        'deep_radio': (lambda audio, bank: processor._apply_radio_compression(audio),
+                       lambda tail, bank: tail.compress(0.3, 4.0)),
+        'echo': (lambda audio, bank: processor._apply_echo_effect(audio),
+                 lambda tail, bank: tail.echo(0.3, 0.5)),
+    }
+    backends = ['numpy'] + (['numba'] if NUMBA_AVAILABLE else [])
+    results = {'numba_available': NUMBA_AVAILABLE}
+    for label, length, count in (('chunk', CHUNK_SIZE, repeats), ('upload', 60 * SAMPLE_RATE, 3)):
+        audio = add_noise(synthetic_speech(length / SAMPLE_RATE))[:length]
+        out = np.empty_like(audio)
+        for name, (separate, fused) in chains.items():
+            bank = OscillatorBank(SAMPLE_RATE)
+            results[f'{label}_{name}_separate_ms'] = _time_call(
+                lambda: normalize_peak(separate(audio, bank), 0.9), count) * 1e3
+            for backend in backends:
+                tail = EffectTail(SAMPLE_RATE, backend)
+
+                def run_tail():
+                    fused(tail, bank)
+                    return tail.run(audio, out=out, normalize_to=0.9)
+                results[f'{label}_{name}_{backend}_ms'] = _time_call(run_tail, count) * 1e3
+    return results
+
+
+def bench_world(duration: float = 10.0, repeats: int = 3) -> Dict[str, float]:
+    """Pitch + formant shift per preset: librosa's two passes vs. WORLD, cold and with a cached analysis"""
+    if not PYWORLD_AVAILABLE:
+        return {'pyworld_available': False}
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    audio = synthetic_speech(duration)
+    results = {'pyworld_available': True}
+    for effect in ('female', 'old_man', 'cartoon'):
+        params = processor.voice_effects[effect]
+        pitch, formant = params['pitch_shift'], params['formant_shift']
+        results[f'{effect}_librosa_ms'] = _time_call(lambda: processor._apply_formant_shift(
+            librosa.effects.pitch_shift(audio, sr=SAMPLE_RATE, n_steps=pitch), formant), repeats) * 1e3
+        results[f'{effect}_world_cold_ms'] = _time_call(
+            lambda: shift_pitch_and_formants(audio, SAMPLE_RATE, pitch, formant, cache=None), repeats) * 1e3
+        cache = WorldAnalysisCache()
+        cache.get_or_analyze(audio, SAMPLE_RATE)
+        results[f'{effect}_world_cached_ms'] = _time_call(
+            lambda: shift_pitch_and_formants(audio, SAMPLE_RATE, pitch, formant, cache=cache), repeats) * 1e3
+    return results
+
+
+def bench_spectral(repeats: int = 20) -> Dict[str, float]:
+    """STFT + ISTFT round trip (n_fft 2048, hop 512): librosa vs. the scipy.fft backend,
+    single-threaded and with FFT_WORKERS threads, for a live chunk and for uploads"""
+    results = {'fft_workers': get_fft_workers()}
+    workers = get_fft_workers()
+    for label, length in (('chunk', CHUNK_SIZE), ('5s', 5 * SAMPLE_RATE), ('60s', 60 * SAMPLE_RATE)):
+        audio = add_noise(synthetic_speech(length / SAMPLE_RATE))
+        results[f'{label}_librosa_ms'] = _time_call(lambda: librosa.istft(
+            librosa.stft(audio, n_fft=2048, hop_length=512), hop_length=512, length=length), repeats) * 1e3
+        set_fft_workers(1)
+        results[f'{label}_scipy_1_ms'] = _time_call(lambda: istft(
+            stft(audio, n_fft=2048, hop_length=512), hop_length=512, length=length), repeats) * 1e3
+        set_fft_workers(workers)
+        results[f'{label}_scipy_{workers}_ms'] = _time_call(lambda: istft(
+            stft(audio, n_fft=2048, hop_length=512), hop_length=512, length=length), repeats) * 1e3
+        reference = librosa.istft(librosa.stft(audio, n_fft=2048, hop_length=512), hop_length=512, length=length)
+        results[f'{label}_max_diff'] = float(np.max(np.abs(
+            istft(stft(audio, n_fft=2048, hop_length=512), hop_length=512, length=length) - reference)))
+    return results
+
+
+def _live_stage(audio: np.ndarray, settings: dict, state: ProcessingState, meta: dict, stage: str) -> np.ndarray:
+    processor = get_voice_processor(SAMPLE_RATE)
+    if stage == 'noise_reduction':
+        return processor.process_audio_chunk(audio, {**settings, 'voice_change_enabled': False, 'normalize': False},
+                                             state)
+    return processor.process_audio_chunk(audio, {**settings, 'noise_reduction_enabled': False}, state)
+
+
+def bench_live_pipeline(duration: float = 30.0, effect: str = 'female') -> Dict[str, float]:
+    """Backlogged live chunks of one session: the serial chain vs. noise reduction and
+    effects in a two-stage LivePipeline"""
+    settings = {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': effect}
+    audio = add_noise(synthetic_speech(duration))
+    chunks = [audio[start:start + CHUNK_SIZE] for start in range(0, len(audio) - CHUNK_SIZE + 1, CHUNK_SIZE)]
+
+    state = ProcessingState(SAMPLE_RATE, streaming=True, chunk_size=CHUNK_SIZE)
+    _live_stage(chunks[0], settings, ProcessingState(SAMPLE_RATE, streaming=True), {}, 'noise_reduction')
+    start = time.perf_counter()
+    for chunk in chunks:
+        state.buffer_pool.begin_chunk()
+        get_voice_processor(SAMPLE_RATE).process_audio_chunk(chunk, settings, state)
+    serial = (time.perf_counter() - start) / len(chunks)
+
+    pipeline = LivePipeline([PipelineStage(name, partial(_live_stage, stage=name))
+                             for name in ('noise_reduction', 'effects')], SAMPLE_RATE, CHUNK_SIZE)
+    pipeline.start(settings)
+    try:
+        start = time.perf_counter()
+        feeder = threading.Thread(target=lambda: [pipeline.submit(chunk, settings) for chunk in chunks])
+        feeder.start()
+        for _ in chunks:
+            pipeline.receive()
+        feeder.join()
+        pipelined = (time.perf_counter() - start) / len(chunks)
+        stats = pipeline.get_stats()
+    finally:
+        pipeline.close()
+    return {
+        'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count(),
+        'serial_chunk_ms': serial * 1e3,
+        'pipelined_chunk_ms': pipelined * 1e3,
+        'speedup': serial / pipelined,
+        'expected_speedup': stats['expected_speedup'],
+        **{f"{stage['name']}_ms": stage['mean_ms'] for stage in stats['stages']},
+    }
+
+
+BENCHMARKS = {
+    'oscillator': bench_oscillator,
+    'noise_reduction': bench_noise_reduction,
+    'dtype_policy': bench_dtype_policy,
+    'segmented': bench_segmented,
+    'effect_tail': bench_effect_tail,
+    'world': bench_world,
+    'live_pipeline': bench_live_pipeline,
+    'spectral': bench_spectral,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run processing benchmarks")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    names = args.names or list(BENCHMARKS)
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark: {name}")
+        try:
+            results[name] = BENCHMARKS[name]()
+        except DtypePolicyError as e:
+            print(f"{name}: dtype policy violated: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, result in results.items():
+        print(f"== {name}")
+        for key, value in result.items():
+            if isinstance(value, float):
+                print(f"  {key:32s} {value:12.3f}")
+            else:
+                print(f"  {key:32s} {value!s:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Buffer Pool Module
+Per-session preallocated work buffers for the live chunk path
+"""
+
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE
+from profiling import acquire_tracemalloc, release_tracemalloc
+
+
+class BufferPool:
+    """Named work buffers sized from the session's negotiated chunk size
+
+    Stages acquire their output buffer by name, so after the first chunk a
+    steady stream of equally sized chunks allocates nothing from the pool.
+    `allocations` counts pool misses. Stages that cannot write into a
+    caller-provided buffer (library calls such as filters or pitch shifting)
+    run inside `measure`; while tracing is on (debug metrics), tracemalloc
+    records the peak memory each of them allocated. Tracing resets
+    tracemalloc's peak, so a profiled session reports per-stage peaks only.
+    """
+
+    def __init__(self, chunk_size: int = 4096):
+        self.chunk_size = chunk_size
+        self.buffers: Dict[str, np.ndarray] = {}
+        self.allocations = 0
+        self.total_allocations = 0
+        self.chunks = 0
+        self.allocating_stages: List[str] = []
+        self.stage_bytes: Dict[str, int] = {}
+        self.tracing = False
+
+    def resize(self, chunk_size: int):
+        """Drop buffers sized for a previous chunk size"""
+        if chunk_size != self.chunk_size:
+            self.chunk_size = chunk_size
+            self.buffers.clear()
+
+    def begin_chunk(self):
+        """Start counting allocations for a new chunk"""
+        self.allocations = 0
+        self.allocating_stages = []
+        self.stage_bytes = {}
+        self.chunks += 1
+
+    def set_tracing(self, enabled: bool):
+        """Measure stage allocations with tracemalloc (process-wide while any session traces)"""
+        if enabled and not self.tracing:
+            acquire_tracemalloc()
+        elif not enabled and self.tracing:
+            release_tracemalloc()
+        self.tracing = enabled
+
+    def acquire(self, name: str, size: Optional[int] = None) -> np.ndarray:
+        """Get the named buffer, (re)allocating it only if the size changed"""
+        size = self.chunk_size if size is None else size
+        buffer = self.buffers.get(name)
+        if buffer is None or len(buffer) != size:
+            buffer = np.empty(size, dtype=AUDIO_DTYPE)
+            self.buffers[name] = buffer
+            self.allocations += 1
+            self.total_allocations += 1
+            self.allocating_stages.append(name)
+        return buffer
+
+    @contextmanager
+    def measure(self, stage: str):
+        """Record the memory the enclosed stage allocates beyond what was live when it started"""
+        if not self.tracing or not tracemalloc.is_tracing():
+            yield
+            return
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            allocated = tracemalloc.get_traced_memory()[1] - start
+            if allocated > 0:
+                self.stage_bytes[stage] = self.stage_bytes.get(stage, 0) + allocated
+                self.allocating_stages.append(stage)
+
+    def get_metrics(self) -> dict:
+        """Allocation metrics for the current chunk and the session so far"""
+        return {
+            'allocations': self.allocations,
+            'allocating_stages': list(self.allocating_stages),
+            # Peak bytes allocated per stage outside the pool; empty unless tracing
+            'stage_bytes': dict(self.stage_bytes),
+            'total_allocations': self.total_allocations,
+            'chunks': self.chunks,
+            'pool_buffers': len(self.buffers),
+            'pool_bytes': sum(buffer.nbytes for buffer in self.buffers.values()),
+        }
+
+
+def get_output_buffer(pool: Optional[BufferPool], name: str, like: np.ndarray) -> np.ndarray:
+    """Get a pooled output buffer shaped like `like`, or a fresh one without a pool
+
+    Pools hold mono live buffers; multichannel audio always gets a fresh buffer.
+    """
+    if pool is None or like.ndim != 1:
+        return np.empty(like.shape, dtype=AUDIO_DTYPE)
+    return pool.acquire(name, len(like))
+
+
+def measure_allocations(pool: Optional[BufferPool], stage: str):
+    """`pool.measure(stage)`, or nothing without a pool"""
+    return pool.measure(stage) if pool is not None else nullcontext()
+
+
+def normalize_peak(audio: np.ndarray, target: float = 0.9,
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Scale so the peak magnitude equals `target`, without a temporary abs() array"""
+    if audio.size == 0:
+        return audio
+    peak = max(float(np.max(audio)), -float(np.min(audio)))
+    if peak <= 0:
+        return audio
+    if out is None:
+        return audio * (target / peak)
+    return np.multiply(audio, target / peak, out=out)
@@ -0,0 +1,225 @@
+"""
+Cancellation Module
+Cooperative cancellation of request and live processing once its client is gone
+
+An upload kept running its whole chain after the client had disconnected or
+given up waiting, and only failed when the response was written; a live
+session processed the frames still queued after its socket closed. Work now
+runs under a CancelToken. The endpoint cancels it when it sees the disconnect
+(or after REQUEST_TIMEOUT). The processing thread calls `check_cancelled()`
+between stages and between segments, which raises ProcessingCancelled. FFmpeg
+started through `run_subprocess` is killed as soon as the token is cancelled.
+
+Like asyncio.CancelledError, ProcessingCancelled is a BaseException, so the
+`except Exception` fallbacks of the stages do not swallow it. The token
+reaches the stages through a context variable. Code that runs without one
+(segment workers, benchmarks) never cancels.
+
+CPU time of the processing thread is kept per kind of work. Completed runs give
+the CPU seconds per unit (second of audio, live chunk). Cancelled runs would
+have cost their units at that rate, less what they used before stopping; the
+difference is counted as saved.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set
+
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 0.0))  # seconds; 0 waits as long as the client
+DISCONNECT_POLL_INTERVAL = 0.25  # seconds between disconnect checks and waits on worker results
+
+
+class ProcessingCancelled(BaseException):
+    """Raised at the next checkpoint of work whose token was cancelled"""
+
+    def __init__(self, reason: str = 'cancelled'):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Cancellation flag of one request or live session, shared with its processing thread"""
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.units = 0.0  # size of the work, in the units of its kind
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes: Set[subprocess.Popen] = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'client disconnected'):
+        """Flag the work and kill its subprocesses; later calls keep the first reason"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+    def check(self):
+        if self._event.is_set():
+            raise ProcessingCancelled(self.reason)
+
+    def add_process(self, process: subprocess.Popen):
+        """Kill `process` when the token is cancelled (at once if it already is)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._processes.add(process)
+                return
+        process.kill()
+
+    def discard_process(self, process: subprocess.Popen):
+        with self._lock:
+            self._processes.discard(process)
+
+
+_current_token: ContextVar[Optional[CancelToken]] = ContextVar('cancel_token', default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled():
+    """Checkpoint: raise ProcessingCancelled if the current work was cancelled"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+def set_units(units: float):
+    """Record the size of the current work once it is known (e.g. after decoding)"""
+    token = _current_token.get()
+    if token is not None:
+        token.units = units
+
+
+@contextmanager
+def cancellable(token: Optional[CancelToken]):
+    """Run the enclosed code under `token`"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def run_subprocess(command: List[str]) -> subprocess.CompletedProcess:
+    """subprocess.run with captured text output, killed when the current work is cancelled"""
+    check_cancelled()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    token = _current_token.get()
+    if token is not None:
+        token.add_process(process)
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        if token is not None:
+            token.discard_process(process)
+    check_cancelled()
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+
+def wait_result(future: concurrent.futures.Future):
+    """future.result(), waking up to check for cancellation"""
+    while True:
+        check_cancelled()
+        try:
+            return future.result(timeout=DISCONNECT_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            continue
+
+
+class CancellationStats:
+    """Completed and cancelled work per kind, and the CPU the cancellations saved"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.kinds: Dict[str, Dict[str, float]] = {}
+
+    def _kind(self, kind: str) -> Dict[str, float]:
+        return self.kinds.setdefault(kind, {
+            'completed': 0, 'units': 0.0, 'cpu_seconds': 0.0,
+            'cancelled': 0, 'cancelled_units': 0.0, 'cancelled_cpu_seconds': 0.0,
+        })
+
+    def record(self, kind: str, cancelled: bool, units: float, cpu_seconds: float):
+        with self._lock:
+            counts = self._kind(kind)
+            prefix = 'cancelled_' if cancelled else ''
+            counts['cancelled' if cancelled else 'completed'] += 1
+            counts[prefix + 'units'] += units
+            counts[prefix + 'cpu_seconds'] += cpu_seconds
+
+    def get_stats(self) -> dict:
+        """Counts per kind with the mean CPU per unit and the CPU saved (None until a run completed)"""
+        stats = {}
+        with self._lock:
+            for kind, counts in self.kinds.items():
+                per_unit = counts['cpu_seconds'] / counts['units'] if counts['units'] else None
+                saved = None
+                if per_unit is not None:
+                    saved = max(counts['cancelled_units'] * per_unit - counts['cancelled_cpu_seconds'], 0.0)
+                stats[kind] = {**counts, 'cpu_seconds_per_unit': per_unit, 'cpu_seconds_saved': saved}
+        return stats
+
+
+cancellation_stats = CancellationStats()
+
+
+def run_tracked(token: CancelToken, kind: str, fn: Callable, *args, units: Optional[float] = None):
+    """Call fn(*args) under `token`, recording its thread CPU time as completed or cancelled work
+
+    `units` defaults to what the work reported through `set_units`.
+    """
+    with cancellable(token):
+        started = time.thread_time()
+        try:
+            result = fn(*args)
+        except ProcessingCancelled:
+            cancellation_stats.record(kind, True, token.units if units is None else units,
+                                      time.thread_time() - started)
+            raise
+        cancellation_stats.record(kind, False, token.units if units is None else units,
+                                  time.thread_time() - started)
+        return result
+
+
+async def run_cancellable(kind: str, fn: Callable, *args, request=None, timeout: float = REQUEST_TIMEOUT):
+    """Run fn(*args) in a thread, cancelling it when `request` disconnects or after `timeout` seconds
+
+    Waits for the thread to reach its next checkpoint after cancelling, then
+    raises ProcessingCancelled.
+    """
+    token = CancelToken()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout > 0 else None
+    task = asyncio.ensure_future(asyncio.to_thread(run_tracked, token, kind, fn, *args))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if token.cancelled:
+                continue
+            if request is not None and await request.is_disconnected():
+                token.cancel('client disconnected')
+            elif deadline is not None and loop.time() >= deadline:
+                token.cancel('timed out')
+    except asyncio.CancelledError:
+        # The handler itself was cancelled (shutdown); the thread stops at its next checkpoint
+        token.cancel('request cancelled')
+        raise
@@ -0,0 +1,24 @@
+"""
+Audio Dtype Policy
+Sample and spectrum dtypes used throughout the processing chain
+
+Every stage takes and returns AUDIO_DTYPE samples; spectral stages work on
+SPECTRUM_DTYPE. Stages must not upcast (e.g. through np.exp(1j * phase),
+float64 filter coefficients or float64 time axes).
+"""
+
+import numpy as np
+
+AUDIO_DTYPE = np.float32
+SPECTRUM_DTYPE = np.complex64
+
+
+def as_audio(audio) -> np.ndarray:
+    """View or convert samples as AUDIO_DTYPE (no copy when already conforming)"""
+    return np.asarray(audio, dtype=AUDIO_DTYPE)
+
+
+def check_audio_dtype(audio: np.ndarray, stage: str):
+    """Raise TypeError if a stage produced samples outside the policy"""
+    if audio.dtype != AUDIO_DTYPE:
+        raise TypeError(f"{stage} returned {audio.dtype}, expected {np.dtype(AUDIO_DTYPE)}")
@@ -0,0 +1,337 @@
+"""
+Effect Tail Module
+Fused single-pass kernel for the sample-wise stages at the end of an effect chain
+
+Ring modulation (robotize, alien), soft clipping, compression, gain, a
+feed-forward echo and the final peak normalization each used to traverse the
+whole buffer and allocate a temporary. An EffectTail collects these
+operations as the chain is built and runs them together: every sample is
+read once, passed through all operations and written once (in place when
+`out` is the input). Normalization then only rescales the output.
+
+With numba (installed with librosa) the loop is JIT-compiled; otherwise an
+equivalent NumPy backend runs the operations one array pass at a time.
+Carrier phases live in the session's OscillatorBank and the echo delay line
+in the EffectTail, so both continue across live chunks. Carriers are read
+from the oscillators' sine table with the same nearest-entry lookup, so the
+fused stages sound like the separate ones.
+"""
+
+import logging
+import math
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from buffer_pool import normalize_peak
+from dtype_policy import AUDIO_DTYPE
+from oscillator import OscillatorBank, WavetableOscillator, get_sine_table
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 'numba' (default when available) or 'numpy'
+EFFECT_TAIL_BACKEND = os.environ.get('EFFECT_TAIL_BACKEND', 'numba' if NUMBA_AVAILABLE else 'numpy')
+
+# Operation codes; params columns are per operation
+OP_ROBOTIZE = 0  # carrier depth, harmonic level (phases: carrier, harmonic)
+OP_ALIEN = 1  # depth, base frequency, frequency deviation (phases: lfo, carrier)
+OP_SOFT_CLIP = 2  # drive, 1 / tanh(drive)
+OP_COMPRESS = 3  # threshold, 1 / ratio
+OP_ECHO = 4  # delay samples, decay
+OP_GAIN = 5  # gain
+
+PHASE_BLOCK = 1 << 16  # samples of FM carrier phase summed before the NumPy backend wraps it
+
+
+def _fused_tail_python(audio, out, codes, params, phases, increments, echo_line, echo_pos, table):
+    """Reference loop; compiled with numba when available
+
+    `audio` and `out` are (channels, samples) and may be the same array.
+    Carriers are shared by all channels and read from the power-of-two sine
+    `table` at the nearest entry to their phase, which is wrapped to [0, 1)
+    every sample (increments stay below one cycle). Returns the output peak
+    and the echo write position.
+    """
+    num_channels, num_samples = audio.shape
+    num_ops = codes.shape[0]
+    table_size = table.shape[0]
+    mask = table_size - 1
+    carriers = np.zeros((num_ops, 2))
+    peak = 0.0
+    for i in range(num_samples):
+        for k in range(num_ops):
+            code = codes[k]
+            if code == OP_ROBOTIZE:
+                carriers[k, 0] = table[int(phases[k, 0] * table_size + 0.5) & mask]
+                carriers[k, 1] = table[int(phases[k, 1] * table_size + 0.5) & mask]
+                phases[k, 0] += increments[k, 0]
+                phases[k, 1] += increments[k, 1]
+            elif code == OP_ALIEN:
+                lfo = table[int(phases[k, 0] * table_size + 0.5) & mask]
+                carriers[k, 0] = table[int(phases[k, 1] * table_size + 0.5) & mask]
+                phases[k, 0] += increments[k, 0]
+                phases[k, 1] += (params[k, 1] + params[k, 2] * lfo) * increments[k, 1]
+            else:
+                continue
+            # Wrap every sample: an unwrapped sum loses precision over a long buffer
+            for j in range(2):
+                if phases[k, j] >= 1.0:
+                    phases[k, j] -= 1.0
+        for c in range(num_channels):
+            x = float(audio[c, i])
+            for k in range(num_ops):
+                code = codes[k]
+                if code == OP_ROBOTIZE:
+                    x = x * (1.0 + params[k, 0] * carriers[k, 0]) + params[k, 1] * carriers[k, 1]
+                    x = min(max(x, -1.0), 1.0)
+                elif code == OP_ALIEN:
+                    x = x * (1.0 + params[k, 0] * carriers[k, 0])
+                elif code == OP_SOFT_CLIP:
+                    x = math.tanh(params[k, 0] * x) * params[k, 1]
+                elif code == OP_COMPRESS:
+                    magnitude = abs(x)
+                    knee = magnitude * params[k, 1] + params[k, 0] * (1.0 - params[k, 1])
+                    x = math.copysign(min(magnitude, knee), x)
+                elif code == OP_ECHO:
+                    delayed = echo_line[c, echo_pos]
+                    echo_line[c, echo_pos] = x
+                    x = x + params[k, 1] * delayed
+                elif code == OP_GAIN:
+                    x = x * params[k, 0]
+            out[c, i] = x
+            peak = max(peak, abs(x))
+        if echo_line.shape[1] > 0:
+            echo_pos += 1
+            if echo_pos == echo_line.shape[1]:
+                echo_pos = 0
+    return peak, echo_pos
+
+
+_fused_tail_kernel = njit(cache=True, fastmath=False)(_fused_tail_python) if NUMBA_AVAILABLE else None
+
+
+class EffectTail:
+    """Queue of sample-wise operations run as one pass
+
+    One EffectTail belongs to a processing session (or a single upload); it
+    owns the echo delay line. Operations are queued with the methods below
+    and consumed by `run`.
+    """
+
+    def __init__(self, sample_rate: int, backend: str = EFFECT_TAIL_BACKEND):
+        self.sample_rate = sample_rate
+        self.backend = backend if backend != 'numba' or NUMBA_AVAILABLE else 'numpy'
+        self.ops: List[Tuple[int, Tuple[float, ...], Tuple[WavetableOscillator, ...]]] = []
+        self.table = get_sine_table()
+        self.echo_line = np.zeros((0, 0), dtype=AUDIO_DTYPE)
+        self.echo_pos = 0
+
+    def __bool__(self):
+        return bool(self.ops)
+
+    def clear(self):
+        self.ops = []
+
+    def reset(self):
+        """Forget the echo history"""
+        self.ops = []
+        self.echo_line = np.zeros((0, 0), dtype=AUDIO_DTYPE)
+        self.echo_pos = 0
+
+    # Operations, in chain order
+
+    def robotize(self, oscillators: OscillatorBank, carrier_freq: float = 220.0):
+        """audio * (1 + 0.5 * carrier) + 0.2 * second harmonic, clipped to [-1, 1]"""
+        self.ops.append((OP_ROBOTIZE, (0.5, 0.2, 0.0),
+                         (oscillators.get('robot_carrier', carrier_freq),
+                          oscillators.get('robot_harmonic', carrier_freq * 2))))
+
+    def alien_modulation(self, oscillators: OscillatorBank):
+        """audio * (1 + 0.4 * carrier) with the carrier swept 8 +/- 3 Hz by a 0.5 Hz LFO"""
+        self.ops.append((OP_ALIEN, (0.4, 8.0, 3.0),
+                         (oscillators.get('alien_lfo', 0.5),
+                          oscillators.get_fm('alien_carrier', 8.0, 'alien_lfo', 3.0))))
+
+    def soft_clip(self, drive: float):
+        """tanh(drive * audio) / tanh(drive)"""
+        self.ops.append((OP_SOFT_CLIP, (drive, 1.0 / float(np.tanh(drive)), 0.0), ()))
+
+    def compress(self, threshold: float, ratio: float):
+        """Hard-knee compression of the magnitude above `threshold`"""
+        self.ops.append((OP_COMPRESS, (threshold, 1.0 / ratio, 0.0), ()))
+
+    def echo(self, delay: float, decay: float):
+        """audio + decay * audio delayed by `delay` seconds (continuing across chunks)"""
+        if any(code == OP_ECHO for code, _, _ in self.ops):
+            raise ValueError("an effect tail holds at most one echo")
+        delay_samples = int(delay * self.sample_rate)
+        if delay_samples > 0:
+            self.ops.append((OP_ECHO, (float(delay_samples), decay, 0.0), ()))
+
+    def gain(self, gain: float):
+        self.ops.append((OP_GAIN, (gain, 0.0, 0.0), ()))
+
+    def _prepare_echo(self, num_channels: int) -> int:
+        """Size the delay line for the queued echo; returns its length"""
+        delay = next((int(params[0]) for code, params, _ in self.ops if code == OP_ECHO), 0)
+        if self.echo_line.shape != (num_channels, delay):
+            self.echo_line = np.zeros((num_channels, delay), dtype=AUDIO_DTYPE)
+            self.echo_pos = 0
+        return delay
+
+    def _pack(self):
+        num_ops = len(self.ops)
+        codes = np.empty(num_ops, dtype=np.int64)
+        params = np.zeros((num_ops, 3))
+        phases = np.zeros((num_ops, 2))
+        increments = np.zeros((num_ops, 2))
+        for k, (code, op_params, oscillators) in enumerate(self.ops):
+            codes[k] = code
+            params[k] = op_params
+            for j, oscillator in enumerate(oscillators):
+                phases[k, j] = oscillator.phase
+                increments[k, j] = 1.0 / oscillator.sample_rate
+                if not (code == OP_ALIEN and j == 1):
+                    increments[k, j] *= oscillator.frequency
+        return codes, params, phases, increments
+
+    def run(self, audio: np.ndarray, out: Optional[np.ndarray] = None,
+            normalize_to: Optional[float] = None) -> np.ndarray:
+        """Run and clear the queued operations, then optionally peak-normalize
+
+        `out` may be `audio` itself (in place) or a separate buffer shaped like
+        it. Without queued operations this is just the normalization.
+        """
+        if not self.ops:
+            if normalize_to is None:
+                return audio
+            return normalize_peak(audio, normalize_to, out=out)
+
+        if out is None:
+            out = np.empty(audio.shape, dtype=AUDIO_DTYPE)
+        audio_2d = audio.reshape(-1, audio.shape[-1])
+        out_2d = out.reshape(-1, out.shape[-1])
+        self._prepare_echo(audio_2d.shape[0])
+        codes, params, phases, increments = self._pack()
+
+        if self.backend == 'numba':
+            peak, self.echo_pos = _fused_tail_kernel(audio_2d, out_2d, codes, params, phases,
+                                                     increments, self.echo_line, self.echo_pos, self.table)
+        else:
+            peak = self._run_numpy(audio_2d, out_2d, codes, params, phases, increments)
+
+        # Hand the advanced phases back to the session's oscillators
+        for k, (_, _, oscillators) in enumerate(self.ops):
+            for j, oscillator in enumerate(oscillators):
+                oscillator.phase = float(phases[k, j]) % 1.0
+        self.ops = []
+
+        if normalize_to is not None and peak > 0:
+            out *= AUDIO_DTYPE(normalize_to / peak)
+        return out
+
+    def _run_numpy(self, audio, out, codes, params, phases, increments) -> float:
+        """The same operations as the kernel, one vectorized pass each"""
+        num_samples = audio.shape[-1]
+        ramp = np.arange(num_samples, dtype=np.float64)
+        if out is not audio:
+            out[...] = audio
+        for k, code in enumerate(codes):
+            if code == OP_ROBOTIZE:
+                carrier = self._table_lookup(phases[k, 0] + increments[k, 0] * ramp)
+                harmonic = self._table_lookup(phases[k, 1] + increments[k, 1] * ramp)
+                phases[k] += increments[k] * num_samples
+                carrier *= params[k, 0]
+                carrier += 1
+                out *= carrier
+                harmonic *= params[k, 1]
+                out += harmonic
+                np.clip(out, -1.0, 1.0, out=out)
+            elif code == OP_ALIEN:
+                lfo = self._table_lookup(phases[k, 0] + increments[k, 0] * ramp)
+                step = (params[k, 1] + params[k, 2] * lfo) * increments[k, 1]
+                carrier_phase, phases[k, 1] = self._sweep_phases(phases[k, 1], step)
+                carrier = self._table_lookup(carrier_phase)
+                phases[k, 0] += increments[k, 0] * num_samples
+                carrier *= params[k, 0]
+                carrier += 1
+                out *= carrier
+            elif code == OP_SOFT_CLIP:
+                out *= params[k, 0]
+                np.tanh(out, out=out)
+                out *= params[k, 1]
+            elif code == OP_COMPRESS:
+                magnitude = np.abs(out)
+                knee = magnitude * params[k, 1]
+                knee += params[k, 0] * (1.0 - params[k, 1])
+                np.minimum(magnitude, knee, out=magnitude)
+                np.copysign(magnitude, out, out=out)
+            elif code == OP_ECHO:
+                out[...] = self._echo_numpy(out, params[k, 1])
+            elif code == OP_GAIN:
+                out *= params[k, 0]
+        return max(float(np.max(out)), -float(np.min(out))) if out.size else 0.0
+
+    @staticmethod
+    def _sweep_phases(phase: float, step: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Phase before each sample of a swept carrier, and its phase after the last
+
+        Summed one PHASE_BLOCK at a time from a wrapped phase, so a long buffer
+        keeps the precision of a short one.
+        """
+        phases = np.empty(len(step))
+        for start in range(0, len(step), PHASE_BLOCK):
+            block = step[start:start + PHASE_BLOCK]
+            sums = np.cumsum(block)
+            phases[start:start + len(block)] = phase + sums - block
+            phase = (phase + sums[-1]) % 1.0
+        return phases, phase
+
+    def _table_lookup(self, phases: np.ndarray) -> np.ndarray:
+        """Sine table entries nearest to non-negative phases (in cycles), as the kernel reads them"""
+        indices = (phases * len(self.table) + 0.5).astype(np.intp)
+        np.bitwise_and(indices, len(self.table) - 1, out=indices)
+        return self.table[indices]
+
+    def _echo_numpy(self, audio: np.ndarray, decay: float) -> np.ndarray:
+        """Feed-forward echo through the delay line, leaving it as the kernel would"""
+        delay = self.echo_line.shape[1]
+        # The line is a ring starting at echo_pos; unroll it into time order
+        history = np.roll(self.echo_line, -self.echo_pos, axis=1)
+        extended = np.concatenate((history, audio), axis=1)
+        result = audio + decay * extended[:, :audio.shape[1]]
+        self.echo_line = np.ascontiguousarray(extended[:, -delay:]) if delay else self.echo_line
+        self.echo_pos = 0
+        return result
+
+
+def get_effect_tail(state, sample_rate: int) -> EffectTail:
+    """The session's effect tail, or a fresh one for stateless processing"""
+    if state is None:
+        return EffectTail(sample_rate)
+    if state.effect_tail is None:
+        state.effect_tail = EffectTail(sample_rate)
+    return state.effect_tail
+
+
+def warm_up():
+    """Compile the kernel ahead of the first request"""
+    if EFFECT_TAIL_BACKEND != 'numba' or not NUMBA_AVAILABLE:
+        return
+    try:
+        tail = EffectTail(16000)
+        bank = OscillatorBank(16000)
+        tail.robotize(bank)
+        tail.alien_modulation(bank)
+        tail.soft_clip(3.0)
+        tail.compress(0.3, 4.0)
+        tail.echo(0.001, 0.5)
+        tail.gain(0.8)
+        tail.run(np.zeros(64, dtype=AUDIO_DTYPE), normalize_to=0.9)
+    except Exception as e:
+        logging.warning(f"Effect tail kernel warm-up failed: {e}")
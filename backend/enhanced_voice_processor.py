@@ -8,16 +8,36 @@ import librosa
 import scipy.signal
 from scipy import signal
 import noisereduce as nr
+from functools import lru_cache
 from typing import Tuple, Optional
 import logging
 
+from buffer_pool import BufferPool, get_output_buffer, measure_allocations
+from cancellation import check_cancelled
+from dtype_policy import AUDIO_DTYPE, as_audio
+from effect_tail import get_effect_tail
+from filters import zero_phase_filter
+from gain_stage import apply_output_gain
+from noise_reduction import DEFAULT_NOISE_REDUCTION_ENGINE, NoisereduceEngine, create_noise_engine
+from oscillator import OscillatorBank
+from processing_state import ProcessingState
+from resampling import num_samples, to_mono
+from spectral import istft, stft
+from vad import FRAME_LENGTH, HOP_LENGTH, blockwise_frame_energy, frame_energy, frame_signal, spectral_centroid
+from world_vocoder import DEFAULT_PITCH_ENGINE, PYWORLD_AVAILABLE, analysis_cache, shift_pitch_and_formants
+
 class AdvancedVoiceProcessor:
-    """Advanced voice processing with multiple voice effects and noise cancellation"""
+    """Advanced voice processing with multiple voice effects and noise cancellation
+
+    Works at `sample_rate` on mono (samples,) or multichannel (channels, samples)
+    audio; every stage runs along the last axis for all channels at once.
+    """
     
     def __init__(self, sample_rate: int = 16000):
         self.sample_rate = sample_rate
         self.frame_size = 1024
         self.hop_size = 512
+        self.vocoder_bands = 8
         
         # Voice effect parameters
         self.voice_effects = {
@@ -36,154 +56,248 @@ class AdvancedVoiceProcessor:
             'wall_echo': {'pitch_shift': 0, 'formant_shift': 1.0, 'brightness': 1.0, 'reverb': True}
         }
     
-    def apply_noise_reduction(self, audio: np.ndarray) -> np.ndarray:
+    def apply_noise_reduction(self, audio: np.ndarray,
+                              engine_name: str = DEFAULT_NOISE_REDUCTION_ENGINE,
+                              state: Optional[ProcessingState] = None) -> np.ndarray:
         """Advanced noise reduction using multiple techniques"""
         try:
             # Primary noise reduction
-            cleaned = nr.reduce_noise(y=audio, sr=self.sample_rate, stationary=False)
-            
-            # Additional spectral subtraction
-            cleaned = self._spectral_subtraction(cleaned)
+            if state is not None:
+                engine = state.get_noise_engine(engine_name)
+            else:
+                engine = create_noise_engine(engine_name, self.sample_rate)
+            pool = state.buffer_pool if state is not None else None
+            with measure_allocations(pool, 'noise_reduction'):
+                if state is not None and state.streaming:
+                    cleaned = as_audio(engine.process_chunk(audio))
+                else:
+                    cleaned = as_audio(engine.process_channels(audio))
             
-            # Voice activity detection and enhancement
-            cleaned = self._enhance_speech_segments(cleaned)
+            # The stationary and spectral gate engines track their own noise floor;
+            # the legacy chain follows noisereduce with subtraction and enhancement
+            if isinstance(engine, NoisereduceEngine):
+                # Additional spectral subtraction
+                noise_spectrum = state.noise_spectrum if state is not None else None
+                with measure_allocations(pool, 'spectral_subtraction'):
+                    cleaned = self._spectral_subtraction(cleaned, noise_spectrum=noise_spectrum)
+                
+                # Voice activity detection and enhancement
+                energy_threshold = state.vad_energy_threshold if state is not None else None
+                with measure_allocations(pool, 'speech_enhancement'):
+                    cleaned = self._enhance_speech_segments(cleaned, energy_threshold)
             
             return cleaned
         except Exception as e:
             logging.error(f"Error in noise reduction: {e}")
             return audio
     
-    def _spectral_subtraction(self, audio: np.ndarray, alpha: float = 2.0) -> np.ndarray:
-        """Apply spectral subtraction for additional noise reduction"""
-        # Compute STFT
-        stft = librosa.stft(audio, n_fft=2048, hop_length=512)
-        magnitude = np.abs(stft)
-        phase = np.angle(stft)
+    def estimate_noise_spectrum(self, audio: np.ndarray) -> np.ndarray:
+        """Mean magnitude spectrum of the first 0.5 seconds, as spectral subtraction uses it"""
+        magnitude = np.abs(stft(audio, n_fft=2048, hop_length=512))
+        noise_frames = int(0.5 * self.sample_rate / 512)
+        return np.mean(magnitude[..., :noise_frames], axis=-1, keepdims=True)
+    
+    def _spectral_subtraction(self, audio: np.ndarray, alpha: float = 2.0,
+                              noise_spectrum: Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply spectral subtraction for additional noise reduction
+
+        The noise is estimated from the first 0.5 seconds unless `noise_spectrum`
+        is given.
+        """
+        # Compute STFT (complex64 for float32 input)
+        spectrum = stft(audio, n_fft=2048, hop_length=512)
+        magnitude = np.abs(spectrum)
         
         # Estimate noise from first 0.5 seconds
-        noise_frames = int(0.5 * self.sample_rate / 512)
-        noise_spectrum = np.mean(magnitude[:, :noise_frames], axis=1, keepdims=True)
+        if noise_spectrum is None:
+            noise_frames = int(0.5 * self.sample_rate / 512)
+            noise_spectrum = np.mean(magnitude[..., :noise_frames], axis=-1, keepdims=True)
         
         # Apply spectral subtraction
         subtracted = magnitude - alpha * noise_spectrum
         subtracted = np.maximum(subtracted, 0.1 * magnitude)
         
-        # Reconstruct signal
-        enhanced_stft = subtracted * np.exp(1j * phase)
-        enhanced_audio = librosa.istft(enhanced_stft, hop_length=512)
+        # Reconstruct signal, rescaling each bin so the original phase is kept
+        gain = np.divide(subtracted, magnitude, out=np.ones_like(magnitude), where=magnitude > 0)
+        enhanced_stft = spectrum * gain
+        enhanced_audio = istft(enhanced_stft, hop_length=512, length=num_samples(audio))
         
         return enhanced_audio
     
-    def _enhance_speech_segments(self, audio: np.ndarray) -> np.ndarray:
+    def speech_energy_threshold(self, audio: np.ndarray) -> float:
+        """Frame energy above which `_enhance_speech_segments` may treat a frame as speech
+
+        Computed in a blockwise pass, so a long buffer is not mixed down whole.
+        """
+        return float(np.percentile(blockwise_frame_energy(audio), 30))
+    
+    def _enhance_speech_segments(self, audio: np.ndarray,
+                                 energy_threshold: Optional[float] = None) -> np.ndarray:
         """Enhance segments that contain speech"""
         try:
-            # Simple VAD using energy and spectral features
-            frame_length = 1024
-            hop_length = 512
-            
-            # Compute frame energy
-            frames = librosa.util.frame(audio, frame_length=frame_length, hop_length=hop_length)
-            energy = np.sum(frames**2, axis=0)
-            
-            # Compute spectral centroid
-            spectral_centroids = librosa.feature.spectral_centroid(y=audio, sr=self.sample_rate)[0]
+            # Simple VAD using energy and spectral features, on the channel mix
+            # so every channel gets the same gain
+            frames = frame_signal(to_mono(audio))
+            energy = frame_energy(frames)
+            spectral_centroids = spectral_centroid(frames, self.sample_rate)
             
             # Simple VAD: combine energy and spectral features
-            energy_threshold = np.percentile(energy, 30)
+            if energy_threshold is None:
+                energy_threshold = np.percentile(energy, 30)
             voice_mask = (energy > energy_threshold) & (spectral_centroids > 1000)
             
-            # Apply gain to voiced segments
-            enhanced = audio.copy()
-            for i, is_voice in enumerate(voice_mask):
-                start = i * hop_length
-                end = min(start + hop_length, len(enhanced))
-                if is_voice:
-                    enhanced[start:end] *= 1.1  # Slight boost for voice segments
-            
-            return enhanced
+            # Slight boost for voice segments, interpolated per sample between frame
+            # centers so the gain ramps instead of stepping at hop boundaries
+            if len(voice_mask) == 0:
+                return audio
+            centers = np.arange(len(voice_mask)) * HOP_LENGTH + FRAME_LENGTH // 2
+            frame_gains = np.where(voice_mask, 1.1, 1.0)
+            gains = np.interp(np.arange(num_samples(audio)), centers, frame_gains).astype(AUDIO_DTYPE)
+            return audio * gains
         except Exception as e:
             logging.error(f"Error in speech enhancement: {e}")
             return audio
     
     def apply_voice_effect(self, audio: np.ndarray, effect: str, 
-                          custom_pitch: float = 0.0) -> np.ndarray:
-        """Apply sophisticated voice effects"""
-        if effect not in self.voice_effects and effect != 'none':
-            return audio
-        
-        if effect == 'none':
+                          custom_pitch: float = 0.0,
+                          state: Optional[ProcessingState] = None,
+                          normalize_to: Optional[float] = None,
+                          pitch_engine: str = DEFAULT_PITCH_ENGINE) -> np.ndarray:
+        """Apply sophisticated voice effects
+
+        `pitch_engine` 'world' shifts pitch and formants from one WORLD analysis
+        (cached for uploads) instead of two librosa STFT passes. Streaming
+        sessions ignore it and use librosa.
+
+        Sample-wise stages (ring modulation, soft clipping, compression, echo)
+        are queued on the session's EffectTail and run as one fused pass before
+        the next stage that needs the whole signal, or at the end together with
+        peak normalization to `normalize_to`.
+        """
+        pool = state.buffer_pool if state is not None else None
+        tail = get_effect_tail(state, self.sample_rate)
+        try:
+            processed = self._apply_effect_stages(audio, effect, custom_pitch, state, tail, pitch_engine)
+        except Exception as e:
+            logging.error(f"Error applying voice effect {effect}: {e}")
+            tail.clear()
+            processed = audio
+        return tail.run(processed, out=get_output_buffer(pool, 'tail', processed), normalize_to=normalize_to)
+    
+    def _apply_effect_stages(self, audio: np.ndarray, effect: str, custom_pitch: float,
+                             state: Optional[ProcessingState], tail,
+                             pitch_engine: str = DEFAULT_PITCH_ENGINE) -> np.ndarray:
+        """Run the preset's stages, leaving trailing sample-wise stages queued on `tail`"""
+        if effect not in self.voice_effects:
             return audio
         
         params = self.voice_effects[effect]
-        processed = audio.copy()
+        # Stages never write into their input, so a read-only frame needs no copy
+        processed = audio
+        # Uploads get a fresh bank; live sessions keep oscillator phase across chunks
+        oscillators = state.oscillators if state is not None else OscillatorBank(self.sample_rate)
+        pool = state.buffer_pool if state is not None else None
         
-        try:
+        def flush(audio: np.ndarray) -> np.ndarray:
+            # Whole-signal stages need the queued sample-wise stages applied first
+            return tail.run(audio, out=get_output_buffer(pool, 'tail', audio))
+        
+        pitch_shift = custom_pitch if custom_pitch != 0.0 else params.get('pitch_shift', 0)
+        formant_shift = params.get('formant_shift', 1.0)
+        # WORLD needs the whole buffer: per live chunk it would analyse cold, with
+        # nothing to cache and artefacts at every chunk edge
+        streaming = state is not None and state.streaming
+        if pitch_engine == 'world' and PYWORLD_AVAILABLE and not streaming:
+            # One analysis and one synthesis for both
+            if pitch_shift != 0 or formant_shift != 1.0:
+                cache = state.analysis_cache if state is not None and state.analysis_cache else analysis_cache
+                with measure_allocations(pool, 'world'):
+                    processed = shift_pitch_and_formants(processed, self.sample_rate, pitch_shift, formant_shift,
+                                                         cache=cache)
+        else:
             # Apply pitch shifting
-            pitch_shift = custom_pitch if custom_pitch != 0.0 else params.get('pitch_shift', 0)
             if pitch_shift != 0:
-                processed = librosa.effects.pitch_shift(processed, sr=self.sample_rate, n_steps=pitch_shift)
+                with measure_allocations(pool, 'pitch_shift'):
+                    processed = as_audio(librosa.effects.pitch_shift(processed, sr=self.sample_rate,
+                                                                     n_steps=pitch_shift))
             
             # Apply formant shifting (simulate different vocal tract lengths)
-            if 'formant_shift' in params:
-                processed = self._apply_formant_shift(processed, params['formant_shift'])
-            
-            # Apply brightness adjustment
-            if 'brightness' in params:
+            if formant_shift != 1.0:
+                check_cancelled()
+                with measure_allocations(pool, 'formant_shift'):
+                    processed = self._apply_formant_shift(processed, formant_shift)
+        
+        # Apply brightness adjustment
+        if 'brightness' in params and params['brightness'] != 1.0:
+            with measure_allocations(pool, 'brightness'):
                 processed = self._adjust_brightness(processed, params['brightness'])
-            
-            # Special effects
-            if params.get('robotize'):
-                processed = self._robotize_voice(processed)
-            
-            if params.get('modulation'):
-                processed = self._apply_alien_modulation(processed)
-            
-            if params.get('distortion'):
-                processed = self._apply_horror_distortion(processed)
-            
-            if params.get('compression'):
-                processed = self._apply_radio_compression(processed)
-            
-            if params.get('vocoder'):
-                processed = self._apply_vocoder_effect(processed)
-            
-            if params.get('echo'):
-                processed = self._apply_echo_effect(processed)
-            
-            if params.get('reverb'):
-                processed = self._apply_reverb_effect(processed)
-            
-            return processed
-            
-        except Exception as e:
-            logging.error(f"Error applying voice effect {effect}: {e}")
-            return audio
+        
+        # Special effects
+        if params.get('robotize'):
+            tail.robotize(oscillators)
+        
+        if params.get('modulation'):
+            tail.alien_modulation(oscillators)
+        
+        if params.get('distortion'):
+            # Soft clipping, then a low-pass filter for a darker sound
+            tail.soft_clip(3.0)
+            processed = flush(processed)
+            with measure_allocations(pool, 'distortion'):
+                processed = zero_phase_filter(processed, 3, 2000, 'low', self.sample_rate)
+            tail.gain(0.8)
+        
+        if params.get('compression'):
+            tail.compress(0.3, 4.0)
+        
+        if params.get('vocoder'):
+            check_cancelled()
+            processed = flush(processed)
+            with measure_allocations(pool, 'vocoder'):
+                processed = self._apply_vocoder_effect(processed, oscillators,
+                                                       out=get_output_buffer(pool, 'vocoder', processed))
+        
+        if params.get('echo'):
+            tail.echo(0.3, 0.5)
+        
+        if params.get('reverb'):
+            processed = flush(processed)
+            processed = self._apply_reverb_effect(processed,
+                                                  out=get_output_buffer(pool, 'reverb', processed),
+                                                  scratch=get_output_buffer(pool, 'scratch', processed))
+        
+        return processed
     
     def _apply_formant_shift(self, audio: np.ndarray, shift_factor: float) -> np.ndarray:
         """Apply formant shifting by time-stretching spectral envelope"""
         try:
             # Use phase vocoder for formant shifting
-            stft = librosa.stft(audio, n_fft=2048, hop_length=512)
+            spectrum = stft(audio, n_fft=2048, hop_length=512)
+            magnitude = np.abs(spectrum)
+            num_bins = spectrum.shape[-2]
             
-            # Frequency domain manipulation for formant shifting
-            freqs = librosa.fft_frequencies(sr=self.sample_rate, n_fft=2048)
-            shifted_stft = np.zeros_like(stft)
+            # Magnitude at bin b moves to bin b * shift_factor. Source bins whose
+            # shifted frequency passes Nyquist are dropped and the last kept bin is
+            # held above it (np.interp semantics), for all frames at once.
+            last_valid = min(int(np.ceil((num_bins - 1) / shift_factor)) - 1, num_bins - 1)
+            if last_valid < 0:
+                return audio
+            source = np.minimum(np.arange(num_bins) / shift_factor, last_valid)
+            lower = np.minimum(source.astype(np.intp), max(last_valid - 1, 0))
+            frac = (source - lower).astype(AUDIO_DTYPE)[:, np.newaxis]
+            upper = np.minimum(lower + 1, last_valid)
+            lower_magnitude = magnitude[..., lower, :]
+            gain = magnitude[..., upper, :]
+            gain -= lower_magnitude
+            gain *= frac
+            gain += lower_magnitude
+            del lower_magnitude
             
-            for i in range(stft.shape[1]):
-                frame = stft[:, i]
-                magnitude = np.abs(frame)
-                phase = np.angle(frame)
-                
-                # Interpolate magnitude spectrum
-                new_freqs = freqs * shift_factor
-                valid_mask = new_freqs < freqs[-1]
-                
-                if np.any(valid_mask):
-                    shifted_magnitude = np.interp(freqs, new_freqs[valid_mask], 
-                                                magnitude[valid_mask])
-                    shifted_stft[:, i] = shifted_magnitude * np.exp(1j * phase)
+            # Keep each bin's phase: scale the complex bin by new/old magnitude
+            np.divide(gain, magnitude, out=gain, where=magnitude > 0)
+            spectrum *= gain
             
-            return librosa.istft(shifted_stft, hop_length=512)
+            return istft(spectrum, hop_length=512, length=num_samples(audio))
         except Exception as e:
             logging.error(f"Error in formant shifting: {e}")
             return audio
@@ -193,153 +307,218 @@ class AdvancedVoiceProcessor:
         # Apply high-frequency emphasis/de-emphasis
         if brightness != 1.0:
             # Simple high-pass/low-pass filtering approach
-            nyquist = self.sample_rate / 2
             cutoff = 3000  # Hz
             if brightness > 1.0:
                 # Emphasize high frequencies
-                b, a = signal.butter(2, cutoff/nyquist, btype='high')
-                high_freq = signal.filtfilt(b, a, audio)
-                return audio + (brightness - 1.0) * high_freq * 0.3
+                high_freq = zero_phase_filter(audio, 2, cutoff, 'high', self.sample_rate)
+                high_freq *= (brightness - 1.0) * 0.3
+                high_freq += audio
+                return high_freq
             else:
-                # De-emphasize high frequencies
-                b, a = signal.butter(2, cutoff/nyquist, btype='low')
-                return signal.filtfilt(b, a, audio) * brightness + audio * (1 - brightness)
+                # De-emphasize high frequencies: low * b + audio * (1 - b), in place
+                low_freq = zero_phase_filter(audio, 2, cutoff, 'low', self.sample_rate)
+                low_freq -= audio
+                low_freq *= brightness
+                low_freq += audio
+                return low_freq
         return audio
     
-    def _robotize_voice(self, audio: np.ndarray) -> np.ndarray:
+    # The special effects below write into `out` (and `scratch`) when given;
+    # neither may alias `audio`. The chain runs the sample-wise ones through
+    # the fused effect tail; these remain the per-stage reference versions
+    # (golden.py, benchmarks.py).
+    
+    def _robotize_voice(self, audio: np.ndarray,
+                        oscillators: Optional[OscillatorBank] = None,
+                        out: Optional[np.ndarray] = None) -> np.ndarray:
         """Create robotic voice effect using vocoding"""
+        if oscillators is None:
+            oscillators = OscillatorBank(self.sample_rate)
+        
         # Simple vocoder effect
         carrier_freq = 220  # Hz
-        t = np.arange(len(audio)) / self.sample_rate
-        carrier = np.sin(2 * np.pi * carrier_freq * t)
+        carrier = oscillators.get('robot_carrier', carrier_freq).generate(num_samples(audio), reuse=True)
         
-        # Ring modulation
-        modulated = audio * (1 + 0.5 * carrier)
+        # Ring modulation: audio * (1 + 0.5 * carrier), one carrier for every channel
+        carrier *= 0.5
+        carrier += 1
+        modulated = np.multiply(audio, carrier, out=out)
         
         # Add some harmonic content
-        harmonics = np.sin(2 * np.pi * carrier_freq * 2 * t) * 0.2
+        harmonics = oscillators.get('robot_harmonic', carrier_freq * 2).generate(num_samples(audio), reuse=True)
+        harmonics *= 0.2
         modulated += harmonics
         
-        return np.clip(modulated, -1.0, 1.0)
+        return np.clip(modulated, -1.0, 1.0, out=modulated)
     
-    def _apply_alien_modulation(self, audio: np.ndarray) -> np.ndarray:
+    def _apply_alien_modulation(self, audio: np.ndarray,
+                                oscillators: Optional[OscillatorBank] = None,
+                                out: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply alien-like modulation effects"""
+        if oscillators is None:
+            oscillators = OscillatorBank(self.sample_rate)
+        
         # Ring modulation with varying frequency
-        t = np.arange(len(audio)) / self.sample_rate
-        mod_freq = 8 + 3 * np.sin(2 * np.pi * 0.5 * t)  # Varying modulation
-        modulator = np.sin(2 * np.pi * mod_freq * t)
+        mod_freq = oscillators.get('alien_lfo', 0.5).generate(num_samples(audio), reuse=True)
+        mod_freq *= 3
+        mod_freq += 8  # Varying modulation
+        modulator = oscillators.get_fm('alien_carrier', 8, 'alien_lfo', 3).generate_fm(mod_freq, reuse=True)
         
-        return audio * (1 + 0.4 * modulator)
+        # audio * (1 + 0.4 * modulator)
+        modulator *= 0.4
+        modulator += 1
+        return np.multiply(audio, modulator, out=out)
     
-    def _apply_horror_distortion(self, audio: np.ndarray) -> np.ndarray:
+    def _apply_horror_distortion(self, audio: np.ndarray,
+                                 out: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply horror-style distortion and filtering"""
         # Soft clipping distortion
         drive = 3.0
-        distorted = np.tanh(drive * audio) / np.tanh(drive)
+        distorted = np.multiply(audio, drive, out=out)
+        np.tanh(distorted, out=distorted)
+        distorted *= 1.0 / float(np.tanh(drive))
         
         # Low-pass filter for darker sound
-        nyquist = self.sample_rate / 2
         cutoff = 2000  # Hz
-        b, a = signal.butter(3, cutoff/nyquist, btype='low')
-        filtered = signal.filtfilt(b, a, distorted)
+        filtered = zero_phase_filter(distorted, 3, cutoff, 'low', self.sample_rate)
         
-        return filtered * 0.8
+        filtered *= 0.8
+        return filtered
     
-    def _apply_radio_compression(self, audio: np.ndarray) -> np.ndarray:
+    def _apply_radio_compression(self, audio: np.ndarray,
+                                 out: Optional[np.ndarray] = None,
+                                 scratch: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply radio-style compression"""
         # Simple dynamic range compression
         threshold = 0.3
         ratio = 4.0
         
-        abs_audio = np.abs(audio)
-        compressed = np.where(abs_audio > threshold,
-                            threshold + (abs_audio - threshold) / ratio,
-                            abs_audio)
+        # Above the threshold threshold + (x - threshold) / ratio is the smaller
+        # value, below it x is, so the knee is a single minimum
+        compressed = np.abs(audio, out=out)
+        knee = np.multiply(compressed, 1.0 / ratio, out=scratch)
+        knee += threshold * (1.0 - 1.0 / ratio)
+        np.minimum(compressed, knee, out=compressed)
         
-        return np.sign(audio) * compressed
+        return np.copysign(compressed, audio, out=compressed)
     
-    def _apply_vocoder_effect(self, audio: np.ndarray) -> np.ndarray:
+    def _apply_vocoder_effect(self, audio: np.ndarray,
+                              oscillators: Optional[OscillatorBank] = None,
+                              out: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply computer-like vocoder effect"""
+        if oscillators is None:
+            oscillators = OscillatorBank(self.sample_rate)
+        
         # Band-pass filtering into multiple bands
-        num_bands = 8
-        nyquist = self.sample_rate / 2
+        num_bands = self.vocoder_bands
         
         # Define frequency bands
         min_freq = 200
         max_freq = 4000
         bands = np.logspace(np.log10(min_freq), np.log10(max_freq), num_bands + 1)
         
-        vocoded = np.zeros_like(audio)
+        if out is None:
+            out = np.zeros_like(audio)
+        else:
+            out.fill(0)
+        vocoded = out
+        # Median filter along time only
+        kernel_size = (1,) * (audio.ndim - 1) + (min(num_samples(audio), 21),)
         
         for i in range(num_bands):
-            low = bands[i] / nyquist
-            high = bands[i + 1] / nyquist
-            
             # Band-pass filter
-            b, a = signal.butter(3, [low, high], btype='band')
-            band_signal = signal.filtfilt(b, a, audio)
+            band = (float(bands[i]), float(bands[i + 1]))
+            band_signal = zero_phase_filter(audio, 3, band, 'band', self.sample_rate)
             
             # Simple envelope following
-            envelope = np.abs(band_signal)
-            envelope = signal.medfilt(envelope, kernel_size=min(len(envelope), 21))
+            envelope = np.abs(band_signal, out=band_signal)
+            envelope = signal.medfilt(envelope, kernel_size=kernel_size)
             
             # Generate carrier
             carrier_freq = (bands[i] + bands[i + 1]) / 2
-            t = np.arange(len(audio)) / self.sample_rate
-            carrier = np.sin(2 * np.pi * carrier_freq * t)
+            carrier = oscillators.get(f'vocoder_band_{i}', carrier_freq).generate(num_samples(audio), reuse=True)
             
             # Apply envelope to carrier
-            vocoded += envelope * carrier
+            envelope *= carrier
+            vocoded += envelope
         
-        return vocoded * 0.3
+        vocoded *= 0.3
+        return vocoded
     
     def _apply_echo_effect(self, audio: np.ndarray, delay: float = 0.3, 
-                          decay: float = 0.5) -> np.ndarray:
+                          decay: float = 0.5, out: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply echo effect"""
         delay_samples = int(delay * self.sample_rate)
         
-        if delay_samples >= len(audio):
+        if delay_samples >= num_samples(audio) or delay_samples <= 0:
             return audio
         
-        echo = np.zeros_like(audio)
-        echo[delay_samples:] = audio[:-delay_samples] * decay
+        if out is None:
+            out = np.empty_like(audio)
+        out[..., :delay_samples] = audio[..., :delay_samples]
+        np.multiply(audio[..., :-delay_samples], decay, out=out[..., delay_samples:])
+        out[..., delay_samples:] += audio[..., delay_samples:]
         
-        return audio + echo
+        return out
     
-    def _apply_reverb_effect(self, audio: np.ndarray) -> np.ndarray:
+    def _apply_reverb_effect(self, audio: np.ndarray, out: Optional[np.ndarray] = None,
+                             scratch: Optional[np.ndarray] = None) -> np.ndarray:
         """Apply simple reverb effect"""
         # Create multiple delayed and attenuated copies
-        reverb_audio = audio.copy()
+        if out is None:
+            out = np.empty_like(audio)
+        if scratch is None:
+            scratch = np.empty_like(audio)
+        out[:] = audio
         
         delays = [0.03, 0.07, 0.15, 0.25]  # seconds
         gains = [0.3, 0.2, 0.15, 0.1]
         
         for delay, gain in zip(delays, gains):
             delay_samples = int(delay * self.sample_rate)
-            if delay_samples < len(audio):
-                delayed = np.zeros_like(audio)
-                delayed[delay_samples:] = audio[:-delay_samples] * gain
-                reverb_audio += delayed
+            if 0 < delay_samples < num_samples(audio):
+                delayed = np.multiply(audio[..., :-delay_samples], gain, out=scratch[..., :-delay_samples])
+                out[..., delay_samples:] += delayed
         
-        return reverb_audio
+        return out
     
-    def process_audio_chunk(self, audio: np.ndarray, settings: dict) -> np.ndarray:
-        """Process audio chunk with all effects"""
-        processed = audio.copy()
+    def process_audio_chunk(self, audio: np.ndarray, settings: dict,
+                            state: Optional[ProcessingState] = None) -> np.ndarray:
+        """Process audio chunk with all effects
+
+        `settings['normalize']` (default True) controls the final level stage,
+        so callers that level afterwards can skip it. Whole buffers are peak
+        normalized; streaming sessions go through their GainStage (configured
+        by the `gain_*` and `agc_max_gain_db` settings) and come out delayed by
+        its lookahead.
+        """
+        # Stages never write into their input, so a read-only frame needs no copy
+        processed = as_audio(audio)
+        pool = state.buffer_pool if state is not None else None
+        streaming = state is not None and state.streaming
         
         # Apply noise reduction first
         if settings.get('noise_reduction_enabled', False):
-            processed = self.apply_noise_reduction(processed)
+            engine_name = settings.get('noise_reduction_engine', DEFAULT_NOISE_REDUCTION_ENGINE)
+            processed = self.apply_noise_reduction(processed, engine_name, state)
+        
+        normalize = settings.get('normalize', True)
+        # Whole buffers normalize in the fused effect tail pass
+        normalize_to = 0.9 if normalize and not streaming else None
         
         # Apply voice effects
         if settings.get('voice_change_enabled', False):
+            check_cancelled()
             effect = settings.get('voice_effect', 'none')
             custom_pitch = settings.get('pitch_shift', 0.0)
-            processed = self.apply_voice_effect(processed, effect, custom_pitch)
+            pitch_engine = settings.get('pitch_engine', DEFAULT_PITCH_ENGINE)
+            processed = self.apply_voice_effect(processed, effect, custom_pitch, state, normalize_to, pitch_engine)
+            if normalize_to is not None:
+                return processed
         
-        # Normalize to prevent clipping
-        if np.max(np.abs(processed)) > 0:
-            processed = processed / np.max(np.abs(processed)) * 0.9
+        if normalize:
+            processed = apply_output_gain(processed, state, self.sample_rate, settings,
+                                          out=get_output_buffer(pool, 'chunk_normalize', processed) if pool else None)
         
         return processed
 
@@ -384,6 +563,12 @@ class VirtualAudioDevice:
         }
 
 
+@lru_cache(maxsize=8)
+def get_voice_processor(sample_rate: int = 16000) -> AdvancedVoiceProcessor:
+    """Get the shared processor for a sample rate (uploads run at their source rate)"""
+    return AdvancedVoiceProcessor(sample_rate)
+
+
 # Initialize global instances
-voice_processor = AdvancedVoiceProcessor()
+voice_processor = get_voice_processor(16000)
 virtual_device = VirtualAudioDevice()
\ No newline at end of file
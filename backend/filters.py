@@ -0,0 +1,27 @@
+"""
+Filter Design Module
+Cached float32 Butterworth designs shared by the effect stages
+"""
+
+from functools import lru_cache
+from typing import Tuple, Union
+
+import numpy as np
+from scipy import signal
+
+from dtype_policy import AUDIO_DTYPE
+
+
+@lru_cache(maxsize=128)
+def butter_sos(order: int, cutoff: Union[float, Tuple[float, float]], btype: str,
+               sample_rate: int) -> np.ndarray:
+    """Design a Butterworth filter as float32 second-order sections (cutoff in Hz)"""
+    sos = signal.butter(order, cutoff, btype=btype, fs=sample_rate, output='sos')
+    # Not flagged read-only: scipy's sosfilt needs a writeable buffer
+    return sos.astype(AUDIO_DTYPE)
+
+
+def zero_phase_filter(audio: np.ndarray, order: int, cutoff: Union[float, Tuple[float, float]],
+                      btype: str, sample_rate: int) -> np.ndarray:
+    """Forward-backward Butterworth filtering that stays in float32"""
+    return signal.sosfiltfilt(butter_sos(order, cutoff, btype, sample_rate), audio)
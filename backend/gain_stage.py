@@ -0,0 +1,172 @@
+"""
+Gain Stage Module
+Streaming AGC with a lookahead peak limiter for live sessions
+
+Peak-normalizing every live chunk to 0.9 made the gain jump at each chunk
+boundary and boosted quiet chunks to full scale. A GainStage keeps its state
+across the chunks of one session and makes the level decision in one pass:
+
+- AGC: a peak envelope followed every AGC_BLOCK_MS with attack/release
+  smoothing sets a gain towards `target`, bounded by `max_gain` and held while
+  the input stays below the noise floor or the caller holds it (chunks the
+  VAD found silent). The gain is ramped between blocks.
+- Limiter: the AGC output is delayed by the lookahead. The gain that keeps
+  each sample under `target` is held over the lookahead window and ramped in
+  with a moving average, so it is fully applied when the peak arrives, then
+  released through a one-pole filter.
+
+The output is the input delayed by `latency` samples (the lookahead). Whole
+buffers (uploads) keep static peak normalization: with the entire signal
+known, one gain is the ideal level and the limiter would have nothing to do.
+"""
+
+from typing import Optional
+
+import numpy as np
+from scipy.ndimage import minimum_filter1d
+from scipy.signal import lfilter
+
+from buffer_pool import normalize_peak
+from dtype_policy import AUDIO_DTYPE
+from resampling import num_samples
+
+AGC_BLOCK_MS = 10.0  # resolution of the AGC envelope
+LIMITER_RELEASE_MS = 50.0
+NOISE_FLOOR = 10 ** (-50 / 20)  # the AGC gain is held below this envelope
+DEFAULT_TARGET = 0.9
+
+
+class GainStage:
+    """Per-session AGC and lookahead limiter; output never exceeds `target`"""
+
+    def __init__(self, sample_rate: int, target: float = DEFAULT_TARGET, lookahead_ms: float = 5.0,
+                 attack_ms: float = 10.0, release_ms: float = 500.0, max_gain_db: float = 12.0):
+        self.sample_rate = sample_rate
+        self.target = target
+        self._params = None
+        self.configure(lookahead_ms, attack_ms, release_ms, max_gain_db)
+
+    def configure(self, lookahead_ms: float, attack_ms: float, release_ms: float, max_gain_db: float):
+        """Apply new parameters; a changed lookahead restarts the stage"""
+        params = (lookahead_ms, attack_ms, release_ms, max_gain_db)
+        if params == self._params:
+            return
+        lookahead = max(int(round(lookahead_ms * self.sample_rate / 1000)), 1)
+        restart = self._params is None or lookahead != self.lookahead
+        self._params = params
+        self.lookahead = lookahead
+        self.block = max(int(AGC_BLOCK_MS * self.sample_rate / 1000), 1)
+        # Envelope coefficients per AGC block, limiter release per sample
+        self.attack = float(np.exp(-AGC_BLOCK_MS / max(attack_ms, 1e-3)))
+        self.release = float(np.exp(-AGC_BLOCK_MS / max(release_ms, 1e-3)))
+        self.limiter_release = float(np.exp(-1000.0 / (LIMITER_RELEASE_MS * self.sample_rate)))
+        self.max_gain = 10 ** (max_gain_db / 20)
+        if restart:
+            self.reset()
+
+    @property
+    def latency(self) -> int:
+        """Delay added by the lookahead, in samples"""
+        return self.lookahead
+
+    def reset(self):
+        self._envelope: Optional[float] = None
+        self._ramp = (1.0, 1.0)  # AGC gains set by the last two complete blocks
+        self._offset = 0  # position in the current AGC block
+        self._pending_peak = 0.0  # peak of the current block so far
+        self._delay: Optional[np.ndarray] = None  # last `lookahead` samples after the AGC
+        self._delay_level = np.zeros(self.lookahead)
+        self._held = np.ones(self.lookahead)  # last `lookahead` held limiter gains
+        self._release_state = np.array([self.limiter_release])  # lfilter state of a settled gain of 1
+
+    def _agc_gains(self, level: np.ndarray, hold: bool = False) -> np.ndarray:
+        """Per-sample AGC gain for the channel-linked magnitude `level`
+
+        Blocks are aligned to the session's sample position, not to chunks.
+        During each block the gain ramps between the gains set by the two
+        blocks before it, so the result does not depend on the chunk size.
+        With `hold` the blocks keep the last gain and leave the envelope as is.
+        """
+        length = len(level)
+        block = self.block
+        edges = np.arange(-self._offset, length, block)  # block starts; the first may lie in the last chunk
+        peaks = np.maximum.reduceat(level, np.maximum(edges, 0))
+        ramp_from = np.empty(len(edges))
+        ramp_to = np.empty(len(edges))
+        for index, peak in enumerate(peaks):
+            ramp_from[index], ramp_to[index] = self._ramp
+            peak = max(float(peak), self._pending_peak)
+            if edges[index] + block > length:
+                self._pending_peak = peak
+                break
+            self._pending_peak = 0.0
+            if hold:
+                self._ramp = (self._ramp[1], self._ramp[1])
+                continue
+            if self._envelope is None:
+                self._envelope = peak
+            coefficient = self.attack if peak > self._envelope else self.release
+            self._envelope = peak + coefficient * (self._envelope - peak)
+            gain = self._ramp[1]
+            if self._envelope > NOISE_FLOOR:
+                gain = min(self.target / self._envelope, self.max_gain)
+            self._ramp = (self._ramp[1], gain)
+
+        position = np.arange(self._offset, self._offset + length)
+        index, fraction = np.divmod(position, block)
+        self._offset = (self._offset + length) % block
+        return ramp_from[index] + (ramp_to[index] - ramp_from[index]) * ((fraction + 1) / block)
+
+    def process(self, audio: np.ndarray, out: Optional[np.ndarray] = None, hold_agc: bool = False) -> np.ndarray:
+        """Level one chunk, (samples,) or (channels, samples); delayed by `latency`"""
+        length = num_samples(audio)
+        if length == 0:
+            return audio
+        lookahead = self.lookahead
+        magnitude = np.abs(audio)
+        level = magnitude.max(axis=0) if audio.ndim > 1 else magnitude
+
+        agc_gain = self._agc_gains(level, hold_agc)
+        if self._delay is None or self._delay.shape[:-1] != audio.shape[:-1]:
+            self._delay = np.zeros(audio.shape[:-1] + (lookahead,), dtype=AUDIO_DTYPE)
+        buffered = np.concatenate([self._delay, audio * agc_gain.astype(AUDIO_DTYPE)], axis=-1)
+        self._delay = buffered[..., length:].copy()
+
+        # Gain keeping each sample under target, held over the next `lookahead` samples
+        buffered_level = np.concatenate([self._delay_level, level * agc_gain])
+        self._delay_level = buffered_level[length:]
+        required = np.minimum(1.0, self.target / np.maximum(buffered_level, 1e-12))
+        held = minimum_filter1d(required, lookahead + 1, mode='nearest',
+                                origin=-((lookahead + 1) // 2))[:length]
+
+        # Moving average over the lookahead never exceeds the held gain of the sample it lands on
+        history = np.concatenate([self._held, held])
+        cumulative = np.concatenate([[0.0], np.cumsum(history)])
+        ramp = (cumulative[lookahead + 1:] - cumulative[:-(lookahead + 1)]) / (lookahead + 1)
+        self._held = history[-lookahead:]
+
+        coefficient = self.limiter_release
+        released, self._release_state = lfilter([1.0 - coefficient], [1.0, -coefficient], ramp,
+                                                zi=self._release_state)
+        gain = np.minimum(ramp, released).astype(AUDIO_DTYPE)
+        return np.multiply(buffered[..., :length], gain, out=out)
+
+
+def get_gain_stage(state, sample_rate: int, settings: Optional[dict] = None) -> GainStage:
+    """The session's gain stage, created on first use and kept in sync with `settings`"""
+    settings = settings or {}
+    params = (settings.get('gain_lookahead_ms', 5.0), settings.get('gain_attack_ms', 10.0),
+              settings.get('gain_release_ms', 500.0), settings.get('agc_max_gain_db', 12.0))
+    if state.gain_stage is None:
+        state.gain_stage = GainStage(sample_rate, DEFAULT_TARGET, *params)
+    else:
+        state.gain_stage.configure(*params)
+    return state.gain_stage
+
+
+def apply_output_gain(audio: np.ndarray, state, sample_rate: int, settings: Optional[dict] = None,
+                      out: Optional[np.ndarray] = None, hold_agc: bool = False) -> np.ndarray:
+    """Final level stage: the session's GainStage when streaming, peak normalization otherwise"""
+    if state is not None and state.streaming:
+        return get_gain_stage(state, sample_rate, settings).process(audio, out=out, hold_agc=hold_agc)
+    return normalize_peak(audio, DEFAULT_TARGET, out=out)
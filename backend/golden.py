@@ -0,0 +1,341 @@
+"""
+Golden Output Harness
+Numerical regression checks for the processing stages and presets
+
+`freeze` runs every stage and preset on deterministic inputs and stores the
+outputs as the reference. `check` runs them again with the current code and
+compares each output with its reference: length, lag (found by
+cross-correlation and aligned away before comparing), SNR, and log-spectral
+distance. Each case has its own tolerance, so optimized engines that change
+results slightly can still land while real regressions fail.
+
+Usage:
+    python golden.py freeze                # store reference outputs in golden/
+    python golden.py check                 # compare current outputs, exit 1 on failure
+    python golden.py check preset_female   # selected cases (prefix match)
+    python golden.py check --json          # machine-readable report
+    python golden.py list
+
+The reference set in golden/ is committed; tests/test_golden.py runs the
+check. A change that alters output on purpose re-freezes the affected cases
+in the same commit and says so.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from scipy import signal
+
+from benchmarks import add_noise, synthetic_speech
+from dtype_policy import AUDIO_DTYPE
+from effect_tail import EffectTail
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from noise_reduction import NOISE_REDUCTION_ENGINES
+from oscillator import OscillatorBank
+from processing_state import ProcessingState
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 4096
+GOLDEN_DIR = Path(__file__).parent / 'golden'
+MAX_LAG_SEARCH = 4096  # samples searched either way when aligning outputs
+SPECTRUM_FFT = 1024
+
+
+class Tolerance:
+    """Limits a candidate output must stay within
+
+    `min_snr_db` is the SNR of the candidate against the reference after lag
+    alignment, `max_spectral_distance_db` the mean log-spectral distance,
+    `max_lag` the largest allowed shift in samples and `max_length_diff` the
+    largest allowed length difference.
+    """
+
+    def __init__(self, min_snr_db: float, max_spectral_distance_db: float,
+                 max_lag: int = 0, max_length_diff: int = 0):
+        self.min_snr_db = min_snr_db
+        self.max_spectral_distance_db = max_spectral_distance_db
+        self.max_lag = max_lag
+        self.max_length_diff = max_length_diff
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+# Sample-wise stages should match almost exactly; filter and STFT stages may
+# change with float32 or a new FFT backend; resynthesis (pitch, noise
+# reduction) may change more and may add latency.
+EXACT = Tolerance(min_snr_db=60.0, max_spectral_distance_db=0.5)
+FILTER = Tolerance(min_snr_db=40.0, max_spectral_distance_db=1.0)
+SPECTRAL = Tolerance(min_snr_db=30.0, max_spectral_distance_db=2.0)
+RESYNTHESIS = Tolerance(min_snr_db=20.0, max_spectral_distance_db=3.0, max_lag=512)
+LIVE = Tolerance(min_snr_db=20.0, max_spectral_distance_db=3.0, max_lag=1024)
+# Carrier phase drift over a long buffer shows up far below EXACT's 60 dB
+LONG_BUFFER = Tolerance(min_snr_db=100.0, max_spectral_distance_db=0.1)
+LONG_BUFFER_MINUTES = 10
+
+# Presets whose chain includes pitch shifting
+PITCH_PRESETS = ('female', 'male', 'girl', 'baby', 'old_man', 'horror', 'cartoon', 'deep_radio')
+
+
+def golden_inputs() -> Dict[str, np.ndarray]:
+    """Deterministic inputs: clean and noisy speech, and a stereo pair"""
+    clean = synthetic_speech(3.0, seed=0)
+    noisy = add_noise(clean, 5.0, seed=1)
+    other = add_noise(synthetic_speech(3.0, seed=2), 10.0, seed=3)
+    return {
+        'clean': clean,
+        'noisy': noisy,
+        'stereo': np.stack([noisy, other]).astype(AUDIO_DTYPE),
+    }
+
+
+def _process_live(processor: AdvancedVoiceProcessor, audio: np.ndarray, settings: dict) -> np.ndarray:
+    """Run a preset chunk by chunk through one streaming session"""
+    state = ProcessingState(SAMPLE_RATE, streaming=True, chunk_size=CHUNK_SIZE)
+    outputs = []
+    for start in range(0, len(audio) - CHUNK_SIZE + 1, CHUNK_SIZE):
+        state.buffer_pool.begin_chunk()
+        # Pooled buffers are reused by the next chunk
+        outputs.append(np.array(processor.process_audio_chunk(audio[start:start + CHUNK_SIZE], settings, state)))
+    return np.concatenate(outputs)
+
+
+def golden_cases(processor: AdvancedVoiceProcessor, inputs: Dict[str, np.ndarray]) -> Dict[str, tuple]:
+    """Case name -> (function producing the output, tolerance)"""
+    clean, noisy, stereo = inputs['clean'], inputs['noisy'], inputs['stereo']
+    cases = {
+        'stage_spectral_subtraction': (lambda: processor._spectral_subtraction(noisy), SPECTRAL),
+        'stage_speech_enhancement': (lambda: processor._enhance_speech_segments(noisy), EXACT),
+        'stage_formant_shift_up': (lambda: processor._apply_formant_shift(clean, 1.4), SPECTRAL),
+        'stage_formant_shift_down': (lambda: processor._apply_formant_shift(clean, 0.7), SPECTRAL),
+        'stage_pitch_shift': (lambda: _pitch_only(processor, clean), RESYNTHESIS),
+        'stage_brightness_up': (lambda: processor._adjust_brightness(clean, 1.3), FILTER),
+        'stage_brightness_down': (lambda: processor._adjust_brightness(clean, 0.6), FILTER),
+        'stage_robotize': (lambda: processor._robotize_voice(clean), EXACT),
+        'stage_alien_modulation': (lambda: processor._apply_alien_modulation(clean), EXACT),
+        'stage_horror_distortion': (lambda: processor._apply_horror_distortion(clean), FILTER),
+        'stage_radio_compression': (lambda: processor._apply_radio_compression(clean), EXACT),
+        'stage_vocoder': (lambda: processor._apply_vocoder_effect(clean), FILTER),
+        'stage_echo': (lambda: processor._apply_echo_effect(clean), EXACT),
+        'stage_reverb': (lambda: processor._apply_reverb_effect(clean), EXACT),
+        'tail_modulation_long': (lambda: _long_modulation(clean), LONG_BUFFER),
+    }
+    for name in NOISE_REDUCTION_ENGINES:
+        cases[f'noise_reduction_{name}'] = (
+            lambda name=name: processor.apply_noise_reduction(noisy, name), RESYNTHESIS)
+
+    for effect in processor.voice_effects:
+        tolerance = RESYNTHESIS if effect in PITCH_PRESETS else SPECTRAL
+        settings = {'noise_reduction_enabled': False, 'voice_change_enabled': True, 'voice_effect': effect}
+        cases[f'preset_{effect}'] = (
+            lambda settings=settings: processor.process_audio_chunk(clean, settings), tolerance)
+        denoised = {**settings, 'noise_reduction_enabled': True}
+        cases[f'preset_{effect}_noisy'] = (
+            lambda settings=denoised: processor.process_audio_chunk(noisy, settings), RESYNTHESIS)
+        cases[f'live_{effect}'] = (
+            lambda settings=denoised: _process_live(processor, noisy, settings), LIVE)
+    cases.update(_server_cases(clean))
+    cases['preset_female_stereo'] = (
+        lambda: processor.process_audio_chunk(stereo, {'noise_reduction_enabled': True,
+                                                       'voice_change_enabled': True,
+                                                       'voice_effect': 'female'}), RESYNTHESIS)
+    return cases
+
+
+def _server_cases(clean: np.ndarray) -> Dict[str, tuple]:
+    """The server's own ENHANCED_VOICE_EFFECTS chain (its fallback when the processor is missing)"""
+    try:
+        import server
+    except ImportError:
+        return {}
+    cases = {}
+    for effect in server.ENHANCED_VOICE_EFFECTS:
+        tolerance = RESYNTHESIS if effect in PITCH_PRESETS else SPECTRAL
+        cases[f'server_{effect}'] = (
+            lambda effect=effect: server.apply_enhanced_voice_effect(clean, SAMPLE_RATE, effect), tolerance)
+    return cases
+
+
+def _long_modulation(audio: np.ndarray) -> np.ndarray:
+    """Robotize and alien modulation fused over one long buffer; the last second is kept"""
+    repeats = LONG_BUFFER_MINUTES * 60 * SAMPLE_RATE // len(audio)
+    bank = OscillatorBank(SAMPLE_RATE)
+    tail = EffectTail(SAMPLE_RATE)
+    tail.robotize(bank)
+    tail.alien_modulation(bank)
+    return tail.run(np.tile(audio, repeats))[-SAMPLE_RATE:]
+
+
+def _pitch_only(processor: AdvancedVoiceProcessor, audio: np.ndarray) -> np.ndarray:
+    """Pitch shift alone, through a temporary preset on the harness's own processor"""
+    processor.voice_effects['_golden_pitch'] = {'pitch_shift': 4}
+    try:
+        return processor.apply_voice_effect(audio, '_golden_pitch')
+    finally:
+        processor.voice_effects.pop('_golden_pitch', None)
+
+
+def find_lag(reference: np.ndarray, candidate: np.ndarray, max_lag: int = MAX_LAG_SEARCH) -> int:
+    """Shift (in samples) by which `candidate` trails `reference`, from cross-correlation"""
+    reference = reference.reshape(-1, reference.shape[-1])[0].astype(np.float64)
+    candidate = candidate.reshape(-1, candidate.shape[-1])[0].astype(np.float64)
+    correlation = signal.correlate(candidate, reference, mode='full', method='fft')
+    zero = len(reference) - 1
+    low, high = max(zero - max_lag, 0), min(zero + max_lag + 1, len(correlation))
+    return int(np.argmax(correlation[low:high]) + low - zero)
+
+
+def _align(reference: np.ndarray, candidate: np.ndarray, lag: int):
+    if lag > 0:
+        candidate = candidate[..., lag:]
+    elif lag < 0:
+        reference = reference[..., -lag:]
+    n = min(reference.shape[-1], candidate.shape[-1])
+    return reference[..., :n].astype(np.float64), candidate[..., :n].astype(np.float64)
+
+
+def snr_db(reference: np.ndarray, candidate: np.ndarray) -> float:
+    error = np.sum((reference - candidate) ** 2)
+    power = np.sum(reference ** 2)
+    if error == 0:
+        return float('inf')
+    return float(10 * np.log10((power + 1e-20) / error))
+
+
+def spectral_distance_db(reference: np.ndarray, candidate: np.ndarray) -> float:
+    """Mean over frames of the RMS difference between dB magnitude spectra"""
+    _, _, ref_spec = signal.stft(reference, nperseg=SPECTRUM_FFT, axis=-1)
+    _, _, cand_spec = signal.stft(candidate, nperseg=SPECTRUM_FFT, axis=-1)
+    floor = 1e-6 * max(float(np.max(np.abs(ref_spec))), 1e-12)
+    ref_db = 20 * np.log10(np.abs(ref_spec) + floor)
+    cand_db = 20 * np.log10(np.abs(cand_spec) + floor)
+    return float(np.mean(np.sqrt(np.mean((ref_db - cand_db) ** 2, axis=-2))))
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, tolerance: Tolerance) -> dict:
+    """Compare one candidate output with its reference"""
+    result = {
+        'reference_shape': list(reference.shape),
+        'candidate_shape': list(candidate.shape),
+        'candidate_dtype': str(candidate.dtype),
+        'failures': [],
+    }
+    if reference.shape[:-1] != candidate.shape[:-1]:
+        result['failures'].append('channel layout differs')
+        return result
+    length_diff = candidate.shape[-1] - reference.shape[-1]
+    lag = find_lag(reference, candidate) if tolerance.max_lag else 0
+    aligned_reference, aligned_candidate = _align(reference, candidate, lag)
+    result.update({
+        'length_diff': length_diff,
+        'lag': lag,
+        'snr_db': snr_db(aligned_reference, aligned_candidate),
+        'spectral_distance_db': spectral_distance_db(aligned_reference, aligned_candidate),
+    })
+
+    if abs(length_diff) > tolerance.max_length_diff:
+        result['failures'].append(f"length differs by {length_diff} samples")
+    if abs(lag) > tolerance.max_lag:
+        result['failures'].append(f"lag {lag} exceeds {tolerance.max_lag}")
+    if result['snr_db'] < tolerance.min_snr_db:
+        result['failures'].append(f"SNR {result['snr_db']:.1f} dB below {tolerance.min_snr_db} dB")
+    if result['spectral_distance_db'] > tolerance.max_spectral_distance_db:
+        result['failures'].append(f"spectral distance {result['spectral_distance_db']:.2f} dB "
+                                  f"above {tolerance.max_spectral_distance_db} dB")
+    if candidate.dtype != AUDIO_DTYPE:
+        result['failures'].append(f"dtype {candidate.dtype}, expected {np.dtype(AUDIO_DTYPE)}")
+    return result
+
+
+def _select(cases: Dict[str, tuple], patterns: List[str]) -> Dict[str, tuple]:
+    if not patterns:
+        return cases
+    return {name: case for name, case in cases.items() if any(name.startswith(p) for p in patterns)}
+
+
+def freeze(patterns: List[str], golden_dir: Path = GOLDEN_DIR) -> Dict[str, list]:
+    """Store the current outputs as the reference (merging into existing references)"""
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    cases = _select(golden_cases(processor, golden_inputs()), patterns)
+    golden_dir.mkdir(parents=True, exist_ok=True)
+    reference_path = golden_dir / 'reference.npz'
+    outputs = dict(np.load(reference_path)) if reference_path.exists() else {}
+    for name, (produce, _) in cases.items():
+        outputs[name] = np.asarray(produce())
+    np.savez_compressed(reference_path, **outputs)
+    manifest = {
+        'sample_rate': SAMPLE_RATE,
+        'numpy': np.__version__,
+        'cases': {name: list(output.shape) for name, output in sorted(outputs.items())},
+    }
+    (golden_dir / 'manifest.json').write_text(json.dumps(manifest, indent=2))
+    return {name: list(outputs[name].shape) for name in cases}
+
+
+def check(patterns: List[str], golden_dir: Path = GOLDEN_DIR) -> Dict[str, dict]:
+    """Compare the current outputs with the reference"""
+    reference_path = golden_dir / 'reference.npz'
+    if not reference_path.exists():
+        raise FileNotFoundError(f"no reference outputs in {golden_dir}; run `python golden.py freeze` first")
+    references = np.load(reference_path)
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    results = {}
+    for name, (produce, tolerance) in _select(golden_cases(processor, golden_inputs()), patterns).items():
+        if name not in references:
+            results[name] = {'failures': ['no reference output (freeze this case)']}
+            continue
+        results[name] = compare(references[name], np.asarray(produce()), tolerance)
+        results[name]['tolerance'] = tolerance.to_dict()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden output regression harness")
+    parser.add_argument('command', choices=['freeze', 'check', 'list'])
+    parser.add_argument('cases', nargs='*', help="case name prefixes (default: all)")
+    parser.add_argument('--golden-dir', type=Path, default=GOLDEN_DIR, help="reference directory")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_intermixed_args()  # options may follow the case prefixes
+
+    if args.command == 'list':
+        cases = golden_cases(AdvancedVoiceProcessor(SAMPLE_RATE), golden_inputs())
+        for name, (_, tolerance) in _select(cases, args.cases).items():
+            print(f"{name:36s} {tolerance.to_dict()}")
+        return
+
+    if args.command == 'freeze':
+        frozen = freeze(args.cases, args.golden_dir)
+        print(f"froze {len(frozen)} cases in {args.golden_dir}")
+        return
+
+    try:
+        results = check(args.cases, args.golden_dir)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    failed = [name for name, result in results.items() if result['failures']]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            status = 'FAIL' if result['failures'] else 'ok'
+            if 'snr_db' in result:
+                print(f"{status:4s} {name:36s} snr {result['snr_db']:8.1f} dB  "
+                      f"lsd {result['spectral_distance_db']:6.2f} dB  lag {result['lag']:5d}  "
+                      f"len {result['length_diff']:+d}")
+            else:
+                print(f"{status:4s} {name:36s}")
+            for failure in result['failures']:
+                print(f"       {failure}")
+        print(f"{len(results) - len(failed)}/{len(results)} cases within tolerance")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
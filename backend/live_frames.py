@@ -0,0 +1,167 @@
+"""
+Live Frame Queue Module
+Sequence-numbered live frames and a bounded per-session queue with a latency budget
+
+Clients stamp each frame with a sequence number and a capture time (ms on
+the client's clock). The receiver task puts frames into a LiveFrameQueue and
+the processing task takes them out; frames that are out of order, that
+overflow the queue or that are older than the latency budget are dropped
+unprocessed, because late audio is worse than missing audio for live voice.
+"""
+
+import asyncio
+import struct
+import time
+from collections import deque
+from typing import Deque, Optional
+
+# Optional binary frame header: uint32 sequence number, float64 capture time (ms)
+FRAME_HEADER = struct.Struct('<Id')
+
+
+def now_ms() -> float:
+    return time.monotonic() * 1000.0
+
+
+class LiveFrame:
+    """One live audio frame and its timing"""
+
+    __slots__ = ('payload', 'seq', 'capture_ts', 'binary', 'received_at')
+
+    def __init__(self, payload, seq: Optional[int] = None, capture_ts: Optional[float] = None,
+                 binary: bool = False):
+        self.payload = payload
+        self.seq = seq
+        self.capture_ts = capture_ts
+        self.binary = binary
+        self.received_at = now_ms()
+
+    @classmethod
+    def from_binary(cls, data: bytes, has_header: bool) -> 'LiveFrame':
+        """Parse a binary frame; the PCM payload is a view, not a copy"""
+        if not has_header:
+            return cls(data, binary=True)
+        seq, capture_ts = FRAME_HEADER.unpack_from(data)
+        return cls(memoryview(data)[FRAME_HEADER.size:], seq, capture_ts, binary=True)
+
+    def header(self) -> bytes:
+        """Header echoed on the processed frame so the client can match it"""
+        return FRAME_HEADER.pack(self.seq or 0, self.capture_ts or 0.0)
+
+
+class FrameStats:
+    """Per-session frame counters reported back to the client"""
+
+    def __init__(self):
+        self.received = 0
+        self.processed = 0
+        self.dropped_stale = 0  # older than the latency budget when dequeued
+        self.dropped_overflow = 0  # pushed out of a full queue
+        self.late = 0  # arrived after a newer frame (out of order or duplicate)
+        self.missing = 0  # sequence gaps: frames that never arrived
+        self._reported_losses = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.dropped_stale + self.dropped_overflow + self.late
+
+    def losses_changed(self) -> bool:
+        """True once after any drop, late or missing frame since the last call"""
+        losses = self.dropped + self.missing
+        changed = losses != self._reported_losses
+        self._reported_losses = losses
+        return changed
+
+    def to_dict(self) -> dict:
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'dropped_stale': self.dropped_stale,
+            'dropped_overflow': self.dropped_overflow,
+            'late': self.late,
+            'missing': self.missing,
+        }
+
+
+class LiveFrameQueue:
+    """Bounded frame queue between a session's receiver and processing tasks
+
+    Frame age is measured on the client's capture clock: the smallest
+    (arrival - capture) seen so far estimates the clock offset plus the best
+    network delay, and anything beyond that is queueing and jitter. Frames
+    without a capture time are aged from their arrival.
+    """
+
+    def __init__(self, max_frames: int = 8, latency_budget_ms: float = 300.0):
+        self.max_frames = max_frames
+        self.latency_budget_ms = latency_budget_ms
+        self.frames: Deque[LiveFrame] = deque()
+        self.stats = FrameStats()
+        self.last_seq: Optional[int] = None
+        self.clock_offset: Optional[float] = None
+        self.closed = False
+        self._available = asyncio.Event()
+
+    def configure(self, max_frames: int, latency_budget_ms: float):
+        self.max_frames = max(1, max_frames)
+        self.latency_budget_ms = latency_budget_ms
+        while len(self.frames) > self.max_frames:
+            self.frames.popleft()
+            self.stats.dropped_overflow += 1
+
+    def age_ms(self, frame: LiveFrame, now: Optional[float] = None) -> float:
+        """How long ago the frame was captured, net of the clock offset"""
+        now = now_ms() if now is None else now
+        if frame.capture_ts is None or self.clock_offset is None:
+            return now - frame.received_at
+        return now - frame.capture_ts - self.clock_offset
+
+    def put_nowait(self, frame: LiveFrame):
+        """Queue a frame, dropping late frames and the oldest frame on overflow"""
+        self.stats.received += 1
+        if frame.seq is not None:
+            if self.last_seq is not None:
+                if frame.seq <= self.last_seq:
+                    self.stats.late += 1
+                    return
+                self.stats.missing += frame.seq - self.last_seq - 1
+            self.last_seq = frame.seq
+        if frame.capture_ts is not None:
+            offset = frame.received_at - frame.capture_ts
+            if self.clock_offset is None or offset < self.clock_offset:
+                self.clock_offset = offset
+
+        if len(self.frames) >= self.max_frames:
+            self.frames.popleft()
+            self.stats.dropped_overflow += 1
+        self.frames.append(frame)
+        self._available.set()
+
+    async def get(self) -> Optional[LiveFrame]:
+        """Next frame within the latency budget, or None once the queue is closed"""
+        while True:
+            while self.frames:
+                frame = self.frames.popleft()
+                if self.age_ms(frame) > self.latency_budget_ms:
+                    self.stats.dropped_stale += 1
+                    continue
+                return frame
+            if self.closed:
+                return None
+            self._available.clear()
+            await self._available.wait()
+
+    def close(self, discard: bool = False) -> int:
+        """Wake the processing task so it can finish
+
+        With `discard` (the client is gone) queued frames are dropped instead of
+        processed; returns how many.
+        """
+        self.closed = True
+        discarded = 0
+        if discard:
+            discarded = len(self.frames)
+            self.frames.clear()
+        self._available.set()
+        return discarded
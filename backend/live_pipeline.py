@@ -0,0 +1,278 @@
+"""
+Live Pipeline Module
+Pipeline-parallel processing of one live session across worker processes
+
+A heavy live chain (noise reduction, pitch shifting, vocoder) runs serially
+on one core, so the slowest preset sets the session's throughput floor. A
+LivePipeline splits the chain into stages, each running in its own worker
+process with its own ProcessingState. Stages are connected by rings of
+fixed-size sample slots in shared memory, so the first stage denoises chunk
+k+1 while the second runs the effects on chunk k. Only small
+(seq, length, meta) messages cross process boundaries; samples are never
+pickled. A stage may add entries to a chunk's meta for the stages after it
+(the first stage's speech decision, for instance).
+
+Each stage keeps the state of the part of the chain it runs, so the output
+matches the serial chain. A chunk still takes the sum of the stage times to
+come out, but a backlog drains at the rate of the slowest stage instead of
+the whole chain.
+
+Workers start like the segment workers (`segmented.get_worker_context`), from
+a forkserver rather than a fork of the threaded server, so stage functions
+and their arguments must be picklable.
+"""
+
+import logging
+import os
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Callable, Deque, List, Optional, Tuple
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE, as_audio
+from processing_state import ProcessingState
+from segmented import get_worker_context
+
+LIVE_PIPELINE_SLOTS = int(os.environ.get('LIVE_PIPELINE_SLOTS', 4))  # chunks buffered between two stages
+PIPELINE_TIMEOUT = float(os.environ.get('LIVE_PIPELINE_TIMEOUT', 5.0))  # seconds before a stage counts as stalled
+START_TIMEOUT = 60.0  # seconds for every worker to warm up its stage
+STATS_WINDOW = 200  # recent chunks kept for stage timings
+
+# process_fn(audio, settings, state, meta) -> processed audio of the same length; meta travels with the chunk
+StageFn = Callable[[np.ndarray, object, ProcessingState, dict], np.ndarray]
+
+
+class PipelineStage:
+    """A named part of the chain; `process_fn` must be picklable"""
+
+    def __init__(self, name: str, process_fn: StageFn):
+        self.name = name
+        self.process_fn = process_fn
+
+
+class SlotRing:
+    """Single-producer, single-consumer ring of sample slots in shared memory
+
+    The producer waits for a free slot, writes the samples and sends
+    (seq, length, meta) through a queue; the consumer copies the slot out and
+    frees it. Slots are used in sequence order, so a chunk's slot is
+    seq % slots.
+    """
+
+    def __init__(self, context, slots: int, capacity: int):
+        self.slots = slots
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * capacity * np.dtype(AUDIO_DTYPE).itemsize)
+        self.free = context.Semaphore(slots)
+        self.ready = context.Queue()
+
+    def _slot(self, seq: int) -> np.ndarray:
+        offset = (seq % self.slots) * self.capacity * np.dtype(AUDIO_DTYPE).itemsize
+        return np.ndarray((self.capacity,), dtype=AUDIO_DTYPE, buffer=self.shm.buf, offset=offset)
+
+    def put(self, seq: int, audio: np.ndarray, meta: dict, timeout: Optional[float] = None):
+        if len(audio) > self.capacity:
+            raise ValueError(f"Chunk of {len(audio)} samples exceeds the {self.capacity}-sample slots")
+        if not self.free.acquire(timeout=timeout):
+            raise TimeoutError("No free slot in the live pipeline")
+        self._slot(seq)[:len(audio)] = audio
+        self.ready.put((seq, len(audio), meta))
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[int, np.ndarray, dict]]:
+        """The next chunk, or None once the producer has shut down; raises queue.Empty on timeout"""
+        message = self.ready.get(timeout=timeout)
+        if message is None:
+            return None
+        seq, length, meta = message
+        audio = self._slot(seq)[:length].copy()
+        self.free.release()
+        return seq, audio, meta
+
+    def shutdown(self):
+        self.ready.put(None)
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _stage_worker(stage: PipelineStage, source: SlotRing, sink: SlotRing, sample_rate: int,
+                  chunk_size: int, cpu: Optional[int], settings, started_queue):
+    """Worker process: run one stage on every chunk from `source` into `sink`"""
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    # Imports, caches and JIT compilation happen here rather than on the first live chunk
+    started = time.perf_counter()
+    try:
+        noise = np.random.default_rng(0).standard_normal(chunk_size).astype(AUDIO_DTYPE) * 1e-3
+        stage.process_fn(noise, settings, ProcessingState(sample_rate, streaming=True, chunk_size=chunk_size), {})
+    except Exception as e:
+        logging.warning(f"Live pipeline stage {stage.name} warm-up failed: {e}")
+    started_queue.put((os.getpid(), time.perf_counter() - started))
+
+    state = ProcessingState(sample_rate, streaming=True, chunk_size=chunk_size)
+    while True:
+        item = source.get()
+        if item is None:
+            sink.shutdown()
+            return
+        seq, audio, meta = item
+        # Settings travel only when they change
+        settings = meta.get('settings', settings)
+        started = time.perf_counter()
+        state.buffer_pool.begin_chunk()
+        try:
+            processed = as_audio(stage.process_fn(audio, settings, state, meta))
+        except Exception as e:
+            logging.error(f"Live pipeline stage {stage.name} failed: {e}")
+            processed = audio
+        meta['timings'] = meta.get('timings', []) + [time.perf_counter() - started]
+        sink.put(seq, processed[:sink.capacity], meta)
+
+
+class LivePipeline:
+    """Stages of one live session in worker processes, fed and drained in chunk order
+
+    `submit` and `receive` block, so call them from threads; there may be up
+    to `slots` chunks in flight per ring.
+    """
+
+    def __init__(self, stages: List[PipelineStage], sample_rate: int, chunk_size: int,
+                 slots: int = LIVE_PIPELINE_SLOTS):
+        self.stages = stages
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.slots = slots
+        self.rings: List[SlotRing] = []
+        self.processes = []
+        self.cpus: List[Optional[int]] = []
+        self.warm_up_seconds: List[float] = []
+        self.submitted = 0
+        self.received = 0
+        self.failed = False  # a stage stalled or shut down
+        self._sent_settings = None
+        self._stage_seconds: List[Deque[float]] = [deque(maxlen=STATS_WINDOW) for _ in stages]
+        self._backlogged_periods: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self._last_output: Optional[float] = None
+
+    def start(self, settings):
+        """Start one worker per stage, pinned to its own core when there are enough
+
+        Returns once every worker has warmed up its stage with `settings`.
+        """
+        # Same start method as the segment process pool: never a fork of the threaded server
+        context = get_worker_context()
+        started_queue = context.Queue()
+        self.rings = [SlotRing(context, self.slots, self.chunk_size) for _ in range(len(self.stages) + 1)]
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+        # Leave the first core to the event loop
+        if len(available) > len(self.stages):
+            self.cpus = available[1:len(self.stages) + 1]
+        else:
+            self.cpus = [None] * len(self.stages)
+        for index, stage in enumerate(self.stages):
+            process = context.Process(
+                target=_stage_worker, name=f"live-{stage.name}", daemon=True,
+                args=(stage, self.rings[index], self.rings[index + 1], self.sample_rate, self.chunk_size,
+                      self.cpus[index], settings, started_queue)
+            )
+            process.start()
+            self.processes.append(process)
+        self._sent_settings = settings
+
+        warm_up = {}
+        try:
+            while len(warm_up) < len(self.processes):
+                pid, seconds = started_queue.get(timeout=START_TIMEOUT)
+                warm_up[pid] = seconds
+        except queue.Empty:
+            self.close()
+            raise TimeoutError("Live pipeline workers did not start")
+        self.warm_up_seconds = [warm_up[process.pid] for process in self.processes]
+        logging.info(f"Live pipeline started: {', '.join(stage.name for stage in self.stages)}")
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.processes) and not self.failed and all(process.is_alive() for process in self.processes)
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.received
+
+    def submit(self, audio: np.ndarray, settings):
+        """Queue one mono chunk; waits while the first ring is full"""
+        meta = {}
+        if settings is not self._sent_settings:
+            meta['settings'] = settings
+            self._sent_settings = settings
+        self.rings[0].put(self.submitted, as_audio(audio), meta, timeout=PIPELINE_TIMEOUT)
+        self.submitted += 1
+
+    def receive(self) -> np.ndarray:
+        """The next processed chunk, in submission order"""
+        try:
+            item = self.rings[-1].get(timeout=PIPELINE_TIMEOUT)
+        except queue.Empty:
+            self.failed = True
+            raise TimeoutError("Live pipeline stalled")
+        if item is None:
+            self.failed = True
+            raise RuntimeError("Live pipeline shut down")
+        _, audio, meta = item
+        self.received += 1
+        for seconds, timings in zip(meta['timings'], self._stage_seconds):
+            timings.append(seconds)
+
+        # Output spacing measures throughput only while chunks wait in the pipeline
+        now = time.perf_counter()
+        if self._last_output is not None and self.in_flight > 0:
+            self._backlogged_periods.append(now - self._last_output)
+        self._last_output = now
+        return audio
+
+    def get_stats(self) -> dict:
+        """Stage placement and timings, and the throughput gain over running the stages serially"""
+        stages = []
+        for stage, process, cpu, seconds, timings in zip(self.stages, self.processes, self.cpus,
+                                                         self.warm_up_seconds, self._stage_seconds):
+            stages.append({
+                'name': stage.name,
+                'pid': process.pid,
+                'cpu': cpu,  # None: not pinned, scheduled by the OS
+                'warm_up_ms': seconds * 1000.0,
+                'mean_ms': float(np.mean(timings)) * 1000.0 if timings else None,
+                'max_ms': float(np.max(timings)) * 1000.0 if timings else None,
+            })
+        means = [stage['mean_ms'] for stage in stages if stage['mean_ms'] is not None]
+        serial_ms = sum(means) if means else None
+        bottleneck_ms = max(means) if means else None
+        period_ms = float(np.median(self._backlogged_periods)) * 1000.0 if self._backlogged_periods else None
+        return {
+            'stages': stages,
+            'chunks': self.received,
+            'in_flight': self.in_flight,
+            'serial_ms': serial_ms,  # one chunk through every stage
+            'bottleneck_ms': bottleneck_ms,
+            'expected_speedup': serial_ms / bottleneck_ms if bottleneck_ms else None,
+            # Measured only while backlogged; real-time input leaves the pipeline idle between chunks
+            'measured_period_ms': period_ms,
+            'measured_speedup': serial_ms / period_ms if serial_ms and period_ms else None,
+        }
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        if not self.rings:
+            return
+        self.rings[0].shutdown()
+        for process in self.processes:
+            process.join(timeout=1.0)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=1.0)
+        for ring in self.rings:
+            ring.release()
+        self.rings = []
+        logging.info(f"Live pipeline stopped after {self.received} chunks")
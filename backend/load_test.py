@@ -0,0 +1,317 @@
+"""
+WebSocket Load Test
+Simulates N concurrent microphone clients against /ws/audio-enhanced
+
+Each session sends a settings_update with one preset from a mix, then
+streams CHUNK_SIZE-sample frames at real-time pace, stamped with seq and
+capture_ts. Round trips are matched on the echoed seq. Frames answered
+after the deadline count as late; frames never answered count as dropped.
+While the sessions run, the server process is sampled for CPU and RSS.
+
+Usage:
+    python load_test.py --start-server --sessions 1 2 4 8     # capacity curve on a local server
+    python load_test.py --url ws://localhost:8000/ws/audio-enhanced --sessions 4
+    python load_test.py --audio speech.wav --duration 30 --report report.json
+
+The report is JSON with one run per session count, so the runs plot as a
+capacity curve (sessions vs. round-trip percentiles).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+from benchmarks import synthetic_speech
+from dtype_policy import AUDIO_DTYPE
+from live_frames import FRAME_HEADER
+from resampling import resample, to_mono
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 4096
+BACKEND_DIR = Path(__file__).parent
+
+# Settings mix cycled across sessions: cheap, typical and heavy chains
+PRESET_MIX = [
+    {'noise_reduction_enabled': True, 'voice_change_enabled': False, 'voice_effect': 'none'},
+    {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': 'female'},
+    {'noise_reduction_enabled': False, 'voice_change_enabled': True, 'voice_effect': 'robotic'},
+    {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': 'computer'},
+    {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': 'wall_echo'},
+]
+
+
+def load_source_audio(path: Optional[str]) -> np.ndarray:
+    """Mono 16 kHz float32 audio to stream: a file, or synthetic speech"""
+    if path is None:
+        return synthetic_speech(10.0)
+    import soundfile as sf
+    audio, sample_rate = sf.read(path, dtype='float32', always_2d=True)
+    return resample(to_mono(audio.T), sample_rate, SAMPLE_RATE).astype(AUDIO_DTYPE)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None, 'max': None}
+    data = np.asarray(values)
+    return {
+        'p50': float(np.percentile(data, 50)),
+        'p95': float(np.percentile(data, 95)),
+        'p99': float(np.percentile(data, 99)),
+        'mean': float(np.mean(data)),
+        'max': float(np.max(data)),
+    }
+
+
+class SessionResult:
+    def __init__(self, preset: dict):
+        self.preset = preset
+        self.sent = 0
+        self.received = 0
+        self.late = 0
+        self.round_trips_ms: List[float] = []
+        self.server_frame_stats: dict = {}
+        self.error: Optional[str] = None
+
+
+async def run_session(url: str, audio: np.ndarray, preset: dict, duration: float,
+                      deadline_ms: float, binary: bool, start_delay: float) -> SessionResult:
+    """One simulated microphone: stream chunks in real time and time each round trip"""
+    result = SessionResult(preset)
+    sent_at: Dict[int, float] = {}
+    chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+    num_chunks = int(duration / chunk_seconds)
+
+    await asyncio.sleep(start_delay)
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            settings = {**preset, 'chunk_size': CHUNK_SIZE, 'frame_header': binary}
+            await websocket.send(json.dumps({'type': 'settings_update', 'settings': settings}))
+
+            async def receive():
+                async for message in websocket:
+                    received_at = time.perf_counter()
+                    if isinstance(message, bytes):
+                        seq, _ = FRAME_HEADER.unpack_from(message)
+                    else:
+                        data = json.loads(message)
+                        if 'frame_stats' in data:
+                            result.server_frame_stats = data['frame_stats']
+                        if data.get('type') != 'processed_audio':
+                            continue
+                        seq = data.get('seq')
+                    if seq not in sent_at:
+                        continue
+                    round_trip = (received_at - sent_at.pop(seq)) * 1000.0
+                    result.received += 1
+                    result.round_trips_ms.append(round_trip)
+                    if round_trip > deadline_ms:
+                        result.late += 1
+
+            receiver = asyncio.create_task(receive())
+            start = time.perf_counter()
+            for seq in range(num_chunks):
+                # Real-time pace: chunk k leaves when it would have been captured
+                await asyncio.sleep(max(0.0, start + seq * chunk_seconds - time.perf_counter()))
+                offset = (seq * CHUNK_SIZE) % max(len(audio) - CHUNK_SIZE, 1)
+                chunk = audio[offset:offset + CHUNK_SIZE].tobytes()
+                capture_ts = time.perf_counter() * 1000.0
+                sent_at[seq] = time.perf_counter()
+                if binary:
+                    await websocket.send(FRAME_HEADER.pack(seq, capture_ts) + chunk)
+                else:
+                    await websocket.send(json.dumps({
+                        'type': 'audio_data',
+                        'audio_data': base64.b64encode(chunk).decode('ascii'),
+                        'seq': seq,
+                        'capture_ts': capture_ts
+                    }))
+                result.sent += 1
+
+            # Give in-flight frames one deadline to come back
+            await asyncio.sleep(deadline_ms / 1000.0)
+            receiver.cancel()
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+
+class ServerSampler:
+    """Samples CPU% and RSS of the server process (and its children) in the background"""
+
+    def __init__(self, pid: Optional[int], interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: List[float] = []
+        self.rss_mb: List[float] = []
+        self._task = None
+
+    def _processes(self):
+        process = psutil.Process(self.pid)
+        return [process] + process.children(recursive=True)
+
+    async def _run(self):
+        processes = self._processes()
+        for process in processes:
+            process.cpu_percent(None)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                processes = self._processes()
+                self.cpu_percent.append(sum(process.cpu_percent(None) for process in processes))
+                self.rss_mb.append(sum(process.memory_info().rss for process in processes) / 1e6)
+            except psutil.Error:
+                return
+
+    def start(self):
+        if self.pid is not None and PSUTIL_AVAILABLE:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> dict:
+        if self._task is not None:
+            self._task.cancel()
+        if not self.cpu_percent:
+            return {'sampled': False}
+        return {
+            'sampled': True,
+            'cpu_percent_mean': float(np.mean(self.cpu_percent)),
+            'cpu_percent_max': float(np.max(self.cpu_percent)),
+            'rss_mb_mean': float(np.mean(self.rss_mb)),
+            'rss_mb_max': float(np.max(self.rss_mb)),
+        }
+
+
+async def run_load(url: str, audio: np.ndarray, sessions: int, duration: float,
+                   deadline_ms: float, binary: bool, server_pid: Optional[int]) -> dict:
+    """Run `sessions` concurrent clients and summarize the run"""
+    chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+    sampler = ServerSampler(server_pid)
+    sampler.start()
+    # Stagger session starts across one chunk so frames don't all arrive together
+    results = await asyncio.gather(*[
+        run_session(url, audio, PRESET_MIX[i % len(PRESET_MIX)], duration, deadline_ms, binary,
+                    start_delay=chunk_seconds * i / sessions)
+        for i in range(sessions)
+    ])
+    server = sampler.stop()
+
+    round_trips = [rt for result in results for rt in result.round_trips_ms]
+    sent = sum(result.sent for result in results)
+    received = sum(result.received for result in results)
+    per_preset: Dict[str, List[float]] = {}
+    for result in results:
+        per_preset.setdefault(result.preset['voice_effect'], []).extend(result.round_trips_ms)
+
+    return {
+        'sessions': sessions,
+        'chunks_sent': sent,
+        'chunks_received': received,
+        'chunks_dropped': sent - received,
+        'chunks_late': sum(result.late for result in results),
+        'drop_rate': (sent - received) / sent if sent else 0.0,
+        'round_trip_ms': percentiles(round_trips),
+        'round_trip_ms_by_preset': {name: percentiles(values) for name, values in per_preset.items()},
+        'server_frame_stats': [result.server_frame_stats for result in results],
+        'errors': [result.error for result in results if result.error],
+        'server': server,
+    }
+
+
+def start_local_server(port: int) -> subprocess.Popen:
+    """Start uvicorn on this backend and wait until the API answers"""
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env={**os.environ, 'PYTHONUNBUFFERED': '1'}
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("server did not start within 60s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the live WebSocket path")
+    parser.add_argument('--url', help="WebSocket URL (default: the local server)")
+    parser.add_argument('--start-server', action='store_true', help="start a local uvicorn server")
+    parser.add_argument('--port', type=int, default=8765, help="port for --start-server")
+    parser.add_argument('--server-pid', type=int, help="pid of an already running server to sample")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="session counts to run, one run each")
+    parser.add_argument('--duration', type=float, default=15.0, help="seconds streamed per run")
+    parser.add_argument('--deadline-ms', type=float, default=300.0,
+                        help="round trips above this count as late")
+    parser.add_argument('--audio', help="audio file to stream (default: synthetic speech)")
+    parser.add_argument('--binary', action='store_true', help="send binary frames instead of JSON/base64")
+    parser.add_argument('--report', help="write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    if not PSUTIL_AVAILABLE:
+        print("psutil not installed: server CPU/RSS will not be sampled", file=sys.stderr)
+
+    server = None
+    server_pid = args.server_pid
+    url = args.url
+    if args.start_server:
+        server = start_local_server(args.port)
+        server_pid = server.pid
+        url = url or f"ws://127.0.0.1:{args.port}/ws/audio-enhanced"
+    if url is None:
+        parser.error("give --url or --start-server")
+
+    audio = load_source_audio(args.audio)
+    report = {
+        'url': url,
+        'chunk_size': CHUNK_SIZE,
+        'sample_rate': SAMPLE_RATE,
+        'duration_s': args.duration,
+        'deadline_ms': args.deadline_ms,
+        'binary': args.binary,
+        'cpu_count': os.cpu_count(),
+        'runs': [],
+    }
+    try:
+        for sessions in args.sessions:
+            run = asyncio.run(run_load(url, audio, sessions, args.duration, args.deadline_ms,
+                                       args.binary, server_pid))
+            report['runs'].append(run)
+            rtt = run['round_trip_ms']
+            print(f"{sessions:4d} sessions: p50 {rtt['p50'] or 0:8.1f} ms  p95 {rtt['p95'] or 0:8.1f} ms  "
+                  f"p99 {rtt['p99'] or 0:8.1f} ms  late {run['chunks_late']:5d}  "
+                  f"dropped {run['chunks_dropped']:5d}", file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.report:
+        Path(args.report).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""
+Noise Reduction Engines
+Selectable noise reduction backends with per-session state for live processing
+"""
+
+import abc
+import logging
+from typing import Dict, Optional, Type
+
+import numpy as np
+import noisereduce as nr
+import scipy.fft
+
+try:
+    # Private to noisereduce (tested with 3.0.3); without it long buffers go through nr.reduce_noise
+    from noisereduce.spectralgate.nonstationary import SpectralGateNonStationary
+except ImportError:
+    SpectralGateNonStationary = None
+
+from cancellation import check_cancelled
+from spectral import fft_workers, get_fft_workers
+
+
+class NoiseReductionEngine(abc.ABC):
+    """Base class for noise reduction engines
+
+    `process` handles a complete buffer (uploads); `process_chunk` handles one
+    live chunk and may keep state and add a fixed latency.
+    """
+
+    name = 'base'
+    multichannel = False  # whether `process` accepts (channels, samples) directly
+
+    def __init__(self, sample_rate: int = 16000):
+        self.sample_rate = sample_rate
+
+    @property
+    def latency(self) -> int:
+        """Latency in samples added by `process_chunk`"""
+        return 0
+
+    @abc.abstractmethod
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Denoise a complete buffer"""
+
+    def process_chunk(self, audio: np.ndarray) -> np.ndarray:
+        return self.process(audio)
+
+    def process_channels(self, audio: np.ndarray) -> np.ndarray:
+        """Process a complete (channels, samples) or mono buffer"""
+        if audio.ndim == 1 or self.multichannel:
+            return self.process(audio)
+        return np.stack([self.process(channel) for channel in audio])
+
+    def prime(self, audio: np.ndarray):
+        """Learn from a whole buffer before it is processed in separate pieces"""
+
+    def skip(self, audio: np.ndarray):
+        """Take a live chunk that bypasses the engine; it holds no speech"""
+
+    def reset(self):
+        """Forget any state carried across chunks"""
+
+
+class NoisereduceEngine(NoiseReductionEngine):
+    """Non-stationary noisereduce (re-estimates the noise over the whole buffer every call)
+
+    noisereduce filters buffers longer than its chunk size in independent,
+    padded chunks. Those are run here one at a time, with the same output, so
+    a cancelled request stops between chunks. This drives noisereduce's
+    private SpectralGateNonStationary; if that is missing or has changed, the
+    whole buffer goes through nr.reduce_noise and can only be cancelled
+    before or after it.
+    """
+
+    name = 'noisereduce'
+    multichannel = True
+    chunk_size = 600000  # noisereduce's defaults
+    padding = 30000
+    _gate_warned = False
+
+    def _chunked_gate(self, audio: np.ndarray):
+        """noisereduce's gate for `audio`, or None if its internals are not the ones this was written for"""
+        gate = None
+        if SpectralGateNonStationary is not None:
+            try:
+                gate = SpectralGateNonStationary(
+                    y=audio, sr=self.sample_rate, chunk_size=self.chunk_size, padding=self.padding, n_fft=1024,
+                    win_length=None, hop_length=None, time_constant_s=2.0, freq_mask_smooth_hz=500,
+                    time_mask_smooth_ms=50, thresh_n_mult_nonstationary=2, sigmoid_slope_nonstationary=10,
+                    tmp_folder=None, prop_decrease=1.0, use_tqdm=False, n_jobs=1
+                )
+            except TypeError:  # its constructor's arguments changed
+                pass
+        if gate is None or not all(hasattr(gate, name) for name in ('y', 'n_frames', 'flat', 'filter_chunk')):
+            if not NoisereduceEngine._gate_warned:
+                logging.warning("noisereduce internals changed; long buffers are denoised in one uncancellable call")
+                NoisereduceEngine._gate_warned = True
+            return None
+        return gate
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        with fft_workers():
+            gate = self._chunked_gate(audio) if audio.shape[-1] > self.chunk_size else None
+            if gate is None:
+                return nr.reduce_noise(y=audio, sr=self.sample_rate, stationary=False,
+                                       chunk_size=self.chunk_size, padding=self.padding)
+            output = np.empty(gate.y.shape, dtype=audio.dtype)
+            for start in range(0, gate.n_frames, self.chunk_size):
+                check_cancelled()
+                end = min(start + self.chunk_size, gate.n_frames)
+                output[:, start:end] = gate.filter_chunk(start, start + self.chunk_size)[:, :end - start]
+            return output[0] if gate.flat else output
+
+
+class StationaryNoiseEngine(NoiseReductionEngine):
+    """Stationary noisereduce against a cached noise clip
+
+    The clip is the quietest `profile_seconds` of audio seen so far. In live mode
+    the stored clip level slowly ages so the profile follows a changing room.
+    """
+
+    name = 'stationary'
+
+    def __init__(self, sample_rate: int = 16000, profile_seconds: float = 0.5,
+                 profile_decay: float = 1.02):
+        super().__init__(sample_rate)
+        self.profile_samples = int(profile_seconds * sample_rate)
+        self.profile_decay = profile_decay
+        self.noise_clip: Optional[np.ndarray] = None
+        self.noise_level = np.inf
+
+    def _quietest_window(self, audio: np.ndarray) -> np.ndarray:
+        """Find the lowest-energy window of `profile_samples` in the buffer"""
+        window = min(self.profile_samples, len(audio))
+        energy = np.concatenate(([0.0], np.cumsum(np.square(audio, dtype=np.float64))))
+        window_energy = energy[window:] - energy[:-window]
+        start = int(np.argmin(window_energy))
+        return audio[start:start + window]
+
+    def _update_profile(self, audio: np.ndarray):
+        candidate = self._quietest_window(audio)
+        level = float(np.sqrt(np.mean(np.square(candidate)))) if len(candidate) else np.inf
+        self.noise_level *= self.profile_decay
+        if self.noise_clip is None or level < self.noise_level:
+            self.noise_clip = np.array(candidate, dtype=np.float32)
+            self.noise_level = level
+
+    def prime(self, audio: np.ndarray):
+        """Take the noise profile from the quietest window of the whole buffer"""
+        self._update_profile(np.mean(audio, axis=0) if audio.ndim > 1 else audio)
+
+    def skip(self, audio: np.ndarray):
+        self.prime(audio)
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        if len(audio) == 0:
+            return audio
+        self._update_profile(audio)
+        with fft_workers():
+            return nr.reduce_noise(y=audio, sr=self.sample_rate, stationary=True,
+                                   y_noise=self.noise_clip)
+
+    def reset(self):
+        self.noise_clip = None
+        self.noise_level = np.inf
+
+
+class SpectralGateEngine(NoiseReductionEngine):
+    """Streaming spectral gate with a Wiener-style gain and a tracked noise floor
+
+    Frames use a square-root Hann window at 50% overlap so analysis and
+    synthesis together reconstruct perfectly. The noise floor per bin follows
+    the minimum of the smoothed power and rises slowly, so no noise-only lead-in
+    is needed. All scratch buffers are kept between chunks.
+    """
+
+    name = 'spectral_gate'
+
+    def __init__(self, sample_rate: int = 16000, n_fft: int = 512,
+                 over_subtraction: float = 1.5, min_gain_db: float = -20.0,
+                 power_smoothing: float = 0.7, noise_rise_db_per_s: float = 3.0):
+        super().__init__(sample_rate)
+        self.n_fft = n_fft
+        self.hop = n_fft // 2
+        self.over_subtraction = over_subtraction
+        self.min_gain = 10 ** (min_gain_db / 20)
+        self.power_smoothing = power_smoothing
+        frames_per_second = sample_rate / self.hop
+        self.noise_rise = 10 ** (noise_rise_db_per_s / 10 / frames_per_second)
+
+        self.window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+        self._frames = np.zeros((0, n_fft), dtype=np.float32)
+        self._power = np.zeros((0, n_fft // 2 + 1), dtype=np.float32)
+        self._noise = np.zeros((0, n_fft // 2 + 1), dtype=np.float32)
+        self.reset()
+
+    @property
+    def latency(self) -> int:
+        return self.n_fft - self.hop
+
+    def reset(self):
+        self._history = np.zeros(self.n_fft - self.hop, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._overlap = np.zeros(self.hop, dtype=np.float32)
+        self._output = np.zeros(0, dtype=np.float32)
+        self._smoothed_power: Optional[np.ndarray] = None
+        self._noise_power: Optional[np.ndarray] = None
+        self._primed = False
+
+    def _get_buffers(self, num_frames: int):
+        if self._frames.shape[0] < num_frames:
+            self._frames = np.empty((num_frames, self.n_fft), dtype=np.float32)
+            self._power = np.empty((num_frames, self.n_fft // 2 + 1), dtype=np.float32)
+            self._noise = np.empty((num_frames, self.n_fft // 2 + 1), dtype=np.float32)
+        return self._frames[:num_frames], self._power[:num_frames], self._noise[:num_frames]
+
+    def _track_noise(self, power: np.ndarray, noise_frames: np.ndarray):
+        """Smooth the power and follow the noise floor frame by frame, in place"""
+        if self._smoothed_power is None:
+            self._smoothed_power = power[0].copy()
+            self._noise_power = power[0].copy()
+        smoothed = self._smoothed_power
+        noise = self._noise_power
+        a = self.power_smoothing
+        for i in range(power.shape[0]):
+            smoothed *= a
+            smoothed += (1 - a) * power[i]
+            noise *= self.noise_rise
+            np.minimum(noise, smoothed, out=noise)
+            power[i] = smoothed
+            noise_frames[i] = noise
+
+    def _gate_frames(self, samples: np.ndarray) -> np.ndarray:
+        """Gate every complete frame in `samples`; returns the overlap-added output"""
+        num_frames = (len(samples) - self.n_fft) // self.hop + 1
+        frames, power, noise = self._get_buffers(num_frames)
+        view = np.lib.stride_tricks.sliding_window_view(samples, self.n_fft)[::self.hop]
+        np.multiply(view[:num_frames], self.window, out=frames)
+
+        spectrum = scipy.fft.rfft(frames, axis=1, workers=get_fft_workers())
+        np.square(spectrum.real, out=power)
+        power += np.square(spectrum.imag)
+        self._track_noise(power, noise)
+
+        # Wiener-style gain from the smoothed a-posteriori SNR
+        power += 1e-12
+        gain = np.divide(noise, power, out=power)
+        gain *= -self.over_subtraction
+        gain += 1.0
+        np.maximum(gain, self.min_gain, out=gain)
+        spectrum *= gain
+
+        frames = scipy.fft.irfft(spectrum, n=self.n_fft, axis=1, workers=get_fft_workers()).astype(np.float32, copy=False)
+        frames *= self.window
+
+        # 50% overlap-add: each hop is this frame's head plus the previous frame's tail
+        output = frames[:, :self.hop].copy()
+        output[0] += self._overlap
+        output[1:] += frames[:-1, self.hop:]
+        self._overlap = frames[-1, self.hop:].copy()
+        return output.reshape(-1)
+
+    def skip(self, audio: np.ndarray):
+        # Gating is cheap; running it keeps the overlap and the noise floor continuous
+        self.process_chunk(audio)
+
+    def process_chunk(self, audio: np.ndarray) -> np.ndarray:
+        audio = np.asarray(audio, dtype=np.float32)
+        num_samples = len(audio)
+        if not self._primed:
+            # Chunks that are not a multiple of the hop need one hop of slack
+            if num_samples % self.hop:
+                self._output = np.zeros(self.hop, dtype=np.float32)
+            self._primed = True
+
+        samples = np.concatenate((self._history, self._pending, audio))
+        num_frames = (len(samples) - self.n_fft) // self.hop + 1 if len(samples) >= self.n_fft else 0
+        if num_frames > 0:
+            gated = self._gate_frames(samples)
+            consumed = num_frames * self.hop
+            self._output = np.concatenate((self._output, gated)) if len(self._output) else gated
+        else:
+            consumed = 0
+
+        remaining = samples[consumed:]
+        self._history = remaining[:self.n_fft - self.hop].copy()
+        self._pending = remaining[self.n_fft - self.hop:].copy()
+
+        if len(self._output) < num_samples:
+            padding = np.zeros(num_samples - len(self._output), dtype=np.float32)
+            self._output = np.concatenate((padding, self._output))
+        result = self._output[:num_samples]
+        self._output = self._output[num_samples:]
+        return result
+
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """Gate a complete buffer from a fresh state with the latency removed"""
+        self.reset()
+        self._primed = True
+        num_samples = len(audio)
+        # Flush the latency and round up to whole hops so every sample is gated
+        total = -(-(num_samples + self.latency) // self.hop) * self.hop
+        padded = np.zeros(total, dtype=np.float32)
+        padded[:num_samples] = audio
+        output = self.process_chunk(padded)
+        self.reset()
+        return output[self.latency:self.latency + num_samples]
+
+
+NOISE_REDUCTION_ENGINES: Dict[str, Type[NoiseReductionEngine]] = {
+    NoisereduceEngine.name: NoisereduceEngine,
+    StationaryNoiseEngine.name: StationaryNoiseEngine,
+    SpectralGateEngine.name: SpectralGateEngine,
+}
+
+DEFAULT_NOISE_REDUCTION_ENGINE = NoisereduceEngine.name
+
+
+def create_noise_engine(name: str, sample_rate: int = 16000) -> NoiseReductionEngine:
+    """Create a noise reduction engine by name, falling back to the default engine"""
+    engine_class = NOISE_REDUCTION_ENGINES.get(name)
+    if engine_class is None:
+        logging.warning(f"Unknown noise reduction engine '{name}', using '{DEFAULT_NOISE_REDUCTION_ENGINE}'")
+        engine_class = NOISE_REDUCTION_ENGINES[DEFAULT_NOISE_REDUCTION_ENGINE]
+    return engine_class(sample_rate)
@@ -0,0 +1,117 @@
+"""
+Outbound Queue Module
+Bounded per-connection send queues drained by one writer task each
+
+Awaiting send_text inline let one stalled client block whoever was sending:
+a status broadcast waited on every subscriber in turn, and a session's own
+processing loop waited on its socket. Messages are now put on the
+connection's OutboundQueue without waiting, and its writer task sends them in
+order. A full queue drops its oldest droppable message: processed audio
+frames, which the next frame supersedes. Control and status messages
+(settings acknowledgements, device status, pipeline stats, errors) are sent
+once and never dropped; with no frame left to drop they queue past the limit.
+A queue that stays full for SLOW_CLIENT_TIMEOUT seconds, without draining to
+half, marks a slow consumer to be evicted.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple, Union
+
+OUTBOUND_MAX_MESSAGES = int(os.environ.get('OUTBOUND_MAX_MESSAGES', 64))
+SLOW_CLIENT_TIMEOUT = float(os.environ.get('SLOW_CLIENT_TIMEOUT', 5.0))  # seconds full before eviction
+CLOSE_TIMEOUT = 1.0  # seconds to get the close frame to an evicted client
+
+Message = Union[str, bytes]
+
+
+class OutboundQueue:
+    """Messages waiting to be sent on one WebSocket, in order"""
+
+    def __init__(self, websocket, max_messages: int = OUTBOUND_MAX_MESSAGES,
+                 full_timeout: float = SLOW_CLIENT_TIMEOUT):
+        self.websocket = websocket
+        self.max_messages = max(1, max_messages)
+        self.full_timeout = full_timeout
+        self.messages: Deque[Tuple[Message, bool]] = deque()  # (message, droppable)
+        self.droppable = 0  # queued messages that may be dropped
+        self.sent = 0
+        self.dropped = 0  # pushed out of a full queue
+        self.closed = False
+        self.full_since: Optional[float] = None
+        self._available = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    def put_nowait(self, message: Message, droppable: bool = False) -> bool:
+        """Queue a message; False once the queue has stayed full past the timeout
+
+        Only `droppable` messages are pushed out of a full queue.
+        """
+        if self.closed:
+            return True
+        if len(self.messages) >= self.max_messages:
+            now = time.monotonic()
+            if self.full_since is None:
+                self.full_since = now
+            elif now - self.full_since >= self.full_timeout:
+                return False
+            if self.droppable:
+                self._drop_oldest()
+        self.messages.append((message, droppable))
+        self.droppable += droppable
+        self._available.set()
+        return True
+
+    def _drop_oldest(self):
+        for index, (_, droppable) in enumerate(self.messages):
+            if droppable:
+                del self.messages[index]
+                self.droppable -= 1
+                self.dropped += 1
+                return
+
+    async def _write(self):
+        try:
+            while True:
+                while not self.messages:
+                    if self.closed:
+                        return
+                    self._available.clear()
+                    await self._available.wait()
+                message, droppable = self.messages.popleft()
+                self.droppable -= droppable
+                if len(self.messages) <= self.max_messages // 2:
+                    self.full_since = None
+                if isinstance(message, str):
+                    await self.websocket.send_text(message)
+                else:
+                    await self.websocket.send_bytes(message)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The connection is gone; its receive loop cleans up
+            logging.info(f"Outbound writer stopped: {e}")
+            self.closed = True
+
+    def close(self):
+        """Stop the writer; unsent messages are discarded"""
+        self.closed = True
+        self.messages.clear()
+        self.droppable = 0
+        if self._writer is not None:
+            self._writer.cancel()
+
+    def to_dict(self) -> dict:
+        return {
+            'queued': len(self.messages),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'full_for_s': time.monotonic() - self.full_since if self.full_since is not None else 0.0,
+        }
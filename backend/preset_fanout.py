@@ -0,0 +1,142 @@
+"""
+Preset Fan-out Module
+Render one input through several presets, sharing the upstream work
+
+The caller computes the shared prefix (decode, noise reduction and, for the
+WORLD pitch engine, the analysis) once. The preset-specific stages then run
+in parallel on the segment process pool: the input and the analysis arrays
+are placed in shared memory once and each task carries only its settings and
+their layout. A cancelled request stops waiting and drops the presets that
+have not started.
+
+A track equals a separate render of the same preset for every preset that
+changes the voice. The 'none' track is normalized once more than in a
+separate run and can differ by float32 rounding (about 6e-8).
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from cancellation import ProcessingCancelled, check_cancelled, wait_result
+from dtype_policy import AUDIO_DTYPE, as_audio
+from processing_state import ProcessingState
+from segmented import SEGMENT_WORKERS, get_executor
+from world_vocoder import WorldAnalysis, WorldAnalysisCache
+
+
+def _render(audio: np.ndarray, sample_rate: int, process_fn: Callable, settings,
+            analysis: Optional[WorldAnalysis]) -> np.ndarray:
+    state = ProcessingState(sample_rate)
+    if analysis is not None:
+        state.analysis_cache = WorldAnalysisCache(max_entries=1)
+        state.analysis_cache.put(audio, sample_rate, analysis)
+    return as_audio(process_fn(audio, settings=settings, state=state))
+
+
+class SharedAnalysisLayout:
+    """Where the arrays of a WorldAnalysis lie in a shared memory block"""
+
+    def __init__(self, shm_name: str, analysis: WorldAnalysis,
+                 arrays: List[Tuple[int, tuple, str]]):
+        self.shm_name = shm_name
+        self.sample_rate = analysis.sample_rate
+        self.length = analysis.length
+        self.mono = analysis.mono
+        self.arrays = arrays  # (offset, shape, dtype) of f0, envelope, aperiodicity per channel
+
+    def load(self) -> WorldAnalysis:
+        """Copy the analysis out of shared memory"""
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        try:
+            arrays = [np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset).copy()
+                      for offset, shape, dtype in self.arrays]
+        finally:
+            shm.close()
+        channels = [tuple(arrays[index:index + 3]) for index in range(0, len(arrays), 3)]
+        return WorldAnalysis(self.sample_rate, self.length, channels, self.mono)
+
+
+def share_analysis(analysis: WorldAnalysis) -> Tuple[shared_memory.SharedMemory, SharedAnalysisLayout]:
+    """Place the analysis arrays in one new shared memory block; the caller unlinks it"""
+    arrays = [array for parameters in analysis.channels for array in parameters]
+    shm = shared_memory.SharedMemory(create=True, size=max(sum(array.nbytes for array in arrays), 1))
+    layout = []
+    offset = 0
+    for array in arrays:
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=offset)[...] = array
+        layout.append((offset, array.shape, array.dtype.str))
+        offset += array.nbytes
+    return shm, SharedAnalysisLayout(shm.name, analysis, layout)
+
+
+def _render_shared(shm_name: str, shape: tuple, sample_rate: int, process_fn: Callable, settings,
+                   analysis_layout: Optional[SharedAnalysisLayout]) -> np.ndarray:
+    """Worker: render one preset from the shared input and analysis"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray(shape, dtype=AUDIO_DTYPE, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+    analysis = analysis_layout.load() if analysis_layout is not None else None
+    return _render(audio, sample_rate, process_fn, settings, analysis)
+
+
+def render_presets(audio: np.ndarray, sample_rate: int, preset_settings: Dict[str, object],
+                   process_fn: Callable, analysis: Optional[WorldAnalysis] = None,
+                   executor: Optional[ProcessPoolExecutor] = None) -> Dict[str, np.ndarray]:
+    """Render `audio` once per entry of `preset_settings` ({name: settings})
+
+    `process_fn(audio, settings=settings, state=state)` must be picklable and
+    must not repeat the shared prefix. Without spare cores (or for a single
+    preset) the presets run one after another in this process.
+    """
+    audio = as_audio(audio)
+    if len(preset_settings) <= 1 or (executor is None and SEGMENT_WORKERS <= 1):
+        results = {}
+        for name, settings in preset_settings.items():
+            check_cancelled()
+            results[name] = _render(audio, sample_rate, process_fn, settings, analysis)
+        return results
+
+    executor = executor or get_executor()
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    analysis_shm, analysis_layout = share_analysis(analysis) if analysis is not None else (None, None)
+    try:
+        shared = np.ndarray(audio.shape, dtype=AUDIO_DTYPE, buffer=shm.buf)
+        shared[...] = audio
+        del shared
+        futures = {
+            name: executor.submit(_render_shared, shm.name, audio.shape, sample_rate, process_fn, settings,
+                                  analysis_layout)
+            for name, settings in preset_settings.items()
+        }
+        try:
+            results = {name: wait_result(future) for name, future in futures.items()}
+        except ProcessingCancelled:
+            for future in futures.values():
+                future.cancel()
+            raise
+    finally:
+        shm.close()
+        shm.unlink()
+        if analysis_shm is not None:
+            analysis_shm.close()
+            analysis_shm.unlink()
+
+    logging.info(f"Rendered {len(results)} presets on up to {SEGMENT_WORKERS} workers")
+    return results
+
+
+def preset_names(requested: Optional[str], available: List[str]) -> List[str]:
+    """Comma-separated preset ids, or every available one; raises ValueError on unknown ids"""
+    if not requested:
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown presets: {', '.join(unknown)}")
+    return names
@@ -0,0 +1,64 @@
+"""
+Processing State Module
+Per-session DSP state carried across live audio chunks
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from buffer_pool import BufferPool
+from noise_reduction import NoiseReductionEngine, create_noise_engine
+from oscillator import OscillatorBank
+
+
+class ProcessingState:
+    """State owned by one processing session (a WebSocket connection or a single upload)
+
+    `streaming` is True for live sessions, where stages process chunk by chunk
+    and may carry state and latency between calls. Live sessions also get a
+    buffer pool sized from the negotiated chunk size.
+
+    A segment of a longer upload starts its oscillators at `start_sample` and
+    may carry estimates from a global analysis pass (`noise_spectrum`,
+    `vad_energy_threshold`) so every segment uses the same ones.
+
+    Renders of an upload session share the session's WORLD `analysis_cache`.
+    Live sessions level their output with a `gain_stage` instead of
+    normalizing each chunk, and may bypass the chain for chunks their `vad`
+    finds silent.
+    """
+
+    def __init__(self, sample_rate: int = 16000, streaming: bool = False,
+                 chunk_size: int = 4096, start_sample: int = 0):
+        self.sample_rate = sample_rate
+        self.streaming = streaming
+        self.oscillators = OscillatorBank(sample_rate, start_sample)
+        self.noise_engines: Dict[str, NoiseReductionEngine] = {}
+        self.buffer_pool: Optional[BufferPool] = BufferPool(chunk_size) if streaming else None
+        self.noise_spectrum: Optional[np.ndarray] = None
+        self.vad_energy_threshold: Optional[float] = None
+        self.effect_tail = None  # EffectTail, created on first use
+        self.analysis_cache = None  # WorldAnalysisCache; the process-wide one when None
+        self.gain_stage = None  # GainStage, created on first use by live sessions
+        self.vad = None  # StreamingVAD, created on first use by live sessions
+
+    def get_noise_engine(self, name: str) -> NoiseReductionEngine:
+        """Get this session's noise reduction engine, creating it on first use"""
+        engine = self.noise_engines.get(name)
+        if engine is None:
+            engine = create_noise_engine(name, self.sample_rate)
+            self.noise_engines[name] = engine
+        return engine
+
+    def reset(self):
+        """Reset all stateful stages"""
+        self.oscillators.reset()
+        for engine in self.noise_engines.values():
+            engine.reset()
+        if self.effect_tail is not None:
+            self.effect_tail.reset()
+        if self.gain_stage is not None:
+            self.gain_stage.reset()
+        if self.vad is not None:
+            self.vad.reset()
@@ -0,0 +1,167 @@
+"""
+Profiling Module
+Opt-in per-request profiling with saved profiles
+
+An admin can ask for a single upload or live session to be profiled. The
+request then runs under cProfile, with tracemalloc tracking peak traced
+memory, and the result is saved to PROFILE_DIR as a pstats dump (open with
+snakeviz or `python -m pstats`) plus a JSON summary. Requests that don't ask
+for profiling never create a profiler, so they pay nothing.
+"""
+
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', Path(__file__).parent / 'profiles'))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+TOP_FUNCTIONS = 30
+
+_PROFILE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+# tracemalloc is process-wide: it runs while any profiler or traced buffer pool is active
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """True if `token` matches ADMIN_TOKEN (profiling is disabled when it is unset)"""
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def acquire_tracemalloc():
+    """Start tracemalloc unless another user already did"""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_started = True
+        _tracemalloc_users += 1
+
+
+def release_tracemalloc():
+    """Stop tracemalloc once its last user, if it was started here, releases it"""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+
+class RequestProfiler:
+    """cProfile and tracemalloc for one request or live session
+
+    Use it as a context manager around the work to profile. cProfile only
+    sees the thread that enabled it, so the block must run in the thread doing
+    the work; a live session enters the same profiler around every frame it
+    processes. Peak memory is the largest traced peak seen inside any block;
+    concurrent profiled requests share tracemalloc and may see each other's
+    allocations.
+    """
+
+    def __init__(self, kind: str, label: str = ""):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.label = label
+        self.created_at = datetime.utcnow()
+        self.profile = cProfile.Profile()
+        self.wall_time = 0.0
+        self.calls = 0
+        self.peak_memory = 0
+        self.saved = False
+        self._lock = threading.Lock()
+        acquire_tracemalloc()
+
+    def __enter__(self):
+        self._lock.acquire()
+        tracemalloc.reset_peak()
+        self._start = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.disable()
+        self.wall_time += time.perf_counter() - self._start
+        self.calls += 1
+        if tracemalloc.is_tracing():
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+        self._lock.release()
+        return False
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> List[dict]:
+        """Functions with the most cumulative time"""
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                'function': pstats.func_std_string(func),
+                'calls': calls,
+                'total_time': total_time,
+                'cumulative_time': cumulative_time,
+            }
+            for func, (_, calls, total_time, cumulative_time, _) in rows[:limit]
+        ]
+
+    def summary(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'label': self.label,
+            'created_at': self.created_at.isoformat(),
+            'wall_time': self.wall_time,
+            'calls': self.calls,
+            'peak_memory_bytes': self.peak_memory,
+            'top_functions': self.top_functions(),
+        }
+
+    def save(self) -> dict:
+        """Write the pstats dump and JSON summary; returns the summary"""
+        # Waits for a block still running in another thread
+        with self._lock:
+            if self.saved:
+                return self.summary()
+            self.saved = True
+            release_tracemalloc()
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            self.profile.dump_stats(str(PROFILE_DIR / f"{self.id}.prof"))
+            summary = self.summary()
+            (PROFILE_DIR / f"{self.id}.json").write_text(json.dumps(summary, indent=2))
+            return summary
+
+
+def list_profiles() -> List[dict]:
+    """Saved profile summaries, newest first, without the per-function rows"""
+    if not PROFILE_DIR.exists():
+        return []
+    profiles = []
+    for path in PROFILE_DIR.glob('*.json'):
+        try:
+            summary = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        summary.pop('top_functions', None)
+        profiles.append(summary)
+    return sorted(profiles, key=lambda summary: summary.get('created_at', ''), reverse=True)
+
+
+def get_profile_path(profile_id: str, suffix: str = '.prof') -> Optional[Path]:
+    """Path of a saved profile file, or None for unknown or malformed ids"""
+    if not _PROFILE_ID.match(profile_id):
+        return None
+    path = PROFILE_DIR / f"{profile_id}{suffix}"
+    return path if path.exists() else None
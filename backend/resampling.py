@@ -0,0 +1,65 @@
+"""
+Resampling Module
+Polyphase rate conversion with cached filter designs, and channel layout helpers
+
+Audio is processed at its source rate with channels on the first axis
+(shape (channels, samples), or (samples,) for mono). Rate conversion is
+only needed for the fast 16 kHz mode and goes through resample_poly.
+"""
+
+from functools import lru_cache
+from math import gcd
+from typing import Tuple
+
+import numpy as np
+from scipy import signal
+
+from dtype_policy import AUDIO_DTYPE, as_audio
+
+# Same anti-aliasing design resample_poly uses by default
+KAISER_BETA = 5.0
+HALF_LENGTH_PER_RATE = 10
+
+
+@lru_cache(maxsize=32)
+def resample_ratio(orig_sr: int, target_sr: int) -> Tuple[int, int]:
+    """Reduced (up, down) factors converting orig_sr to target_sr"""
+    divisor = gcd(orig_sr, target_sr)
+    return target_sr // divisor, orig_sr // divisor
+
+
+@lru_cache(maxsize=32)
+def polyphase_filter(up: int, down: int) -> np.ndarray:
+    """Design the float32 low-pass FIR for an (up, down) ratio once
+
+    resample_poly copies and scales the coefficients itself, so the cached
+    array is read-only.
+    """
+    max_rate = max(up, down)
+    half_length = HALF_LENGTH_PER_RATE * max_rate
+    taps = signal.firwin(2 * half_length + 1, 1.0 / max_rate, window=('kaiser', KAISER_BETA))
+    taps = taps.astype(AUDIO_DTYPE)
+    taps.setflags(write=False)
+    return taps
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """Resample along the last axis, every channel at once"""
+    if orig_sr == target_sr:
+        return as_audio(audio)
+    up, down = resample_ratio(orig_sr, target_sr)
+    resampled = signal.resample_poly(as_audio(audio), up, down, axis=-1,
+                                     window=polyphase_filter(up, down))
+    return as_audio(resampled)
+
+
+def to_mono(audio: np.ndarray) -> np.ndarray:
+    """Average a (channels, samples) buffer down to (samples,)"""
+    if audio.ndim == 1:
+        return audio
+    return as_audio(np.mean(audio, axis=0, dtype=AUDIO_DTYPE))
+
+
+def num_samples(audio: np.ndarray) -> int:
+    """Length in samples per channel"""
+    return audio.shape[-1]
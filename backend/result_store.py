@@ -0,0 +1,141 @@
+"""
+Result Store Module
+Encoded processed results for direct binary responses and ranged downloads
+
+Returning a result as base64 inside JSON makes it a third larger and costs a
+copy on the server plus an atob() and another copy in the browser. Results
+can instead be sent as the encoded file itself: WAV, FLAC (lossless, about
+half the size for speech) or Ogg Vorbis (lossy, a fraction of it), all
+written by soundfile.
+
+Binary results are also kept under RESULTS_DIR, so players can fetch them
+again and seek with HTTP Range requests instead of holding a blob in memory.
+"""
+
+import io
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+RESULTS_DIR = Path(os.environ.get('RESULTS_DIR', Path(__file__).parent / 'results'))
+RESULTS_MAX_FILES = int(os.environ.get('RESULTS_MAX_FILES', 200))  # oldest results are pruned beyond this
+READ_CHUNK = 64 * 1024  # bytes per read when streaming a range
+
+# format -> (soundfile format, subtype, media type)
+OUTPUT_FORMATS = {
+    'wav': ('WAV', 'PCM_16', 'audio/wav'),
+    'flac': ('FLAC', 'PCM_16', 'audio/flac'),
+    'ogg': ('OGG', 'VORBIS', 'audio/ogg'),
+}
+
+_RESULT_ID = re.compile(r'^[0-9a-f]{32}$')
+_BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def encode_audio(audio: np.ndarray, sample_rate: int, format: str = 'wav') -> bytes:
+    """Encode a (samples,) or (channels, samples) buffer in one of OUTPUT_FORMATS"""
+    sf_format, subtype, _ = OUTPUT_FORMATS[format]
+    output = io.BytesIO()
+    # soundfile wants (samples, channels)
+    sf.write(output, audio.T, sample_rate, format=sf_format, subtype=subtype)
+    return output.getvalue()
+
+
+class EncodedResult:
+    """An encoded result with what its response reports besides the audio"""
+
+    def __init__(self, data: bytes, format: str, sample_rate: int, channels: int, num_samples: int,
+                 peaks_id: Optional[str], timings: Dict[str, float]):
+        self.data = data
+        self.format = format
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.num_samples = num_samples
+        self.peaks_id = peaks_id
+        self.timings = timings  # stage -> seconds, in pipeline order
+
+    @property
+    def media_type(self) -> str:
+        return OUTPUT_FORMATS[self.format][2]
+
+    def headers(self) -> Dict[str, str]:
+        """Diagnostics as response headers; Server-Timing shows up in browser devtools"""
+        headers = {
+            'Server-Timing': ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.timings.items()),
+            'X-Sample-Rate': str(self.sample_rate),
+            'X-Channels': str(self.channels),
+            'X-Duration': f"{self.num_samples / self.sample_rate:.3f}",
+        }
+        if self.peaks_id is not None:
+            headers['X-Peaks-Id'] = self.peaks_id
+        return headers
+
+
+def _prune():
+    paths = sorted(RESULTS_DIR.glob('*.*'), key=lambda path: path.stat().st_mtime)
+    for path in paths[:max(len(paths) - RESULTS_MAX_FILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def save_result(data: bytes, format: str) -> str:
+    """Store an encoded result; returns its id"""
+    result_id = uuid.uuid4().hex
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    (RESULTS_DIR / f"{result_id}.{format}").write_bytes(data)
+    _prune()
+    return result_id
+
+
+def get_result(result_id: str) -> Optional[Tuple[Path, str]]:
+    """Path and format of a stored result, or None for unknown or pruned ids"""
+    if not _RESULT_ID.match(result_id):
+        return None
+    for format in OUTPUT_FORMATS:
+        path = RESULTS_DIR / f"{result_id}.{format}"
+        if path.exists():
+            return path, format
+    return None
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Inclusive (start, end) of a single-range Range header
+
+    Returns None when the whole file should be sent (no header, another unit,
+    several ranges or bad syntax such as an end before the start, which
+    RFC 9110 lets a server ignore) and raises ValueError when the range lies
+    outside the file.
+    """
+    match = _BYTE_RANGE.match((header or '').strip())
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        # Suffix range: the last N bytes
+        length = int(match.group(2))
+        if length == 0 or size == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(match.group(1))
+    end = int(match.group(2)) if match.group(2) else size - 1
+    if match.group(2) and end < start:
+        return None  # Invalid range-spec, not an unsatisfiable one
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Bytes start..end (inclusive) of a file, in READ_CHUNK pieces"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
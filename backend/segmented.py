@@ -0,0 +1,277 @@
+"""
+Segmented Processing Module
+Parallel processing of long uploads in overlapping segments with crossfaded stitching
+
+A long buffer is cut into segments of SEGMENT_SECONDS. Each segment is
+processed with CONTEXT_SECONDS of extra audio on both sides, which is
+discarded afterwards so filters, STFTs and echo tails see real signal at the
+edges, and neighbouring segments share OVERLAP_SECONDS that are crossfaded
+when stitching. Segments start on whole STFT hops, so the spectral stages
+frame them as they frame the whole buffer. The input is placed in shared
+memory once, so each task only carries offsets.
+
+Stages that estimate something from the whole buffer get it from one global
+analysis pass instead, so every segment uses the same values: the level
+after noise reduction, the spectral subtraction noise spectrum, the speech
+energy threshold and the stationary engine's noise profile. Oscillators
+start at the phase of their segment's first sample. Peak normalization is
+left to the caller, once, on the stitched result.
+
+Renders of an upload session pass the session's WORLD analysis cache: each
+segment is sent its cached analysis, and an analysis a worker had to make
+comes back to be stored there, so a re-render with new settings skips the
+analysis of every segment still in the cache (bounded by its byte limit).
+The workers themselves cache no analyses (see _init_worker).
+
+A cancelled request stops waiting at the next segment; segments that have
+not started are dropped from the pool.
+
+Workers are started with forkserver (spawn where it is missing), never by
+forking the server: a fork copies the event loop's and FFT pools' locks in
+whatever state their threads left them. The forkserver preloads the DSP
+modules, so a new worker does not import them again.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from cancellation import ProcessingCancelled, wait_result
+from dtype_policy import AUDIO_DTYPE, as_audio
+from enhanced_voice_processor import get_voice_processor
+from noise_reduction import NoisereduceEngine, create_noise_engine
+from processing_state import ProcessingState
+from resampling import num_samples
+from spectral import set_fft_workers
+from world_vocoder import WorldAnalysis, WorldAnalysisCache, disable_process_cache
+
+SEGMENT_SECONDS = 30.0
+OVERLAP_SECONDS = 0.25  # crossfaded between neighbouring segments
+CONTEXT_SECONDS = 1.0  # processed on both sides and discarded
+# Segments start on a multiple of every STFT hop in the chain, so their frames fall where a one-piece run's do
+SEGMENT_ALIGN = 2048
+PARALLEL_MIN_SECONDS = 90.0  # shorter uploads are processed in one piece
+ANALYSIS_SECONDS = 10.0  # prefix run through noise reduction by the analysis pass
+SEGMENT_WORKERS = int(os.environ.get('SEGMENT_WORKERS', os.cpu_count() or 1))
+# forkserver or spawn; fork is unsafe in the threaded server
+WORKER_START_METHOD = os.environ.get(
+    'WORKER_START_METHOD', 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+WORKER_PRELOAD = ['enhanced_voice_processor']
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class SegmentAnalysis:
+    """Estimates shared by every segment of one buffer"""
+
+    def __init__(self):
+        self.gain = 1.0
+        self.noise_spectrum: Optional[np.ndarray] = None
+        self.vad_energy_threshold: Optional[float] = None
+        self.noise_engine = None  # primed engine for engines with a global profile
+
+    def make_state(self, sample_rate: int, start_sample: int, engine_name: str) -> ProcessingState:
+        state = ProcessingState(sample_rate, start_sample=start_sample)
+        state.noise_spectrum = self.noise_spectrum
+        state.vad_energy_threshold = self.vad_energy_threshold
+        if self.noise_engine is not None:
+            state.noise_engines[engine_name] = self.noise_engine
+        return state
+
+
+def analyze(audio: np.ndarray, sample_rate: int, settings) -> SegmentAnalysis:
+    """Global pass over the whole buffer for the estimates the chain makes per buffer
+
+    Without segmentation the noise reduction pass normalizes its output before
+    the effects, which matters for level-dependent effects (distortion,
+    compression). Segments skip that normalization and apply `gain` instead,
+    estimated from how noise reduction changed the peak of a prefix.
+    """
+    analysis = SegmentAnalysis()
+    if not settings.noise_reduction_enabled:
+        return analysis
+
+    processor = get_voice_processor(sample_rate)
+    prefix = audio[..., :int(ANALYSIS_SECONDS * sample_rate)]
+    engine = create_noise_engine(settings.noise_reduction_engine, sample_rate)
+    cleaned = as_audio(engine.process_channels(prefix))
+
+    if isinstance(engine, NoisereduceEngine):
+        analysis.noise_spectrum = processor.estimate_noise_spectrum(cleaned)
+        # Scale the threshold of the raw input's frame energies to the denoised level
+        energy_ratio = float(np.mean(np.square(cleaned)) / max(np.mean(np.square(prefix)), 1e-20))
+        analysis.vad_energy_threshold = processor.speech_energy_threshold(audio) * energy_ratio
+        cleaned = processor._spectral_subtraction(cleaned, noise_spectrum=analysis.noise_spectrum)
+    else:
+        engine.reset()
+        engine.prime(audio)
+        analysis.noise_engine = engine
+
+    input_peak = float(np.max(np.abs(audio)))
+    cleaned_peak = float(np.max(np.abs(cleaned))) if cleaned.size else 0.0
+    prefix_peak = float(np.max(np.abs(prefix))) if prefix.size else 0.0
+    if input_peak > 0 and cleaned_peak > 0 and prefix_peak > 0:
+        analysis.gain = 0.9 / (input_peak * cleaned_peak / prefix_peak)
+    return analysis
+
+
+def plan_segments(length: int, sample_rate: int, context_seconds: float = CONTEXT_SECONDS,
+                  segment_seconds: float = SEGMENT_SECONDS,
+                  overlap_seconds: float = OVERLAP_SECONDS) -> List[Tuple[int, int, int, int]]:
+    """(keep_start, keep_end, process_start, process_end) for each segment
+
+    Kept ranges of neighbouring segments overlap by the crossfade length; a
+    short tail is merged into the last segment. Each process_start is a
+    multiple of SEGMENT_ALIGN.
+    """
+    segment = int(segment_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    context = int(context_seconds * sample_rate)
+    count = max(1, int(round(length / segment)))
+    plan = []
+    for i in range(count):
+        keep_start = i * segment
+        keep_end = length if i == count - 1 else min((i + 1) * segment + overlap, length)
+        process_start = max(keep_start - context, 0) // SEGMENT_ALIGN * SEGMENT_ALIGN
+        plan.append((keep_start, keep_end, process_start, min(keep_end + context, length)))
+    return plan
+
+
+def crossfade_weights(length: int, overlap: int, fade_in: bool, fade_out: bool) -> np.ndarray:
+    """Raised-cosine ramps at the shared ends; overlapping weights sum to one"""
+    weights = np.ones(length, dtype=AUDIO_DTYPE)
+    if overlap <= 0:
+        return weights
+    ramp = (0.5 - 0.5 * np.cos(np.pi * (np.arange(overlap) + 0.5) / overlap)).astype(AUDIO_DTYPE)
+    if fade_in:
+        weights[:overlap] = ramp
+    if fade_out:
+        weights[-overlap:] = ramp[::-1]
+    return weights
+
+
+def _segment_input(audio: np.ndarray, process_start: int, process_end: int,
+                   analysis: SegmentAnalysis) -> np.ndarray:
+    return audio[..., process_start:process_end] * AUDIO_DTYPE(analysis.gain)
+
+
+def _process_segment(shm_name: str, shape: tuple, process_start: int, process_end: int,
+                     sample_rate: int, engine_name: str, analysis: SegmentAnalysis,
+                     process_fn: Callable, world_analysis: Optional[WorldAnalysis] = None,
+                     keep_world_analysis: bool = False) -> Tuple[np.ndarray, Optional[WorldAnalysis]]:
+    """Worker: process one segment read from the shared input
+
+    Returns the processed segment and, with `keep_world_analysis`, the WORLD
+    analysis of the segment if this call made one.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        audio = np.ndarray(shape, dtype=AUDIO_DTYPE, buffer=shm.buf)
+        segment = _segment_input(audio, process_start, process_end, analysis)
+    finally:
+        shm.close()
+    state = analysis.make_state(sample_rate, process_start, engine_name)
+    if keep_world_analysis:
+        state.analysis_cache = WorldAnalysisCache(max_entries=1)
+        if world_analysis is not None:
+            state.analysis_cache.put(segment, sample_rate, world_analysis)
+    processed = as_audio(process_fn(segment, state=state))
+    made = None
+    if keep_world_analysis and world_analysis is None and state.analysis_cache.nbytes:
+        made = state.analysis_cache.get(segment, sample_rate)
+    return processed, made
+
+
+def _init_worker():
+    # Segments already spread over the cores, so each transform stays on one thread
+    set_fft_workers(1)
+    # The only analyses a worker reuses are those sent with its job
+    disable_process_cache()
+
+
+def get_worker_context():
+    """Multiprocessing context for worker processes (segments, presets, live pipelines)"""
+    context = multiprocessing.get_context(WORKER_START_METHOD)
+    if WORKER_START_METHOD == 'forkserver':
+        context.set_forkserver_preload(WORKER_PRELOAD)
+    return context
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool shared by every segmented request"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=SEGMENT_WORKERS, mp_context=get_worker_context(),
+                                        initializer=_init_worker)
+    return _executor
+
+
+def should_segment(audio: np.ndarray, sample_rate: int, settings) -> bool:
+    return (settings.parallel_segments and SEGMENT_WORKERS > 1
+            and num_samples(audio) >= PARALLEL_MIN_SECONDS * sample_rate)
+
+
+def process_segmented(audio: np.ndarray, sample_rate: int, settings, process_fn: Callable,
+                      executor: Optional[ProcessPoolExecutor] = None,
+                      analysis_cache: Optional[WorldAnalysisCache] = None) -> np.ndarray:
+    """Process a long buffer in parallel segments and stitch them with crossfades
+
+    `process_fn(segment, state=state)` must be picklable (a module-level
+    function or a functools.partial of one) and must not peak-normalize.
+    Segment WORLD analyses are looked up in and added to `analysis_cache`.
+    """
+    audio = as_audio(audio)
+    length = num_samples(audio)
+    context = CONTEXT_SECONDS
+    if getattr(settings, 'echo_enabled', False):
+        context = max(context, settings.echo_delay + 0.05)
+    plan = plan_segments(length, sample_rate, context)
+    overlap = int(OVERLAP_SECONDS * sample_rate)
+    analysis = analyze(audio, sample_rate, settings)
+    executor = executor or get_executor()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(audio.nbytes, 1))
+    try:
+        shared = np.ndarray(audio.shape, dtype=AUDIO_DTYPE, buffer=shm.buf)
+        shared[...] = audio
+        keep_world_analysis = analysis_cache is not None
+        futures = []
+        for _, _, process_start, process_end in plan:
+            world_analysis = None
+            if keep_world_analysis:
+                segment = _segment_input(audio, process_start, process_end, analysis)
+                world_analysis = analysis_cache.get(segment, sample_rate)
+            futures.append(executor.submit(
+                _process_segment, shm.name, audio.shape, process_start, process_end, sample_rate,
+                settings.noise_reduction_engine, analysis, process_fn, world_analysis, keep_world_analysis
+            ))
+        output = np.zeros(audio.shape, dtype=AUDIO_DTYPE)
+        try:
+            for i, ((keep_start, keep_end, process_start, process_end), future) in enumerate(zip(plan, futures)):
+                piece, made = wait_result(future)
+                if made is not None:
+                    analysis_cache.put(_segment_input(audio, process_start, process_end, analysis),
+                                       sample_rate, made)
+                kept = piece[..., keep_start - process_start:keep_end - process_start]
+                if num_samples(kept) != keep_end - keep_start:
+                    logging.warning(f"Segment {i} returned {num_samples(piece)} samples; padding")
+                    kept = np.pad(kept, [(0, 0)] * (kept.ndim - 1) + [(0, keep_end - keep_start - num_samples(kept))])
+                weights = crossfade_weights(keep_end - keep_start, overlap, i > 0, i < len(plan) - 1)
+                output[..., keep_start:keep_end] += kept * weights
+        except ProcessingCancelled:
+            for future in futures:
+                future.cancel()
+            raise
+        del shared
+    finally:
+        shm.close()
+        shm.unlink()
+
+    logging.info(f"Processed {length / sample_rate:.1f}s in {len(plan)} segments "
+                 f"on up to {SEGMENT_WORKERS} workers")
+    return output
@@ -1,5 +1,5 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -7,8 +7,9 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
+import time
 from datetime import datetime
 import asyncio
 import json
@@ -20,15 +21,45 @@ import io
 import base64
 import tempfile
 import shutil
+import zipfile
 import scipy.signal
 from scipy import signal
-import subprocess
 import os
+from contextlib import nullcontext
+from functools import partial
 from fastapi.staticfiles import StaticFiles
 
+from audio_routing import ROUTING_AVAILABLE, PipeAudioDevice
+from buffer_pool import get_output_buffer, normalize_peak
+from cancellation import (CancelToken, ProcessingCancelled, cancellation_stats, check_cancelled, run_cancellable,
+                          run_subprocess, run_tracked, set_units)
+from dtype_policy import AUDIO_DTYPE, as_audio
+from effect_tail import warm_up as warm_up_effect_tail
+from filters import zero_phase_filter
+from gain_stage import apply_output_gain
+from live_frames import LiveFrame, LiveFrameQueue, now_ms
+from live_pipeline import LivePipeline, PipelineStage
+from noise_reduction import DEFAULT_NOISE_REDUCTION_ENGINE, NoisereduceEngine, create_noise_engine
+from outbound import CLOSE_TIMEOUT, OutboundQueue
+from oscillator import OscillatorBank
+from processing_state import ProcessingState
+from profiling import RequestProfiler, get_profile_path, is_admin, list_profiles
+from resampling import num_samples, resample, to_mono
+from result_store import (OUTPUT_FORMATS, EncodedResult, encode_audio, get_result, iter_file_range,
+                          parse_byte_range, save_result)
+from shared_state import create_shared_state
+from spectral import istft, stft
+from stream_decoder import EBML_MAGIC, StreamDecoder
+from upload_sessions import UploadSession, UploadSessionStore
+from vad import bypass_silence, get_vad, skip_silence
+from waveform_peaks import get_peaks, save_peaks
+from world_vocoder import DEFAULT_PITCH_ENGINE, PYWORLD_AVAILABLE
+
 # Import enhanced voice processor (simplified version)
 try:
-    from enhanced_voice_processor import voice_processor, virtual_device
+    from enhanced_voice_processor import get_voice_processor, voice_processor, virtual_device
+    from segmented import process_segmented, should_segment
+    from preset_fanout import preset_names, render_presets
     ENHANCED_PROCESSOR_AVAILABLE = True
 except ImportError:
     ENHANCED_PROCESSOR_AVAILABLE = False
@@ -82,6 +113,12 @@ class SimpleVirtualDevice:
 if not ENHANCED_PROCESSOR_AVAILABLE:
     virtual_device = SimpleVirtualDevice()
 
+# Where FIFOs and UNIX sockets exist, the virtual device routes real PCM through the chain
+if ROUTING_AVAILABLE:
+    virtual_device = PipeAudioDevice(
+        lambda audio, settings, state: process_audio_with_enhanced_effects(audio, settings, state=state)
+    )
+
 ROOT_DIR = Path(__file__).parent
 FRONTEND_BUILD_DIR = ROOT_DIR.parent / "frontend" / "build"
 load_dotenv(ROOT_DIR / '.env')
@@ -95,6 +132,7 @@ try:
     logging.info(f"Connected to MongoDB: {db_name}")
 except Exception as e:
     logging.warning(f"MongoDB connection failed: {e}. Using in-memory storage.")
+    client = None
     # Create a mock database for development
     class MockDB:
         def __getattr__(self, name):
@@ -105,6 +143,17 @@ except Exception as e:
         def to_list(self, limit): return []
     db = MockDB()
 
+# Uploads kept decoded for re-rendering (per worker)
+upload_sessions = UploadSessionStore()
+
+# Status and presets shared by every worker/replica ('memory' for a single worker, 'mongo' to scale out)
+SHARED_STATE_BACKEND = os.environ.get('SHARED_STATE_BACKEND', 'memory')
+shared_state = create_shared_state(SHARED_STATE_BACKEND if client is not None else 'memory', db)
+VIRTUAL_DEVICE_STATE_KEY = 'virtual_device'
+VIRTUAL_DEVICE_CHANNEL = 'virtual_device_status'
+PRESET_KEY_PREFIX = 'preset:'
+PRESETS_CHANNEL = 'presets'
+
 # Create the main app without a prefix
 app = FastAPI()
 # Serve React build static files
@@ -139,7 +188,9 @@ class StatusCheckCreate(BaseModel):
 class AdvancedAudioProcessingSettings(BaseModel):
     # Basic settings
     noise_reduction_enabled: bool = True
+    noise_reduction_engine: str = DEFAULT_NOISE_REDUCTION_ENGINE  # noisereduce, stationary, spectral_gate
     voice_change_enabled: bool = False
+    pitch_engine: str = DEFAULT_PITCH_ENGINE  # librosa, world (one pyworld analysis; uploads only, live uses librosa)
     
     # Voice effects (enhanced list)
     voice_effect: str = "none"  # none, female, male, girl, baby, old_man, alien, robotic, horror, cartoon, deep_radio, computer, echo, wall_echo
@@ -160,12 +211,42 @@ class AdvancedAudioProcessingSettings(BaseModel):
     # System-wide settings
     system_wide_enabled: bool = False
     virtual_device_active: bool = False
+    
+    # Uploads: 'native' keeps the source rate and channels, 'fast' processes 16 kHz mono
+    processing_mode: str = "native"
+    parallel_segments: bool = True  # split long uploads into crossfaded segments across cores
+    
+    # Live streaming
+    chunk_size: int = 4096  # samples per live frame, sizes the session's buffer pool
+    debug_metrics: bool = False  # report per-chunk pool misses and traced per-stage allocations
+    frame_header: bool = False  # binary frames start with uint32 seq + float64 capture time (ms)
+    input_format: str = "f32"  # f32 frames, or webm: binary frames are fragments of one MediaRecorder stream
+    latency_budget_ms: float = 300.0  # live frames older than this are dropped unprocessed
+    # Live output level: AGC plus a lookahead limiter instead of per-chunk peak normalization
+    gain_lookahead_ms: float = 5.0  # added to the live latency
+    gain_attack_ms: float = 10.0
+    gain_release_ms: float = 500.0
+    agc_max_gain_db: float = 12.0  # quiet input is boosted by at most this much
+    max_queued_frames: int = 8  # the oldest queued frame is dropped beyond this
+    profile: bool = False  # profile this live session (admin connections only)
+    live_pipeline: bool = False  # run noise reduction and effects in separate worker processes
+    # Live chunks without speech skip the chain (attenuated passthrough or comfort noise)
+    vad_fast_path: bool = True
+    vad_onset_db: float = 9.0  # frame energy above the noise floor that starts speech
+    vad_offset_db: float = 4.0  # speech ends once frames stay below this, after the hangover
+    vad_hangover_ms: float = 400.0
+    silence_mode: str = "attenuate"  # attenuate, comfort_noise
+    silence_gain_db: float = -20.0
 
 class ProcessedAudioResponse(BaseModel):
     success: bool
     message: str
     audio_data: Optional[str] = None  # base64 encoded audio
     processing_time: Optional[float] = None
+    profile_id: Optional[str] = None  # saved profile when profiling was requested
+    peaks_id: Optional[str] = None  # waveform peak pyramid, see /api/peaks/{peaks_id}
+    session_id: Optional[str] = None  # upload session the result was rendered from
+    reused_stages: List[str] = []  # upstream stages served from the session cache
 
 class VirtualDeviceStatus(BaseModel):
     active: bool
@@ -173,6 +254,15 @@ class VirtualDeviceStatus(BaseModel):
     output_device: Optional[int] = None
     processing_enabled: bool = False
     available_devices: List[Dict[str, Any]] = []
+    metrics: Optional[Dict[str, Any]] = None  # measured routing stats while a pipe device runs here
+
+class VoicePresetCreate(BaseModel):
+    name: str
+    description: str = ""
+    settings: AdvancedAudioProcessingSettings
+
+class VoicePreset(VoicePresetCreate):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
 
 class AudioDeviceInfo(BaseModel):
     device_id: int
@@ -186,27 +276,108 @@ class AdvancedConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
         self.processing_settings = {}
+        self.processing_states = {}
+        self.frame_queues: Dict[WebSocket, LiveFrameQueue] = {}
+        self.admin_connections = set()
+        self.profilers: Dict[WebSocket, RequestProfiler] = {}
+        self.pipelines: Dict[WebSocket, LivePipeline] = {}
         self.virtual_device_clients = []
+        # Messages go through a bounded queue per connection, sent by its own writer task
+        self.outbound: Dict[WebSocket, OutboundQueue] = {}
+        self.evicted_clients = 0  # closed because their outbound queue stayed full
+        self.decoders: Dict[WebSocket, StreamDecoder] = {}
+        # Cancelled when the client leaves, stopping the frame being processed
+        self.cancel_tokens: Dict[WebSocket, CancelToken] = {}
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
+        self.outbound[websocket] = OutboundQueue(websocket)
+        self.outbound[websocket].start()
+        admin_token = websocket.headers.get('x-admin-token') or websocket.query_params.get('admin_token')
+        if is_admin(admin_token):
+            self.admin_connections.add(websocket)
         # Set default processing settings
         self.processing_settings[websocket] = AdvancedAudioProcessingSettings()
+        self.processing_states[websocket] = ProcessingState(SAMPLE_RATE, streaming=True)
+        self.frame_queues[websocket] = LiveFrameQueue()
+        self.cancel_tokens[websocket] = CancelToken()
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         if websocket in self.processing_settings:
             del self.processing_settings[websocket]
+        if websocket in self.processing_states:
+            state = self.processing_states.pop(websocket)
+            if state.buffer_pool is not None:
+                state.buffer_pool.set_tracing(False)
+        if websocket in self.frame_queues:
+            self.frame_queues.pop(websocket).close()
+        if websocket in self.profilers:
+            self.profilers.pop(websocket).save()
+        if websocket in self.pipelines:
+            self.pipelines.pop(websocket).close()
+        self.admin_connections.discard(websocket)
+        if websocket in self.virtual_device_clients:
+            self.virtual_device_clients.remove(websocket)
+        if websocket in self.outbound:
+            self.outbound.pop(websocket).close()
+        if websocket in self.decoders:
+            self.decoders.pop(websocket).kill()
+        if websocket in self.cancel_tokens:
+            self.cancel_tokens.pop(websocket).cancel()
+
+    def cancel_session(self, websocket: WebSocket, reason: str):
+        """The client is gone: stop the frame in progress and drop the queued ones"""
+        if websocket in self.cancel_tokens:
+            self.cancel_tokens[websocket].cancel(reason)
+        if websocket in self.frame_queues:
+            discarded = self.frame_queues[websocket].close(discard=True)
+            if discarded:
+                cancellation_stats.record('live', True, discarded, 0.0)
+
+    def enqueue(self, websocket: WebSocket, message, droppable: bool = False):
+        """Queue a text or binary message without waiting on the client
+
+        Only `droppable` messages (processed audio frames) may be dropped when
+        the client falls behind.
+        """
+        queue = self.outbound.get(websocket)
+        if queue is not None and not queue.put_nowait(message, droppable):
+            self.evict(websocket)
+
+    def evict(self, websocket: WebSocket):
+        """Close a client that stopped reading and end its session"""
+        self.evicted_clients += 1
+        logging.warning(f"Evicting slow WebSocket client ({self.outbound[websocket].to_dict()})")
+        self.outbound.pop(websocket).close()
         if websocket in self.virtual_device_clients:
             self.virtual_device_clients.remove(websocket)
+        # The session's processing loop stops and disconnects it
+        self.cancel_session(websocket, 'evicted')
+        asyncio.create_task(self._close_evicted(websocket))
 
-    async def send_audio_data(self, websocket: WebSocket, data: dict):
+    @staticmethod
+    async def _close_evicted(websocket: WebSocket):
         try:
-            await websocket.send_text(json.dumps(data))
+            # The close frame may never get through to a stalled client
+            await asyncio.wait_for(websocket.close(code=1008, reason='Client too slow'), CLOSE_TIMEOUT)
         except Exception as e:
-            logging.error(f"Error sending audio data: {e}")
+            logging.info(f"Could not close evicted client: {e}")
+
+    async def send_audio_data(self, websocket: WebSocket, data: dict, droppable: bool = False):
+        self.enqueue(websocket, json.dumps(data), droppable)
+
+    async def send_audio_bytes(self, websocket: WebSocket, data: bytes):
+        """Queue a binary audio frame; frames are dropped first under backpressure"""
+        self.enqueue(websocket, data, droppable=True)
+
+    def broadcast(self, websockets: List[WebSocket], data: dict):
+        """Serialize once and queue for every client at once"""
+        message = json.dumps(data)
+        for websocket in list(websockets):
+            self.enqueue(websocket, message)
 
     async def broadcast_virtual_device_status(self, status: dict):
         """Broadcast virtual device status to all connected clients"""
@@ -214,14 +385,59 @@ class AdvancedConnectionManager:
             'type': 'virtual_device_status',
             'status': status
         }
-        for websocket in self.virtual_device_clients:
-            await self.send_audio_data(websocket, message)
+        self.broadcast(self.virtual_device_clients, message)
+
+    async def broadcast_presets_update(self, update: dict):
+        """Broadcast a preset change to every client connected to this worker"""
+        message = {
+            'type': 'presets_updated',
+            **update
+        }
+        self.broadcast(self.active_connections, message)
+
+    def get_stats(self) -> dict:
+        return {
+            'connections': len(self.active_connections),
+            'evicted_slow_clients': self.evicted_clients,
+            'outbound': [queue.to_dict() for queue in self.outbound.values()],
+            # Uploads and live frames stopped because their client left, and the CPU that saved
+            'cancellation': cancellation_stats.get_stats(),
+        }
 
 manager = AdvancedConnectionManager()
 
+async def get_shared_virtual_device_status() -> dict:
+    """Virtual device status as seen by every worker"""
+    status = await shared_state.get(VIRTUAL_DEVICE_STATE_KEY)
+    return status if status is not None else virtual_device.get_status()
+
+async def publish_virtual_device_status():
+    """Store this worker's virtual device status and fan it out to all workers"""
+    status = virtual_device.get_status()
+    await shared_state.set(VIRTUAL_DEVICE_STATE_KEY, status)
+    await shared_state.publish(VIRTUAL_DEVICE_CHANNEL, status)
+
+async def on_virtual_device_status(status: dict):
+    """Mirror a status change from any worker locally and tell local subscribers
+
+    A device that owns its I/O endpoints only runs in the worker that started
+    it; other workers mirror stops only.
+    """
+    local_status = virtual_device.get_status()
+    exclusive = getattr(virtual_device, 'exclusive', False)
+    if status.get('active') and not local_status['active'] and not exclusive:
+        virtual_device.start_virtual_device(status.get('input_device'), status.get('output_device'))
+    elif not status.get('active') and local_status['active']:
+        virtual_device.stop_virtual_device()
+    await manager.broadcast_virtual_device_status(status)
+
+async def on_presets_update(update: dict):
+    await manager.broadcast_presets_update(update)
+
 # Audio conversion function using FFmpeg
-def convert_webm_to_wav(webm_bytes: bytes) -> bytes:
-    """Convert WebM audio to WAV format using FFmpeg"""
+def convert_webm_to_wav(webm_bytes: bytes, sample_rate: Optional[int] = SAMPLE_RATE,
+                        channels: Optional[int] = 1) -> bytes:
+    """Convert WebM audio to WAV format using FFmpeg (None keeps the source rate/channels)"""
     try:
         # Create temporary files
         with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_webm:
@@ -237,13 +453,18 @@ def convert_webm_to_wav(webm_bytes: bytes) -> bytes:
                 'ffmpeg',
                 '-i', temp_webm_path,
                 '-acodec', 'pcm_s16le',  # 16-bit PCM
-                '-ar', str(SAMPLE_RATE),  # Sample rate
-                '-ac', '1',  # Mono
+            ]
+            if sample_rate is not None:
+                cmd += ['-ar', str(sample_rate)]  # Sample rate
+            if channels is not None:
+                cmd += ['-ac', str(channels)]  # Channel count
+            cmd += [
                 '-y',  # Overwrite output file
                 temp_wav_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Killed if the request is cancelled
+            result = run_subprocess(cmd)
             
             if result.returncode != 0:
                 logging.error(f"FFmpeg conversion failed: {result.stderr}")
@@ -257,11 +478,11 @@ def convert_webm_to_wav(webm_bytes: bytes) -> bytes:
             
         finally:
             # Clean up temporary files
-            try:
-                os.unlink(temp_webm_path)
-                os.unlink(temp_wav_path)
-            except:
-                pass
+            for temp_path in (temp_webm_path, temp_wav_path):
+                try:
+                    os.unlink(temp_path)
+                except OSError:
+                    pass
                 
     except Exception as e:
         logging.error(f"Error converting WebM to WAV: {e}")
@@ -269,7 +490,10 @@ def convert_webm_to_wav(webm_bytes: bytes) -> bytes:
 
 # Enhanced audio processing functions
 def get_available_audio_devices() -> List[AudioDeviceInfo]:
-    """Get list of available audio devices (simulation)"""
+    """Get list of available audio devices (the pipe endpoints, or a simulated list)"""
+    if hasattr(virtual_device, 'list_devices'):
+        return [AudioDeviceInfo(**device) for device in virtual_device.list_devices()]
+    
     # In a real implementation, this would query PyAudio or similar
     devices = [
         AudioDeviceInfo(device_id=0, name="Default Input", channels=2, is_input=True, is_output=False),
@@ -282,40 +506,52 @@ def get_available_audio_devices() -> List[AudioDeviceInfo]:
     return devices
 
 # Enhanced audio processing functions
-def apply_enhanced_noise_reduction(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+def apply_enhanced_noise_reduction(audio: np.ndarray, sample_rate: int,
+                                   engine_name: str = DEFAULT_NOISE_REDUCTION_ENGINE,
+                                   state: Optional[ProcessingState] = None) -> np.ndarray:
     """Enhanced noise reduction using multiple techniques"""
     try:
         # Primary noise reduction
-        cleaned = nr.reduce_noise(y=audio, sr=sample_rate, stationary=False)
+        if state is not None:
+            engine = state.get_noise_engine(engine_name)
+        else:
+            engine = create_noise_engine(engine_name, sample_rate)
+        if state is not None and state.streaming:
+            cleaned = as_audio(engine.process_chunk(audio))
+        else:
+            cleaned = as_audio(engine.process_channels(audio))
         
-        # Additional spectral subtraction
-        cleaned = apply_spectral_subtraction(cleaned, sample_rate)
+        # Additional spectral subtraction (the other engines track their own noise floor)
+        if isinstance(engine, NoisereduceEngine):
+            noise_spectrum = state.noise_spectrum if state is not None else None
+            cleaned = apply_spectral_subtraction(cleaned, sample_rate, noise_spectrum=noise_spectrum)
         
         return cleaned
     except Exception as e:
         logging.error(f"Error in enhanced noise reduction: {e}")
         return audio
 
-def apply_spectral_subtraction(audio: np.ndarray, sample_rate: int, alpha: float = 2.0) -> np.ndarray:
+def apply_spectral_subtraction(audio: np.ndarray, sample_rate: int, alpha: float = 2.0,
+                               noise_spectrum: Optional[np.ndarray] = None) -> np.ndarray:
     """Apply spectral subtraction for additional noise reduction"""
     try:
-        # Compute STFT
-        stft = librosa.stft(audio, n_fft=2048, hop_length=512)
-        magnitude = np.abs(stft)
-        phase = np.angle(stft)
+        # Compute STFT (complex64 for float32 input)
+        spectrum = stft(audio, n_fft=2048, hop_length=512)
+        magnitude = np.abs(spectrum)
         
-        # Estimate noise from first 0.5 seconds
+        # Estimate noise from first 0.5 seconds (unless a global estimate was given)
         noise_frames = int(0.5 * sample_rate / 512)
-        if noise_frames > 0 and noise_frames < magnitude.shape[1]:
-            noise_spectrum = np.mean(magnitude[:, :noise_frames], axis=1, keepdims=True)
-            
+        if noise_spectrum is None and 0 < noise_frames < magnitude.shape[-1]:
+            noise_spectrum = np.mean(magnitude[..., :noise_frames], axis=-1, keepdims=True)
+        if noise_spectrum is not None:
             # Apply spectral subtraction
             subtracted = magnitude - alpha * noise_spectrum
             subtracted = np.maximum(subtracted, 0.1 * magnitude)
             
-            # Reconstruct signal
-            enhanced_stft = subtracted * np.exp(1j * phase)
-            enhanced_audio = librosa.istft(enhanced_stft, hop_length=512)
+            # Reconstruct signal, rescaling each bin so the original phase is kept
+            gain = np.divide(subtracted, magnitude, out=np.ones_like(magnitude), where=magnitude > 0)
+            enhanced_stft = spectrum * gain
+            enhanced_audio = istft(enhanced_stft, hop_length=512, length=num_samples(audio))
             
             return enhanced_audio
         
@@ -325,7 +561,8 @@ def apply_spectral_subtraction(audio: np.ndarray, sample_rate: int, alpha: float
         return audio
 
 def apply_enhanced_voice_effect(audio: np.ndarray, sample_rate: int, effect: str, 
-                               custom_pitch: float = 0.0, settings: dict = None) -> np.ndarray:
+                               custom_pitch: float = 0.0, settings: dict = None,
+                               state: Optional[ProcessingState] = None) -> np.ndarray:
     """Apply enhanced voice effects"""
     if effect not in ENHANCED_VOICE_EFFECTS and effect != 'none':
         return audio
@@ -334,13 +571,15 @@ def apply_enhanced_voice_effect(audio: np.ndarray, sample_rate: int, effect: str
         return audio
     
     params = ENHANCED_VOICE_EFFECTS[effect]
-    processed = audio.copy()
+    processed = audio
+    oscillators = state.oscillators if state is not None else OscillatorBank(sample_rate)
+    pool = state.buffer_pool if state is not None else None
     
     try:
         # Apply pitch shifting
         pitch_shift = custom_pitch if custom_pitch != 0.0 else params.get('pitch_shift', 0)
         if pitch_shift != 0:
-            processed = librosa.effects.pitch_shift(processed, sr=sample_rate, n_steps=pitch_shift)
+            processed = as_audio(librosa.effects.pitch_shift(processed, sr=sample_rate, n_steps=pitch_shift))
         
         # Apply brightness adjustment
         if 'brightness' in params:
@@ -348,10 +587,10 @@ def apply_enhanced_voice_effect(audio: np.ndarray, sample_rate: int, effect: str
         
         # Special effects
         if params.get('robotize'):
-            processed = robotize_voice(processed, sample_rate)
+            processed = robotize_voice(processed, sample_rate, oscillators)
         
         if params.get('modulation'):
-            processed = apply_alien_modulation(processed, sample_rate)
+            processed = apply_alien_modulation(processed, sample_rate, oscillators)
         
         if params.get('distortion'):
             processed = apply_horror_distortion(processed, sample_rate)
@@ -360,15 +599,18 @@ def apply_enhanced_voice_effect(audio: np.ndarray, sample_rate: int, effect: str
             processed = apply_radio_compression(processed)
         
         if params.get('vocoder'):
-            processed = apply_vocoder_effect(processed, sample_rate)
+            processed = apply_vocoder_effect(processed, sample_rate, oscillators)
         
         if params.get('echo') or (settings and settings.get('echo_enabled')):
             echo_delay = settings.get('echo_delay', 0.3) if settings else 0.3
             echo_decay = settings.get('echo_decay', 0.5) if settings else 0.5
-            processed = apply_echo_effect(processed, sample_rate, echo_delay, echo_decay)
+            processed = apply_echo_effect(processed, sample_rate, echo_delay, echo_decay,
+                                          out=get_output_buffer(pool, 'echo', processed))
         
         if params.get('reverb') or (settings and settings.get('reverb_enabled')):
-            processed = apply_reverb_effect(processed, sample_rate)
+            processed = apply_reverb_effect(processed, sample_rate,
+                                            out=get_output_buffer(pool, 'reverb', processed),
+                                            scratch=get_output_buffer(pool, 'scratch', processed))
         
         return processed
         
@@ -382,34 +624,35 @@ def adjust_brightness(audio: np.ndarray, sample_rate: int, brightness: float) ->
         return audio
     
     try:
-        nyquist = sample_rate / 2
         cutoff = 3000  # Hz
         
         if brightness > 1.0:
             # Emphasize high frequencies
-            b, a = signal.butter(2, cutoff/nyquist, btype='high')
-            high_freq = signal.filtfilt(b, a, audio)
+            high_freq = zero_phase_filter(audio, 2, cutoff, 'high', sample_rate)
             return audio + (brightness - 1.0) * high_freq * 0.3
         else:
             # De-emphasize high frequencies
-            b, a = signal.butter(2, cutoff/nyquist, btype='low')
-            return signal.filtfilt(b, a, audio) * brightness + audio * (1 - brightness)
+            low_freq = zero_phase_filter(audio, 2, cutoff, 'low', sample_rate)
+            return low_freq * brightness + audio * (1 - brightness)
     except Exception as e:
         logging.error(f"Error adjusting brightness: {e}")
         return audio
 
-def robotize_voice(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+def robotize_voice(audio: np.ndarray, sample_rate: int,
+                   oscillators: Optional[OscillatorBank] = None) -> np.ndarray:
     """Create robotic voice effect"""
     try:
+        if oscillators is None:
+            oscillators = OscillatorBank(sample_rate)
+        
         carrier_freq = 220  # Hz
-        t = np.arange(len(audio)) / sample_rate
-        carrier = np.sin(2 * np.pi * carrier_freq * t)
+        carrier = oscillators.get('robot_carrier', carrier_freq).generate(num_samples(audio))
         
         # Ring modulation
         modulated = audio * (1 + 0.5 * carrier)
         
         # Add harmonics
-        harmonics = np.sin(2 * np.pi * carrier_freq * 2 * t) * 0.2
+        harmonics = oscillators.get('robot_harmonic', carrier_freq * 2).generate(num_samples(audio)) * 0.2
         modulated += harmonics
         
         return np.clip(modulated, -1.0, 1.0)
@@ -417,12 +660,16 @@ def robotize_voice(audio: np.ndarray, sample_rate: int) -> np.ndarray:
         logging.error(f"Error in robotize effect: {e}")
         return audio
 
-def apply_alien_modulation(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+def apply_alien_modulation(audio: np.ndarray, sample_rate: int,
+                           oscillators: Optional[OscillatorBank] = None) -> np.ndarray:
     """Apply alien-like modulation"""
     try:
-        t = np.arange(len(audio)) / sample_rate
-        mod_freq = 8 + 3 * np.sin(2 * np.pi * 0.5 * t)
-        modulator = np.sin(2 * np.pi * mod_freq * t)
+        if oscillators is None:
+            oscillators = OscillatorBank(sample_rate)
+        
+        lfo = oscillators.get('alien_lfo', 0.5).generate(num_samples(audio))
+        mod_freq = 8 + 3 * lfo
+        modulator = oscillators.get_fm('alien_carrier', 8, 'alien_lfo', 3).generate_fm(mod_freq)
         
         return audio * (1 + 0.4 * modulator)
     except Exception as e:
@@ -434,13 +681,11 @@ def apply_horror_distortion(audio: np.ndarray, sample_rate: int) -> np.ndarray:
     try:
         # Soft clipping distortion
         drive = 3.0
-        distorted = np.tanh(drive * audio) / np.tanh(drive)
+        distorted = np.tanh(drive * audio) / float(np.tanh(drive))
         
         # Low-pass filter for darker sound
-        nyquist = sample_rate / 2
         cutoff = 2000  # Hz
-        b, a = signal.butter(3, cutoff/nyquist, btype='low')
-        filtered = signal.filtfilt(b, a, distorted)
+        filtered = zero_phase_filter(distorted, 3, cutoff, 'low', sample_rate)
         
         return filtered * 0.8
     except Exception as e:
@@ -463,34 +708,35 @@ def apply_radio_compression(audio: np.ndarray) -> np.ndarray:
         logging.error(f"Error in radio compression: {e}")
         return audio
 
-def apply_vocoder_effect(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+def apply_vocoder_effect(audio: np.ndarray, sample_rate: int,
+                         oscillators: Optional[OscillatorBank] = None) -> np.ndarray:
     """Apply computer-like vocoder effect"""
     try:
+        if oscillators is None:
+            oscillators = OscillatorBank(sample_rate)
+        
         num_bands = 8
-        nyquist = sample_rate / 2
         
         min_freq = 200
         max_freq = 4000
         bands = np.logspace(np.log10(min_freq), np.log10(max_freq), num_bands + 1)
         
         vocoded = np.zeros_like(audio)
+        # Median filter along time only
+        kernel_size = (1,) * (audio.ndim - 1) + (min(num_samples(audio), 21),)
         
         for i in range(num_bands):
-            low = bands[i] / nyquist
-            high = bands[i + 1] / nyquist
-            
             # Band-pass filter
-            b, a = signal.butter(3, [low, high], btype='band')
-            band_signal = signal.filtfilt(b, a, audio)
+            band = (float(bands[i]), float(bands[i + 1]))
+            band_signal = zero_phase_filter(audio, 3, band, 'band', sample_rate)
             
             # Simple envelope following
             envelope = np.abs(band_signal)
-            envelope = signal.medfilt(envelope, kernel_size=min(len(envelope), 21))
+            envelope = signal.medfilt(envelope, kernel_size=kernel_size)
             
             # Generate carrier
             carrier_freq = (bands[i] + bands[i + 1]) / 2
-            t = np.arange(len(audio)) / sample_rate
-            carrier = np.sin(2 * np.pi * carrier_freq * t)
+            carrier = oscillators.get(f'vocoder_band_{i}', carrier_freq).generate(num_samples(audio))
             
             # Apply envelope to carrier
             vocoded += envelope * carrier
@@ -501,64 +747,133 @@ def apply_vocoder_effect(audio: np.ndarray, sample_rate: int) -> np.ndarray:
         return audio
 
 def apply_echo_effect(audio: np.ndarray, sample_rate: int, delay: float = 0.3, 
-                     decay: float = 0.5) -> np.ndarray:
-    """Apply echo effect"""
+                     decay: float = 0.5, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Apply echo effect (into `out` when given; it must not alias `audio`)"""
     try:
         delay_samples = int(delay * sample_rate)
         
-        if delay_samples >= len(audio) or delay_samples <= 0:
+        if delay_samples >= num_samples(audio) or delay_samples <= 0:
             return audio
         
-        echo = np.zeros_like(audio)
-        echo[delay_samples:] = audio[:-delay_samples] * decay
+        if out is None:
+            out = np.empty_like(audio)
+        out[..., :delay_samples] = audio[..., :delay_samples]
+        np.multiply(audio[..., :-delay_samples], decay, out=out[..., delay_samples:])
+        out[..., delay_samples:] += audio[..., delay_samples:]
         
-        return audio + echo
+        return out
     except Exception as e:
         logging.error(f"Error in echo effect: {e}")
         return audio
 
-def apply_reverb_effect(audio: np.ndarray, sample_rate: int) -> np.ndarray:
-    """Apply simple reverb effect"""
+def apply_reverb_effect(audio: np.ndarray, sample_rate: int, out: Optional[np.ndarray] = None,
+                        scratch: Optional[np.ndarray] = None) -> np.ndarray:
+    """Apply simple reverb effect (into `out` when given; it must not alias `audio`)"""
     try:
-        reverb_audio = audio.copy()
+        if out is None:
+            out = np.empty_like(audio)
+        if scratch is None:
+            scratch = np.empty_like(audio)
+        out[:] = audio
         
         delays = [0.03, 0.07, 0.15, 0.25]  # seconds
         gains = [0.3, 0.2, 0.15, 0.1]
         
         for delay, gain in zip(delays, gains):
             delay_samples = int(delay * sample_rate)
-            if delay_samples < len(audio) and delay_samples > 0:
-                delayed = np.zeros_like(audio)
-                delayed[delay_samples:] = audio[:-delay_samples] * gain
-                reverb_audio += delayed
+            if delay_samples < num_samples(audio) and delay_samples > 0:
+                delayed = np.multiply(audio[..., :-delay_samples], gain, out=scratch[..., :-delay_samples])
+                out[..., delay_samples:] += delayed
         
-        return reverb_audio
+        return out
     except Exception as e:
         logging.error(f"Error in reverb effect: {e}")
         return audio
 
+def output_gain_settings(settings: AdvancedAudioProcessingSettings) -> dict:
+    """Settings of the streaming GainStage"""
+    return {
+        'gain_lookahead_ms': settings.gain_lookahead_ms,
+        'gain_attack_ms': settings.gain_attack_ms,
+        'gain_release_ms': settings.gain_release_ms,
+        'agc_max_gain_db': settings.agc_max_gain_db
+    }
+
 def process_audio_with_enhanced_effects(audio_data: np.ndarray, 
-                                      settings: AdvancedAudioProcessingSettings) -> np.ndarray:
-    """Process audio with enhanced voice effects"""
+                                      settings: AdvancedAudioProcessingSettings,
+                                      state: Optional[ProcessingState] = None,
+                                      sample_rate: int = SAMPLE_RATE,
+                                      normalize: bool = True) -> np.ndarray:
+    """Process audio with enhanced voice effects
+
+    `audio_data` is mono (samples,) or (channels, samples) at `sample_rate`.
+    With `normalize=False` no stage levels the output (segments of a longer
+    buffer are normalized together once stitched). Whole buffers are peak
+    normalized; streaming sessions are leveled once, at the end, by their
+    GainStage. Between stages it raises ProcessingCancelled once the current
+    request has been cancelled.
+    """
     start_time = datetime.now()
     
     try:
-        processed_audio = audio_data.copy()
+        processor = get_voice_processor(sample_rate) if ENHANCED_PROCESSOR_AVAILABLE else None
+        # Stages never write into their input, so read-only frames are processed without a copy
+        processed_audio = as_audio(audio_data)
+        pool = state.buffer_pool if state is not None else None
+        streaming = state is not None and state.streaming
+        gain_settings = output_gain_settings(settings)
+        normalized = False
+        
+        # Live chunks without speech take the near-free path
+        vad = None
+        if streaming and settings.vad_fast_path:
+            cpu_started = time.thread_time()
+            vad_settings = {
+                'vad_onset_db': settings.vad_onset_db,
+                'vad_offset_db': settings.vad_offset_db,
+                'vad_hangover_ms': settings.vad_hangover_ms,
+                'silence_mode': settings.silence_mode,
+                'silence_gain_db': settings.silence_gain_db
+            }
+            vad = get_vad(state, sample_rate, vad_settings)
+            if not vad.is_speech(processed_audio):
+                processed_audio = bypass_silence(processed_audio, state, vad_settings,
+                                                 out=get_output_buffer(pool, 'silence', processed_audio))
+                if normalize:
+                    processed_audio = apply_output_gain(
+                        processed_audio, state, sample_rate, gain_settings,
+                        out=get_output_buffer(pool, 'output', processed_audio) if pool else None, hold_agc=True
+                    )
+                vad.record(True, time.thread_time() - cpu_started)
+                return processed_audio
         
         # Apply enhanced noise reduction if enabled
+        check_cancelled()
         if settings.noise_reduction_enabled:
             if ENHANCED_PROCESSOR_AVAILABLE:
+                # Voice effects run once, in the pass below
                 processor_settings = {
                     'noise_reduction_enabled': True,
-                    'voice_change_enabled': settings.voice_change_enabled,
+                    'noise_reduction_engine': settings.noise_reduction_engine,
+                    'voice_change_enabled': False,
                     'voice_effect': settings.voice_effect,
-                    'pitch_shift': settings.pitch_shift
+                    'pitch_shift': settings.pitch_shift,
+                    # Live output is leveled once, after the effects
+                    'normalize': normalize and not streaming
                 }
-                processed_audio = voice_processor.process_audio_chunk(processed_audio, processor_settings)
+                processed_audio = processor.process_audio_chunk(processed_audio, processor_settings, state)
+                # Normalizing again would round differently from what the effects see in a full run
+                normalized = normalize and not streaming
             else:
-                processed_audio = apply_enhanced_noise_reduction(processed_audio, SAMPLE_RATE)
+                processed_audio = apply_enhanced_noise_reduction(
+                    processed_audio,
+                    sample_rate,
+                    settings.noise_reduction_engine,
+                    state
+                )
         
         # Apply enhanced voice effects if enabled
+        check_cancelled()
         if settings.voice_change_enabled:
             effect_settings = {
                 'echo_enabled': settings.echo_enabled,
@@ -574,38 +889,58 @@ def process_audio_with_enhanced_effects(audio_data: np.ndarray,
                     'voice_change_enabled': True,
                     'voice_effect': settings.voice_effect,
                     'pitch_shift': settings.pitch_shift,
+                    'pitch_engine': settings.pitch_engine,
                     'formant_shift': settings.formant_shift,
                     'brightness': settings.brightness,
+                    'normalize': normalize,  # in the same pass as the effect tail
+                    **gain_settings,
                     **effect_settings
                 }
-                processed_audio = voice_processor.process_audio_chunk(processed_audio, processor_settings)
+                processed_audio = processor.process_audio_chunk(processed_audio, processor_settings, state)
+                normalized = normalize
             else:
                 processed_audio = apply_enhanced_voice_effect(
                     processed_audio, 
-                    SAMPLE_RATE, 
+                    sample_rate, 
                     settings.voice_effect, 
                     settings.pitch_shift,
-                    effect_settings
+                    effect_settings,
+                    state
                 )
         
         # Apply additional effects
+        check_cancelled()
         if settings.echo_enabled and not settings.voice_change_enabled:
             processed_audio = apply_echo_effect(
                 processed_audio, 
-                SAMPLE_RATE, 
+                sample_rate, 
                 settings.echo_delay, 
-                settings.echo_decay
+                settings.echo_decay,
+                out=get_output_buffer(pool, 'echo', processed_audio)
             )
+            normalized = False
         
         if settings.reverb_enabled and not settings.voice_change_enabled:
-            processed_audio = apply_reverb_effect(processed_audio, SAMPLE_RATE)
+            processed_audio = apply_reverb_effect(
+                processed_audio,
+                sample_rate,
+                out=get_output_buffer(pool, 'reverb', processed_audio),
+                scratch=get_output_buffer(pool, 'scratch', processed_audio)
+            )
+            normalized = False
         
-        # Normalize to prevent clipping
-        if np.max(np.abs(processed_audio)) > 0:
-            processed_audio = processed_audio / np.max(np.abs(processed_audio)) * 0.9
+        # Level the output to prevent clipping
+        if normalize and not normalized:
+            processed_audio = apply_output_gain(
+                processed_audio, state, sample_rate, gain_settings,
+                out=get_output_buffer(pool, 'output', processed_audio) if pool else None
+            )
         
+        if vad is not None:
+            vad.record(False, time.thread_time() - cpu_started)
         processing_time = (datetime.now() - start_time).total_seconds()
-        logging.info(f"Enhanced audio processing completed in {processing_time:.3f}s")
+        logging.info(f"Enhanced audio processing completed in {processing_time:.3f}s "
+                     f"({sample_rate} Hz, shape {processed_audio.shape})")
         
         return processed_audio
         
@@ -613,6 +948,33 @@ def process_audio_with_enhanced_effects(audio_data: np.ndarray,
         logging.error(f"Error in enhanced audio processing: {e}")
         return audio_data
 
+def process_upload_audio(audio_data: np.ndarray, settings: AdvancedAudioProcessingSettings,
+                         sample_rate: int, state: Optional[ProcessingState] = None) -> np.ndarray:
+    """Process a whole upload, in parallel crossfaded segments when it is long
+
+    `state` is used when the upload is processed in one piece; segments share
+    only its `analysis_cache`, which then holds one WORLD analysis per segment.
+    """
+    if not ENHANCED_PROCESSOR_AVAILABLE or not should_segment(audio_data, sample_rate, settings):
+        return process_audio_with_enhanced_effects(audio_data, settings, state=state, sample_rate=sample_rate)
+    
+    process_fn = partial(process_audio_with_enhanced_effects, settings=settings,
+                         sample_rate=sample_rate, normalize=False)
+    processed_audio = process_segmented(audio_data, sample_rate, settings, process_fn,
+                                        analysis_cache=state.analysis_cache if state is not None else None)
+    return normalize_peak(processed_audio, 0.9, out=processed_audio)
+
+def load_audio_for_processing(source, settings: AdvancedAudioProcessingSettings) -> Tuple[np.ndarray, int]:
+    """Decode audio at its source rate and channel count, or as 16 kHz mono in fast mode
+
+    Multichannel audio is returned as (channels, samples).
+    """
+    audio_data, sample_rate = librosa.load(source, sr=None, mono=False)
+    if settings.processing_mode == 'fast':
+        audio_data = resample(to_mono(audio_data), sample_rate, SAMPLE_RATE)
+        sample_rate = SAMPLE_RATE
+    return as_audio(audio_data), sample_rate
+
 # API Routes
 @api_router.get("/")
 async def root():
@@ -637,26 +999,32 @@ async def get_audio_devices():
 
 @api_router.get("/virtual-device-status", response_model=VirtualDeviceStatus)
 async def get_virtual_device_status():
-    """Get virtual audio device status"""
-    status = virtual_device.get_status()
+    """Get virtual audio device status, with live routing metrics from the worker running it"""
+    if virtual_device.is_active:
+        status = virtual_device.get_status()
+    else:
+        status = await get_shared_virtual_device_status()
     return VirtualDeviceStatus(
         active=status['active'],
         input_device=status['input_device'],
         output_device=status['output_device'],
         processing_enabled=status['processing_enabled'],
-        available_devices=[device.dict() for device in get_available_audio_devices()]
+        available_devices=[device.dict() for device in get_available_audio_devices()],
+        metrics=status.get('metrics')
     )
 
 @api_router.post("/virtual-device/start")
 async def start_virtual_device(input_device: Optional[int] = None, 
-                              output_device: Optional[int] = None):
-    """Start virtual audio device"""
-    success = virtual_device.start_virtual_device(input_device, output_device)
+                              output_device: Optional[int] = None,
+                              settings: Optional[AdvancedAudioProcessingSettings] = None):
+    """Start virtual audio device, processing with `settings` (default settings if omitted)"""
+    if hasattr(virtual_device, 'update_settings'):
+        virtual_device.update_settings(settings or AdvancedAudioProcessingSettings())
+    success = await asyncio.to_thread(virtual_device.start_virtual_device, input_device, output_device)
     
     if success:
-        # Broadcast status update to all connected clients
-        status = virtual_device.get_status()
-        await manager.broadcast_virtual_device_status(status)
+        # Broadcast status update to all connected clients on every worker
+        await publish_virtual_device_status()
         
         return {"success": True, "message": "Virtual audio device started"}
     else:
@@ -665,14 +1033,37 @@ async def start_virtual_device(input_device: Optional[int] = None,
 @api_router.post("/virtual-device/stop")
 async def stop_virtual_device():
     """Stop virtual audio device"""
-    virtual_device.stop_virtual_device()
+    await asyncio.to_thread(virtual_device.stop_virtual_device)
     
-    # Broadcast status update to all connected clients
-    status = virtual_device.get_status()
-    await manager.broadcast_virtual_device_status(status)
+    # Broadcast status update to all connected clients on every worker
+    await publish_virtual_device_status()
     
     return {"success": True, "message": "Virtual audio device stopped"}
 
+@api_router.get("/presets", response_model=List[VoicePreset])
+async def get_presets():
+    """Get saved voice presets (shared by every worker)"""
+    presets = await shared_state.get_all(PRESET_KEY_PREFIX)
+    return [VoicePreset(**preset) for preset in presets.values()]
+
+@api_router.post("/presets", response_model=VoicePreset)
+async def save_preset(input: VoicePresetCreate):
+    """Save a voice preset and notify connected clients on every worker"""
+    preset = VoicePreset(**input.dict())
+    preset_dict = preset.dict()
+    await shared_state.set(PRESET_KEY_PREFIX + preset.id, preset_dict)
+    await shared_state.publish(PRESETS_CHANNEL, {'action': 'saved', 'preset': preset_dict})
+    return preset
+
+@api_router.delete("/presets/{preset_id}")
+async def delete_preset(preset_id: str):
+    """Delete a voice preset and notify connected clients on every worker"""
+    if await shared_state.get(PRESET_KEY_PREFIX + preset_id) is None:
+        raise HTTPException(status_code=404, detail="Preset not found")
+    await shared_state.delete(PRESET_KEY_PREFIX + preset_id)
+    await shared_state.publish(PRESETS_CHANNEL, {'action': 'deleted', 'preset_id': preset_id})
+    return {"success": True, "message": "Preset deleted"}
+
 @api_router.get("/voice-effects")
 async def get_available_voice_effects():
     """Get list of available voice effects"""
@@ -695,12 +1086,195 @@ async def get_available_voice_effects():
         ]
     }
 
+def decode_upload(contents: bytes, filename: Optional[str], content_type: Optional[str],
+                  settings: AdvancedAudioProcessingSettings) -> Tuple[np.ndarray, int]:
+    """Decode an uploaded file, going through FFmpeg for WebM or when librosa can't read it"""
+    # Check if it's a WebM file and convert if needed
+    if filename and filename.endswith('.webm') or content_type == 'audio/webm':
+        logging.info("Converting WebM to WAV using FFmpeg")
+        try:
+            wav_contents = convert_webm_to_wav(contents, sample_rate=None, channels=None)
+            return load_audio_for_processing(io.BytesIO(wav_contents), settings)
+        except Exception as e:
+            logging.error(f"WebM conversion failed: {e}")
+            raise HTTPException(status_code=400, detail=f"Audio conversion failed: {str(e)}")
+    
+    # Try to load directly with librosa
+    try:
+        return load_audio_for_processing(io.BytesIO(contents), settings)
+    except Exception as e:
+        logging.error(f"Failed to load audio with librosa: {e}")
+        # Try converting with FFmpeg as fallback
+        try:
+            logging.info("Trying FFmpeg conversion as fallback")
+            wav_contents = convert_webm_to_wav(contents, sample_rate=None, channels=None)
+            return load_audio_for_processing(io.BytesIO(wav_contents), settings)
+        except Exception as e2:
+            logging.error(f"FFmpeg fallback also failed: {e2}")
+            raise HTTPException(status_code=400, detail=f"Audio format not supported: {str(e)}")
+
+def render_upload(contents: bytes, filename: Optional[str], content_type: Optional[str],
+                  settings: AdvancedAudioProcessingSettings, format: str = 'wav') -> EncodedResult:
+    """Decode, process and encode an uploaded file, timing each stage"""
+    timings = {}
+    started = time.perf_counter()
+    audio_data, sample_rate = decode_upload(contents, filename, content_type, settings)
+    timings['decode'] = time.perf_counter() - started
+    set_units(num_samples(audio_data) / sample_rate)
+    
+    # Process with enhanced effects
+    started = time.perf_counter()
+    processed_audio = process_upload_audio(audio_data, settings, sample_rate)
+    timings['process'] = time.perf_counter() - started
+    return encode_result(processed_audio, sample_rate, format, timings)
+
+def encode_result(processed_audio: np.ndarray, sample_rate: int, format: str = 'wav',
+                  timings: Optional[Dict[str, float]] = None) -> EncodedResult:
+    """Store the waveform peaks of a processed result and encode it in `format`"""
+    timings = dict(timings or {})
+    started = time.perf_counter()
+    peaks_id = save_peaks(processed_audio, sample_rate)
+    timings['peaks'] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    data = encode_audio(processed_audio, sample_rate, format)
+    timings['encode'] = time.perf_counter() - started
+    return EncodedResult(data, format, sample_rate, 1 if processed_audio.ndim == 1 else processed_audio.shape[0],
+                         num_samples(processed_audio), peaks_id, timings)
+
+def check_output_format(format: str):
+    """Reject unknown response formats ('json' or one of OUTPUT_FORMATS) before any work"""
+    if format != 'json' and format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400,
+                            detail=f"format must be 'json' or one of: {', '.join(OUTPUT_FORMATS)}")
+
+def binary_result_response(result: EncodedResult, processing_time: float,
+                           headers: Optional[Dict[str, str]] = None) -> Response:
+    """The encoded result itself, with diagnostics in headers
+
+    The result is also stored so GET /api/results/{id} can serve it again
+    with Range support (its URL is in Content-Location).
+    """
+    result_id = save_result(result.data, result.format)
+    return Response(content=result.data, media_type=result.media_type, headers={
+        **result.headers(),
+        **(headers or {}),
+        'X-Processing-Time': f"{processing_time:.3f}",
+        'X-Result-Id': result_id,
+        'Content-Location': f"/api/results/{result_id}",
+        'Content-Disposition': f'inline; filename="processed.{result.format}"',
+        'Accept-Ranges': 'bytes',
+        'Timing-Allow-Origin': '*',
+    })
+
+def session_input(session: UploadSession, settings: AdvancedAudioProcessingSettings,
+                  reused: Optional[List[str]] = None) -> Tuple[np.ndarray, int]:
+    """Decoded and, when enabled, denoised audio of a session, cached per stage settings
+
+    Decoding is keyed by the processing mode, noise reduction additionally by
+    its engine. Noise reduction peak normalizes its output as in a full run,
+    so the effects that follow see the same input either way. The caller
+    holds `session.lock`.
+    """
+    audio_data, sample_rate = session.stage(
+        ('decode', settings.processing_mode),
+        lambda: decode_upload(session.contents, session.filename, session.content_type, settings),
+        reused
+    )
+    if settings.noise_reduction_enabled:
+        denoise_settings = AdvancedAudioProcessingSettings(**{
+            **settings.dict(), 'voice_change_enabled': False, 'echo_enabled': False, 'reverb_enabled': False
+        })
+        decoded = audio_data
+        audio_data = session.stage(
+            ('denoise', settings.processing_mode, settings.noise_reduction_engine, settings.parallel_segments),
+            lambda: process_upload_audio(decoded, denoise_settings, sample_rate),
+            reused
+        )
+    return audio_data, sample_rate
+
+def open_session(session: UploadSession, settings: AdvancedAudioProcessingSettings) -> dict:
+    """Run the upstream stages of a new session so its first render is as fast as later ones"""
+    with session.lock:
+        audio_data, sample_rate = session_input(session, settings)
+    set_units(num_samples(audio_data) / sample_rate)
+    return {
+        'sample_rate': sample_rate,
+        'channels': 1 if audio_data.ndim == 1 else audio_data.shape[0],
+        'duration': num_samples(audio_data) / sample_rate,
+    }
+
+def render_session(session: UploadSession, settings: AdvancedAudioProcessingSettings,
+                   format: str = 'wav') -> Tuple[EncodedResult, List[str]]:
+    """Process an upload session with new settings, reusing every cached upstream stage
+
+    Returns the encoded result and the names of the reused stages.
+    """
+    reused = []
+    timings = {}
+    with session.lock:
+        started = time.perf_counter()
+        audio_data, sample_rate = session_input(session, settings, reused)
+        timings['input'] = time.perf_counter() - started
+        set_units(num_samples(audio_data) / sample_rate)
+        
+        # Everything downstream of noise reduction depends on the effect settings
+        started = time.perf_counter()
+        effect_settings = AdvancedAudioProcessingSettings(**{**settings.dict(), 'noise_reduction_enabled': False})
+        state = ProcessingState(sample_rate)
+        state.analysis_cache = session.analyses
+        processed_audio = process_upload_audio(audio_data, effect_settings, sample_rate, state=state)
+        timings['process'] = time.perf_counter() - started
+        session.renders += 1
+    
+    return encode_result(processed_audio, sample_rate, format, timings), reused
+
+async def run_request(kind: str, request: Request, fn, *args):
+    """Run a request's processing off the event loop, stopped when its client disconnects
+
+    Also stopped after REQUEST_TIMEOUT seconds when that is set.
+    """
+    try:
+        return await run_cancellable(kind, fn, *args, request=request)
+    except ProcessingCancelled as e:
+        logging.info(f"Cancelled {kind} processing: {e.reason}")
+        if e.reason == 'timed out':
+            raise HTTPException(status_code=504, detail="Processing timed out")
+        # Nobody reads this; nginx's code for a client that closed the request
+        raise HTTPException(status_code=499, detail="Client closed request")
+
+def profiled(profiler: Optional[RequestProfiler], fn, *args):
+    """fn(*args) inside `profiler`, if any; call it in the thread doing the work"""
+    with profiler if profiler is not None else nullcontext():
+        return fn(*args)
+
+def profiling_requested(profile: bool, x_profile: Optional[str], x_admin_token: Optional[str]) -> bool:
+    """Whether to profile this request; only admins may ask"""
+    if not profile and (x_profile or '').lower() not in ('1', 'true', 'yes'):
+        return False
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid admin token")
+    return True
+
 @api_router.post("/process-audio-enhanced", response_model=ProcessedAudioResponse)
 async def process_audio_enhanced(
+    request: Request,
     file: UploadFile = File(...),
-    settings: str = '{"noise_reduction_enabled": true, "voice_change_enabled": false, "voice_effect": "none"}'
+    settings: str = '{"noise_reduction_enabled": true, "voice_change_enabled": false, "voice_effect": "none"}',
+    profile: bool = Query(False, description="Profile this request (admin only)"),
+    format: str = Query('json', description="'json' (base64 WAV) or the audio itself: 'wav', 'flac', 'ogg'"),
+    x_profile: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None)
 ):
-    """Process uploaded audio file with enhanced effects"""
+    """Process uploaded audio file with enhanced effects
+
+    With an audio `format` the response body is the encoded result and
+    failures are HTTP errors. Processing stops if the client disconnects.
+    """
+    check_output_format(format)
+    profiler = None
+    if profiling_requested(profile, x_profile, x_admin_token):
+        profiler = RequestProfiler('upload', file.filename or "")
     try:
         start_time = datetime.now()
         
@@ -711,68 +1285,302 @@ async def process_audio_enhanced(
         # Read and process audio file
         contents = await file.read()
         
-        # Check if it's a WebM file and convert if needed
-        if file.filename and file.filename.endswith('.webm') or file.content_type == 'audio/webm':
-            logging.info("Converting WebM to WAV using FFmpeg")
-            try:
-                wav_contents = convert_webm_to_wav(contents)
-                audio_data, sample_rate = librosa.load(io.BytesIO(wav_contents), sr=SAMPLE_RATE)
-            except Exception as e:
-                logging.error(f"WebM conversion failed: {e}")
-                raise HTTPException(status_code=400, detail=f"Audio conversion failed: {str(e)}")
-        else:
-            # Try to load directly with librosa
-            try:
-                audio_data, sample_rate = librosa.load(io.BytesIO(contents), sr=SAMPLE_RATE)
-            except Exception as e:
-                logging.error(f"Failed to load audio with librosa: {e}")
-                # Try converting with FFmpeg as fallback
-                try:
-                    logging.info("Trying FFmpeg conversion as fallback")
-                    wav_contents = convert_webm_to_wav(contents)
-                    audio_data, sample_rate = librosa.load(io.BytesIO(wav_contents), sr=SAMPLE_RATE)
-                except Exception as e2:
-                    logging.error(f"FFmpeg fallback also failed: {e2}")
-                    raise HTTPException(status_code=400, detail=f"Audio format not supported: {str(e)}")
-        
-        # Process with enhanced effects
-        processed_audio = process_audio_with_enhanced_effects(audio_data, processing_settings)
-        
-        # Convert back to bytes
-        output_buffer = io.BytesIO()
-        sf.write(output_buffer, processed_audio, sample_rate, format='WAV')
-        output_buffer.seek(0)
-        
-        # Encode to base64
-        audio_base64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
+        # Everything after the read runs in one thread, so the profile only sees this request
+        result = await run_request('upload', request, profiled, profiler, render_upload, contents,
+                                   file.filename, file.content_type, processing_settings,
+                                   'wav' if format == 'json' else format)
         
         processing_time = (datetime.now() - start_time).total_seconds()
         
+        if format != 'json':
+            headers = {'X-Profile-Id': profiler.id} if profiler is not None else None
+            # Writing the stored copy of a long result would hold up every live session
+            return await asyncio.to_thread(binary_result_response, result, processing_time, headers)
         return ProcessedAudioResponse(
             success=True,
             message="Audio processed with enhanced effects",
-            audio_data=audio_base64,
-            processing_time=processing_time
+            audio_data=base64.b64encode(result.data).decode('utf-8'),
+            processing_time=processing_time,
+            profile_id=profiler.id if profiler is not None else None,
+            peaks_id=result.peaks_id
         )
         
+    except HTTPException:
+        # Timeouts, disconnects and bad input keep their status codes in every format
+        raise
     except Exception as e:
         logging.error(f"Error processing audio file: {e}")
+        if format != 'json':
+            raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
         return ProcessedAudioResponse(
             success=False,
-            message=f"Error processing audio: {str(e)}"
+            message=f"Error processing audio: {str(e)}",
+            profile_id=profiler.id if profiler is not None else None
+        )
+    finally:
+        if profiler is not None:
+            profiler.save()
+
+@api_router.post("/upload-sessions")
+async def create_upload_session(
+    request: Request,
+    file: UploadFile = File(...),
+    settings: str = '{"noise_reduction_enabled": true, "voice_change_enabled": false, "voice_effect": "none"}'
+):
+    """Upload a file once and render it with POST /upload-sessions/{session_id}/render
+
+    The file is decoded, and denoised when `settings` enables noise reduction,
+    before this returns.
+    """
+    processing_settings = AdvancedAudioProcessingSettings(**json.loads(settings))
+    session = UploadSession(await file.read(), file.filename, file.content_type)
+    audio_info = await run_request('session_open', request, open_session, session, processing_settings)
+    upload_sessions.add(session)
+    return {**session.info(upload_sessions.ttl), **audio_info}
+
+@api_router.post("/upload-sessions/{session_id}/render", response_model=ProcessedAudioResponse)
+async def render_upload_session(
+    request: Request,
+    session_id: str,
+    settings: AdvancedAudioProcessingSettings,
+    format: str = Query('json', description="'json' (base64 WAV) or the audio itself: 'wav', 'flac', 'ogg'")
+):
+    """Render a session's upload with new settings; only changed stages are recomputed"""
+    check_output_format(format)
+    session = upload_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    start_time = datetime.now()
+    try:
+        result, reused = await run_request('session_render', request, render_session, session, settings,
+                                           'wav' if format == 'json' else format)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error rendering upload session {session_id}: {e}")
+        if format != 'json':
+            raise HTTPException(status_code=500, detail=f"Error processing audio: {str(e)}")
+        return ProcessedAudioResponse(success=False, message=f"Error processing audio: {str(e)}",
+                                      session_id=session_id)
+    finally:
+        upload_sessions.enforce_limits()
+    
+    processing_time = (datetime.now() - start_time).total_seconds()
+    if format != 'json':
+        return await asyncio.to_thread(binary_result_response, result, processing_time, {
+            'X-Session-Id': session_id,
+            'X-Reused-Stages': ','.join(reused),
+        })
+    return ProcessedAudioResponse(
+        success=True,
+        message="Audio re-rendered from upload session",
+        audio_data=base64.b64encode(result.data).decode('utf-8'),
+        processing_time=processing_time,
+        peaks_id=result.peaks_id,
+        session_id=session_id,
+        reused_stages=reused
+    )
+
+def render_preset_set(session: UploadSession, settings: AdvancedAudioProcessingSettings,
+                      presets: List[str]) -> Tuple[Dict[str, np.ndarray], int, List[str]]:
+    """Render a session's audio through several presets
+
+    Decoding, noise reduction and the WORLD analysis run once; only the
+    preset-specific stages fan out across the segment workers. `settings`
+    supplies everything except the preset. Returns the rendered audio by
+    preset, the sample rate and the reused stages.
+    """
+    reused = []
+    with session.lock:
+        audio_data, sample_rate = session_input(session, settings, reused)
+        set_units(num_samples(audio_data) / sample_rate * len(presets))
+        base = {**settings.dict(), 'noise_reduction_enabled': False}
+        preset_settings = {
+            name: AdvancedAudioProcessingSettings(**{**base, 'voice_change_enabled': name != 'none', 'voice_effect': name})
+            for name in presets
+        }
+        
+        analysis = None
+        shifts_pitch = settings.pitch_shift != 0.0 or any(
+            ENHANCED_VOICE_EFFECTS.get(name, {}).get('pitch_shift', 0) != 0
+            or ENHANCED_VOICE_EFFECTS.get(name, {}).get('formant_shift', 1.0) != 1.0
+            for name in presets
         )
+        if settings.pitch_engine == 'world' and PYWORLD_AVAILABLE and shifts_pitch:
+            analysis = session.analyses.get_or_analyze(audio_data, sample_rate)
+        
+        process_fn = partial(process_audio_with_enhanced_effects, sample_rate=sample_rate)
+        rendered = render_presets(audio_data, sample_rate, preset_settings, process_fn, analysis)
+        session.renders += 1
+    return rendered, sample_rate, reused
+
+def preset_set_response(rendered: Dict[str, np.ndarray], sample_rate: int, reused: List[str],
+                        processing_time: float, format: str) -> Response:
+    """A ZIP of one WAV per preset plus manifest.json, or JSON with a base64 WAV and peaks id per preset"""
+    if format == 'json':
+        tracks = {}
+        for name, processed_audio in rendered.items():
+            result = encode_result(processed_audio, sample_rate)
+            tracks[name] = {'audio_data': base64.b64encode(result.data).decode('utf-8'), 'peaks_id': result.peaks_id}
+        return Response(content=json.dumps({
+            'success': True,
+            'sample_rate': sample_rate,
+            'processing_time': processing_time,
+            'reused_stages': reused,
+            'tracks': tracks,
+        }), media_type='application/json')
+    
+    archive = io.BytesIO()
+    # WAV barely compresses; storing keeps packaging time negligible
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED) as zip_file:
+        for name, processed_audio in rendered.items():
+            zip_file.writestr(f"{name}.wav", encode_audio(processed_audio, sample_rate, 'wav'))
+        zip_file.writestr('manifest.json', json.dumps({
+            'sample_rate': sample_rate,
+            'presets': list(rendered),
+            'processing_time': processing_time,
+        }, indent=2))
+    return Response(content=archive.getvalue(), media_type='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename="presets.zip"',
+                             'X-Processing-Time': f"{processing_time:.3f}"})
+
+async def render_preset_request(request: Request, session: UploadSession,
+                                settings: AdvancedAudioProcessingSettings,
+                                presets: Optional[str], format: str) -> Response:
+    if not ENHANCED_PROCESSOR_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Multi-preset rendering needs the enhanced processor")
+    if format not in ('zip', 'json'):
+        raise HTTPException(status_code=400, detail="format must be 'zip' or 'json'")
+    try:
+        names = preset_names(presets, list(ENHANCED_VOICE_EFFECTS))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    start_time = datetime.now()
+    rendered, sample_rate, reused = await run_request('presets', request, render_preset_set, session, settings, names)
+    processing_time = (datetime.now() - start_time).total_seconds()
+    return await asyncio.to_thread(preset_set_response, rendered, sample_rate, reused, processing_time, format)
+
+@api_router.post("/render-presets")
+async def render_presets_enhanced(
+    request: Request,
+    file: UploadFile = File(...),
+    settings: str = '{"noise_reduction_enabled": true}',
+    presets: Optional[str] = Query(None, description="Comma-separated effect ids (default: every preset)"),
+    format: str = Query('zip', description="'zip' (one WAV per preset) or 'json' (base64 WAVs)")
+):
+    """Render one upload through several presets in one request"""
+    processing_settings = AdvancedAudioProcessingSettings(**json.loads(settings))
+    session = UploadSession(await file.read(), file.filename, file.content_type)
+    return await render_preset_request(request, session, processing_settings, presets, format)
+
+@api_router.post("/upload-sessions/{session_id}/render-presets")
+async def render_upload_session_presets(
+    request: Request,
+    session_id: str,
+    settings: AdvancedAudioProcessingSettings,
+    presets: Optional[str] = Query(None, description="Comma-separated effect ids (default: every preset)"),
+    format: str = Query('zip', description="'zip' (one WAV per preset) or 'json' (base64 WAVs)")
+):
+    """Render a session's upload through several presets, reusing its cached stages"""
+    session = upload_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    try:
+        return await render_preset_request(request, session, settings, presets, format)
+    finally:
+        upload_sessions.enforce_limits()
+
+@api_router.get("/upload-sessions/{session_id}")
+async def get_upload_session(session_id: str):
+    """Cached stages and remaining lifetime of an upload session"""
+    session = upload_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return session.info(upload_sessions.ttl)
+
+@api_router.delete("/upload-sessions/{session_id}")
+async def delete_upload_session(session_id: str):
+    """Drop an upload session and its cached stages"""
+    if not upload_sessions.remove(session_id):
+        raise HTTPException(status_code=404, detail="Upload session not found or expired")
+    return {"success": True, "message": "Upload session deleted"}
+
+def render_video(contents: bytes, settings: AdvancedAudioProcessingSettings) -> bytes:
+    """Replace a video's audio track with its processed audio; returns the MP4
+
+    Cancellation is checked between steps and, through MoviePy's progress
+    logger, between the blocks it reads and writes. Temp files and MoviePy's
+    FFmpeg readers are cleaned up however it ends.
+    """
+    from moviepy.editor import VideoFileClip
+    from moviepy.audio.io.AudioFileClip import AudioFileClip
+    from proglog import ProgressBarLogger
+    
+    class CancellableLogger(ProgressBarLogger):
+        def bars_callback(self, bar, attr, value, old_value=None):
+            check_cancelled()
+    
+    temp_paths = []
+    def temp_path(suffix: str) -> str:
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+            temp_paths.append(temp_file.name)
+        return temp_paths[-1]
+    
+    clips = []
+    try:
+        input_path = temp_path('.mp4')
+        with open(input_path, 'wb') as f:
+            f.write(contents)
+        
+        # Load video and extract audio
+        video = VideoFileClip(input_path)
+        clips.append(video)
+        audio_path = temp_path('.wav')
+        video.audio.write_audiofile(audio_path, verbose=False, logger=CancellableLogger())
+        
+        # Load and process audio data
+        check_cancelled()
+        audio_data, sample_rate = load_audio_for_processing(audio_path, settings)
+        set_units(num_samples(audio_data) / sample_rate)
+        processed_audio = process_upload_audio(audio_data, settings, sample_rate)
+        
+        # Create new audio clip and replace in video
+        check_cancelled()
+        processed_audio_path = temp_path('.wav')
+        sf.write(processed_audio_path, processed_audio.T, sample_rate)
+        new_audio = AudioFileClip(processed_audio_path)
+        clips.append(new_audio)
+        processed_video = video.set_audio(new_audio)
+        
+        # Save processed video
+        output_path = temp_path('.mp4')
+        processed_video.write_videofile(output_path, verbose=False, logger=CancellableLogger())
+        with open(output_path, 'rb') as f:
+            return f.read()
+    finally:
+        for clip in clips:
+            try:
+                clip.close()
+            except Exception:
+                pass
+        for path in temp_paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
 
 @api_router.post("/process-video-enhanced")
 async def process_video_enhanced(
+    request: Request,
     file: UploadFile = File(...),
     settings: str = '{"noise_reduction_enabled": true, "voice_change_enabled": false, "voice_effect": "none"}'
 ):
-    """Process uploaded video file with enhanced audio effects"""
+    """Process uploaded video file with enhanced audio effects; stops if the client disconnects"""
     try:
         # Try to import moviepy dynamically
         try:
-            from moviepy.editor import VideoFileClip
-            from moviepy.audio.io.AudioFileClip import AudioFileClip
+            import moviepy.editor
         except ImportError:
             raise HTTPException(status_code=500, detail="Video processing not available. MoviePy not installed.")
         
@@ -780,113 +1588,246 @@ async def process_video_enhanced(
         settings_dict = json.loads(settings)
         processing_settings = AdvancedAudioProcessingSettings(**settings_dict)
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as tmp_input:
-            contents = await file.read()
-            tmp_input.write(contents)
-            tmp_input.flush()
-            
-            # Load video and extract audio
-            video = VideoFileClip(tmp_input.name)
-            audio_clip = video.audio
-            
-            # Save audio to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_audio:
-                audio_clip.write_audiofile(tmp_audio.name, verbose=False, logger=None)
-                
-                # Load and process audio data
-                audio_data, sample_rate = librosa.load(tmp_audio.name, sr=SAMPLE_RATE)
-                processed_audio = process_audio_with_enhanced_effects(audio_data, processing_settings)
-                
-                # Save processed audio
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as processed_audio_file:
-                    sf.write(processed_audio_file.name, processed_audio, sample_rate)
-                    
-                    # Create new audio clip and replace in video
-                    new_audio = AudioFileClip(processed_audio_file.name)
-                    processed_video = video.set_audio(new_audio)
-                    
-                    # Save processed video
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp4') as output_video:
-                        processed_video.write_videofile(output_video.name, verbose=False, logger=None)
-                        
-                        # Read and return processed video
-                        with open(output_video.name, 'rb') as f:
-                            processed_video_data = f.read()
-                        
-                        # Cleanup
-                        for temp_file in [tmp_input.name, tmp_audio.name, processed_audio_file.name, output_video.name]:
-                            try:
-                                os.unlink(temp_file)
-                            except:
-                                pass
-                        
-                        return StreamingResponse(
-                            io.BytesIO(processed_video_data),
-                            media_type="video/mp4",
-                            headers={"Content-Disposition": f"attachment; filename=enhanced_{file.filename}"}
-                        )
-                        
+        contents = await file.read()
+        processed_video_data = await run_request('video', request, render_video, contents, processing_settings)
+        return StreamingResponse(
+            io.BytesIO(processed_video_data),
+            media_type="video/mp4",
+            headers={"Content-Disposition": f"attachment; filename=enhanced_{file.filename}"}
+        )
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error processing video file: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing video: {str(e)}")
 
-# Enhanced WebSocket endpoint
-@app.websocket("/ws/audio-enhanced")
-async def websocket_audio_enhanced(websocket: WebSocket):
-    await manager.connect(websocket)
+def process_live_frame(websocket: WebSocket, audio_bytes: bytes) -> bytes:
+    """Process one live frame straight from the received bytes; returns float32 PCM bytes"""
+    # Read-only view over the frame (Float32Array from ScriptProcessorNode)
+    audio_data = np.frombuffer(audio_bytes, dtype=np.float32)
+    
+    settings = manager.processing_settings.get(websocket, AdvancedAudioProcessingSettings())
+    state = manager.processing_states.get(websocket)
+    if state is not None and state.buffer_pool is not None:
+        state.buffer_pool.begin_chunk()
+    
+    profiler = manager.profilers.get(websocket)
+    with profiler if profiler is not None else nullcontext():
+        processed_audio = process_audio_with_enhanced_effects(audio_data, settings, state)
+        return as_audio(processed_audio).tobytes()
+
+# Stages of the live chain when a session runs it as a pipeline
+LIVE_PIPELINE_STAGES = ('noise_reduction', 'effects')
+PIPELINE_STATS_EVERY = 50  # pipelined chunks between pipeline_stats messages
+
+def process_live_stage(audio_data: np.ndarray, settings: AdvancedAudioProcessingSettings,
+                       state: ProcessingState, meta: dict, stage: str) -> np.ndarray:
+    """One stage of the live chain, run by a LivePipeline worker
+
+    'noise_reduction' runs the VAD and denoises; 'effects' runs everything
+    after it, including the output gain stage. Chained on two streaming
+    states they produce what one process_audio_with_enhanced_effects call
+    does. The first stage decides which chunks take the silence fast path and
+    passes the decision on in `meta['speech']`; the effects stage then skips
+    its stages for those chunks and holds the AGC.
+    """
+    if stage == 'noise_reduction':
+        if not settings.noise_reduction_enabled and not settings.vad_fast_path:
+            return audio_data
+        stage_settings = AdvancedAudioProcessingSettings(**{
+            **settings.dict(), 'voice_change_enabled': False, 'echo_enabled': False, 'reverb_enabled': False
+        })
+        processed = process_audio_with_enhanced_effects(audio_data, stage_settings, state, normalize=False)
+        if state.vad is not None and settings.vad_fast_path:
+            meta['speech'] = state.vad.speech
+        return processed
+    if meta.get('speech') is False:
+        # Already bypassed by the first stage
+        skip_silence(audio_data, state)
+        return apply_output_gain(audio_data, state, SAMPLE_RATE, output_gain_settings(settings),
+                                 out=get_output_buffer(state.buffer_pool, 'output', audio_data), hold_agc=True)
+    stage_settings = AdvancedAudioProcessingSettings(**{
+        **settings.dict(), 'noise_reduction_enabled': False, 'vad_fast_path': False
+    })
+    return process_audio_with_enhanced_effects(audio_data, stage_settings, state)
+
+def create_live_pipeline(settings: AdvancedAudioProcessingSettings) -> LivePipeline:
+    pipeline = LivePipeline(
+        [PipelineStage(name, partial(process_live_stage, stage=name)) for name in LIVE_PIPELINE_STAGES],
+        SAMPLE_RATE, settings.chunk_size
+    )
+    pipeline.start(settings)
+    return pipeline
+
+async def update_live_pipeline(websocket: WebSocket,
+                               settings: AdvancedAudioProcessingSettings) -> Optional[LivePipeline]:
+    """The session's pipeline, started, restarted or stopped to match its settings
+
+    Call with no chunks in flight. A new pipeline starts with fresh stage
+    state, like a new session.
+    """
+    pipeline = manager.pipelines.get(websocket)
+    wanted = settings.live_pipeline and ENHANCED_PROCESSOR_AVAILABLE
+    if pipeline is not None and (not wanted or not pipeline.alive or pipeline.chunk_size != settings.chunk_size):
+        del manager.pipelines[websocket]
+        await manager.send_audio_data(websocket, {'type': 'pipeline_stats', 'pipeline': pipeline.get_stats()})
+        await asyncio.to_thread(pipeline.close)
+        pipeline = None
+    if settings.live_pipeline and not wanted:
+        message = "Live pipeline needs the enhanced processor"
+    elif wanted and pipeline is None:
+        try:
+            pipeline = await asyncio.to_thread(create_live_pipeline, settings)
+        except Exception as e:
+            logging.error(f"Could not start live pipeline: {e}")
+            message = f"Could not start live pipeline: {e}"
+        else:
+            manager.pipelines[websocket] = pipeline
+            await manager.send_audio_data(websocket, {'type': 'pipeline_stats', 'pipeline': pipeline.get_stats()})
+            return pipeline
+    else:
+        return pipeline
+    
+    # Fall back to the serial chain for the rest of the session, unless the client asks again
+    manager.processing_settings[websocket] = AdvancedAudioProcessingSettings(**{**settings.dict(), 'live_pipeline': False})
+    await manager.send_audio_data(websocket, {'type': 'pipeline_error', 'message': message})
+    return None
+
+def get_live_debug_metrics(websocket: WebSocket) -> Optional[dict]:
+    """Per-chunk allocation metrics when the session asked for debug metrics"""
+    settings = manager.processing_settings.get(websocket)
+    state = manager.processing_states.get(websocket)
+    if not settings or not settings.debug_metrics or state is None or state.buffer_pool is None:
+        return None
+    return state.buffer_pool.get_metrics()
+
+def get_vad_stats(websocket: WebSocket) -> Optional[dict]:
+    """Speech and bypassed chunk counts and the CPU the silence fast path saved"""
+    state = manager.processing_states.get(websocket)
+    if state is None or state.vad is None:
+        return None
+    return state.vad.get_stats()
+
+def get_gain_latency_ms(websocket: WebSocket) -> Optional[float]:
+    """Delay the session's gain stage adds to live output, once it exists"""
+    state = manager.processing_states.get(websocket)
+    if state is None or state.gain_stage is None:
+        return None
+    return state.gain_stage.latency * 1000.0 / state.sample_rate
+
+async def update_live_profiling(websocket: WebSocket, settings: AdvancedAudioProcessingSettings):
+    """Start or stop profiling a live session when its profile flag changes"""
+    profiling = websocket in manager.profilers
+    if settings.profile and not profiling:
+        if websocket not in manager.admin_connections:
+            await manager.send_audio_data(websocket, {
+                'type': 'profile_error',
+                'message': 'Profiling requires a connection opened with a valid admin token'
+            })
+            return
+        manager.profilers[websocket] = RequestProfiler('live', settings.voice_effect)
+        await manager.send_audio_data(websocket, {
+            'type': 'profile_started',
+            'profile_id': manager.profilers[websocket].id
+        })
+    elif not settings.profile and profiling:
+        summary = await asyncio.to_thread(manager.profilers.pop(websocket).save)
+        await manager.send_audio_data(websocket, {
+            'type': 'profile_saved',
+            'profile_id': summary['id'],
+            'wall_time': summary['wall_time'],
+            'peak_memory_bytes': summary['peak_memory_bytes']
+        })
+
+async def close_stream_decoder(websocket: WebSocket):
+    """Stop the session's decoder after it flushes; the last chunk is still queued"""
+    decoder = manager.decoders.pop(websocket, None)
+    if decoder is not None:
+        await decoder.close()
+        await manager.send_audio_data(websocket, {'type': 'decoder_stats', 'decoder': decoder.get_stats()})
+
+async def feed_stream_decoder(websocket: WebSocket, fragment: bytes, settings: AdvancedAudioProcessingSettings):
+    """Decode a compressed fragment in the session's long-lived FFmpeg; PCM chunks join the frame queue"""
+    queue = manager.frame_queues[websocket]
+    decoder = manager.decoders.get(websocket)
+    if decoder is not None and fragment[:len(EBML_MAGIC)] == EBML_MAGIC:
+        # A new stream from a restarted recorder
+        await close_stream_decoder(websocket)
+        decoder = None
+    if decoder is None:
+        decoder = StreamDecoder(SAMPLE_RATE, settings.chunk_size,
+                                lambda chunk: queue.put_nowait(LiveFrame(chunk, binary=True)))
+        try:
+            await decoder.start()
+        except OSError as e:
+            logging.error(f"Could not start stream decoder: {e}")
+            await manager.send_audio_data(websocket, {'type': 'decoder_error', 'message': f"FFmpeg unavailable: {e}"})
+            return
+        manager.decoders[websocket] = decoder
+    decoder.chunk_size = settings.chunk_size
+    try:
+        await decoder.feed(fragment)
+    except (RuntimeError, ConnectionError) as e:
+        # The next fragment starting with a WebM header gets a fresh decoder
+        manager.decoders.pop(websocket, None)
+        decoder.kill()
+        logging.error(f"Stream decoder failed: {e}")
+        await manager.send_audio_data(websocket, {'type': 'decoder_error', 'message': str(e)})
+
+async def receive_live_frames(websocket: WebSocket):
+    """Receiver task: queue audio frames and handle control messages immediately"""
+    queue = manager.frame_queues[websocket]
     try:
         while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            frame = await websocket.receive()
+            if frame['type'] == 'websocket.disconnect':
+                manager.cancel_session(websocket, 'client disconnected')
+                break
+            
+            if frame.get('bytes') is not None:
+                # Binary frame: raw float32 PCM, optionally behind a seq/capture-time header,
+                # or a fragment of the session's WebM/Opus stream
+                settings = manager.processing_settings.get(websocket, AdvancedAudioProcessingSettings())
+                if settings.input_format == 'webm':
+                    await feed_stream_decoder(websocket, frame['bytes'], settings)
+                else:
+                    queue.put_nowait(LiveFrame.from_binary(frame['bytes'], settings.frame_header))
+                continue
+            
+            message = json.loads(frame['text'])
             
             if message['type'] == 'audio_data':
-                # Process real-time audio with enhanced effects
-                audio_base64 = message['audio_data']
-                audio_bytes = base64.b64decode(audio_base64)
-                
-                try:
-                    # Decode as Float32Array (from ScriptProcessorNode)
-                    audio_data = np.frombuffer(audio_bytes, dtype=np.float32)
-                    
-                    # Get processing settings
-                    settings = manager.processing_settings.get(websocket, AdvancedAudioProcessingSettings())
-                    
-                    # Process audio
-                    processed_audio = process_audio_with_enhanced_effects(audio_data, settings)
-                    
-                    # Send processed audio back
-                    processed_bytes = processed_audio.astype(np.float32).tobytes()
-                    processed_base64 = base64.b64encode(processed_bytes).decode('utf-8')
-                    
-                    await manager.send_audio_data(websocket, {
-                        'type': 'processed_audio',
-                        'audio_data': processed_base64,
-                        'processing_latency': 0.01  # Simulated low latency
-                    })
-                    
-                except Exception as e:
-                    logging.error(f"Error processing audio data: {e}")
-                    # Send back original audio or silence
-                    silence = np.zeros(1024, dtype=np.float32)
-                    processed_bytes = silence.astype(np.float32).tobytes()
-                    processed_base64 = base64.b64encode(processed_bytes).decode('utf-8')
-                    
-                    await manager.send_audio_data(websocket, {
-                        'type': 'processed_audio',
-                        'audio_data': processed_base64,
-                        'processing_latency': 0.01
-                    })
+                queue.put_nowait(LiveFrame(
+                    base64.b64decode(message['audio_data']),
+                    seq=message.get('seq'),
+                    capture_ts=message.get('capture_ts')
+                ))
                 
             elif message['type'] == 'settings_update':
                 # Update enhanced processing settings
                 settings_data = message['settings']
-                manager.processing_settings[websocket] = AdvancedAudioProcessingSettings(**settings_data)
+                settings = AdvancedAudioProcessingSettings(**settings_data)
+                manager.processing_settings[websocket] = settings
+                
+                # Resize the session's buffer pool to the negotiated chunk size
+                state = manager.processing_states.get(websocket)
+                if state is not None and state.buffer_pool is not None:
+                    state.buffer_pool.resize(settings.chunk_size)
+                    state.buffer_pool.set_tracing(settings.debug_metrics)
+                queue.configure(settings.max_queued_frames, settings.latency_budget_ms)
+                if settings.input_format != 'webm':
+                    await close_stream_decoder(websocket)
+                
+                # System-wide mode: the virtual device follows this client's settings
+                if settings.system_wide_enabled and hasattr(virtual_device, 'update_settings'):
+                    virtual_device.update_settings(settings)
                 
                 await manager.send_audio_data(websocket, {
                     'type': 'settings_updated',
                     'message': 'Enhanced processing settings updated'
                 })
+                await update_live_profiling(websocket, settings)
                 
             elif message['type'] == 'virtual_device_subscribe':
                 # Subscribe to virtual device status updates
@@ -894,18 +1835,208 @@ async def websocket_audio_enhanced(websocket: WebSocket):
                     manager.virtual_device_clients.append(websocket)
                 
                 # Send current status
-                status = virtual_device.get_status()
+                status = await get_shared_virtual_device_status()
                 await manager.send_audio_data(websocket, {
                     'type': 'virtual_device_status',
                     'status': status
                 })
-                
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        manager.cancel_session(websocket, 'client disconnected')
+    except Exception as e:
+        logging.error(f"Enhanced WebSocket receive error: {e}")
+    finally:
+        queue.close()
+
+async def process_frame(websocket: WebSocket, frame: LiveFrame) -> Optional[bytes]:
+    """Process one queued frame off the event loop in the serial chain
+
+    Returns None if the client left while the frame was being processed.
+    """
+    token = manager.cancel_tokens.get(websocket)
+    if token is None:
+        return None
+    try:
+        return await asyncio.to_thread(run_tracked, token, 'live', process_live_frame, websocket,
+                                       frame.payload, units=1)
+    except ProcessingCancelled:
+        return None
+    except Exception as e:
+        logging.error(f"Error processing audio data: {e}")
+        # Send back silence
+        return np.zeros(1024, dtype=AUDIO_DTYPE).tobytes()
+
+async def send_pipelined_frames(websocket: WebSocket, pipelined: asyncio.Queue, queue: LiveFrameQueue):
+    """Sender task: send pipelined frames back in order as the last stage finishes them"""
+    while True:
+        pipeline, frame = await pipelined.get()
+        try:
+            try:
+                processed_bytes = (await asyncio.to_thread(pipeline.receive)).tobytes()
+            except Exception as e:
+                logging.error(f"Live pipeline error: {e}")
+                processed_bytes = np.zeros(1024, dtype=AUDIO_DTYPE).tobytes()
+            await send_processed_frame(websocket, frame, queue, processed_bytes)
+            if pipeline.received % PIPELINE_STATS_EVERY == 0:
+                await manager.send_audio_data(websocket, {'type': 'pipeline_stats', 'pipeline': pipeline.get_stats()})
+        finally:
+            pipelined.task_done()
+
+async def send_processed_frame(websocket: WebSocket, frame: LiveFrame, queue: LiveFrameQueue,
+                               processed_bytes: bytes):
+    """Send a processed frame back in the frame's format"""
+    queue.stats.processed += 1
+    latency = (now_ms() - frame.received_at) / 1000.0  # queueing plus processing
+    debug_metrics = get_live_debug_metrics(websocket)
+    
+    if frame.binary:
+        settings = manager.processing_settings.get(websocket, AdvancedAudioProcessingSettings())
+        if settings.frame_header:
+            processed_bytes = frame.header() + processed_bytes
+        await manager.send_audio_bytes(websocket, processed_bytes)
+        
+        # Binary frames carry no JSON, so counters follow as a message when they change
+        if debug_metrics is not None:
+            await manager.send_audio_data(websocket, {
+                'type': 'debug_metrics',
+                'debug': debug_metrics,
+                'gain_latency_ms': get_gain_latency_ms(websocket),
+                'vad': get_vad_stats(websocket),
+                'frame_stats': queue.stats.to_dict()
+            })
+        elif queue.stats.losses_changed():
+            await manager.send_audio_data(websocket, {
+                'type': 'frame_stats',
+                'frame_stats': queue.stats.to_dict()
+            })
+        return
+    
+    response = {
+        'type': 'processed_audio',
+        'audio_data': base64.b64encode(processed_bytes).decode('utf-8'),
+        'seq': frame.seq,
+        'capture_ts': frame.capture_ts,
+        'processing_latency': latency,
+        'gain_latency_ms': get_gain_latency_ms(websocket),
+        'vad': get_vad_stats(websocket),
+        'frame_stats': queue.stats.to_dict()
+    }
+    if debug_metrics is not None:
+        response['debug'] = debug_metrics
+    await manager.send_audio_data(websocket, response, droppable=True)
+
+# Enhanced WebSocket endpoint
+@app.websocket("/ws/audio-enhanced")
+async def websocket_audio_enhanced(websocket: WebSocket):
+    await manager.connect(websocket)
+    queue = manager.frame_queues[websocket]
+    receiver = asyncio.create_task(receive_live_frames(websocket))
+    # Frames submitted to the session's pipeline, in order, until the sender returns them
+    pipelined: asyncio.Queue = asyncio.Queue()
+    sender = asyncio.create_task(send_pipelined_frames(websocket, pipelined, queue))
+    try:
+        # Process the freshest frames within the latency budget until the client leaves
+        while True:
+            frame = await queue.get()
+            if frame is None:
+                break
+            settings = manager.processing_settings.get(websocket, AdvancedAudioProcessingSettings())
+            pipeline = manager.pipelines.get(websocket)
+            if (pipeline is not None) != settings.live_pipeline or (
+                    pipeline is not None and (not pipeline.alive or pipeline.chunk_size != settings.chunk_size)):
+                # Chunks in flight go out before the chain changes
+                await pipelined.join()
+                pipeline = await update_live_pipeline(websocket, settings)
+            
+            if pipeline is not None:
+                audio_data = np.frombuffer(frame.payload, dtype=np.float32)
+                try:
+                    # Blocks only while every slot of the first ring is taken
+                    await asyncio.to_thread(pipeline.submit, audio_data, settings)
+                    pipelined.put_nowait((pipeline, frame))
+                    continue
+                except Exception as e:
+                    logging.warning(f"Frame not pipelined, processing serially: {e}")
+                    await pipelined.join()
+            processed_bytes = await process_frame(websocket, frame)
+            if processed_bytes is None:
+                break
+            await send_processed_frame(websocket, frame, queue, processed_bytes)
     except Exception as e:
         logging.error(f"Enhanced WebSocket error: {e}")
+    finally:
+        receiver.cancel()
+        sender.cancel()
         manager.disconnect(websocket)
 
+@api_router.get("/peaks/{peaks_id}")
+async def get_waveform_peaks(peaks_id: str, start: float = 0.0, end: Optional[float] = None,
+                             level: Optional[int] = None, width: Optional[int] = None):
+    """Min/max/RMS peaks of a processed result for [start, end) seconds
+
+    Give `level` (0 is the finest) or `width`, the number of peaks wanted for
+    the range; the coarsest level with at least that many is used.
+    """
+    pyramid = get_peaks(peaks_id)
+    if pyramid is None:
+        raise HTTPException(status_code=404, detail="Peaks not found")
+    try:
+        return pyramid.query(start, end, level=level, width=width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/results/{result_id}")
+async def download_result(result_id: str, range_header: Optional[str] = Header(None, alias='Range')):
+    """A stored binary result; a single `Range: bytes=...` gets a 206 partial response"""
+    found = get_result(result_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    path, format = found
+    media_type = OUTPUT_FORMATS[format][2]
+    size = path.stat().st_size
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError:
+        raise HTTPException(status_code=416, detail="Range not satisfiable",
+                            headers={'Content-Range': f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers={'Accept-Ranges': 'bytes'})
+    start, end = byte_range
+    return StreamingResponse(iter_file_range(path, start, end), status_code=206, media_type=media_type, headers={
+        'Content-Range': f"bytes {start}-{end}/{size}",
+        'Content-Length': str(end - start + 1),
+        'Accept-Ranges': 'bytes',
+    })
+
+# Admin profiling endpoints
+def require_admin(x_admin_token: Optional[str]):
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@api_router.get("/admin/connections")
+async def get_connection_stats(x_admin_token: Optional[str] = Header(None)):
+    """WebSocket clients of this worker, their outbound queues, slow clients evicted and cancelled work"""
+    require_admin(x_admin_token)
+    return manager.get_stats()
+
+@api_router.get("/admin/profiles")
+async def get_saved_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List saved request profiles, newest first"""
+    require_admin(x_admin_token)
+    return {"profiles": list_profiles()}
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: str = "prof",
+                           x_admin_token: Optional[str] = Header(None)):
+    """Download a saved profile as a pstats dump ('prof') or its JSON summary ('json')"""
+    require_admin(x_admin_token)
+    if format not in ('prof', 'json'):
+        raise HTTPException(status_code=400, detail="format must be 'prof' or 'json'")
+    path = get_profile_path(profile_id, f".{format}")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = 'application/json' if format == 'json' else 'application/octet-stream'
+    return FileResponse(path, media_type=media_type, filename=path.name)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -915,6 +2046,10 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Binary results carry their diagnostics in headers
+    expose_headers=["Server-Timing", "X-Processing-Time", "X-Peaks-Id", "X-Result-Id", "X-Profile-Id",
+                    "X-Session-Id", "X-Reused-Stages", "X-Sample-Rate", "X-Channels", "X-Duration",
+                    "Content-Location", "Content-Range", "Accept-Ranges"],
 )
 
 # Configure logging
@@ -924,6 +2059,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_shared_state():
+    shared_state.subscribe(VIRTUAL_DEVICE_CHANNEL, on_virtual_device_status)
+    shared_state.subscribe(PRESETS_CHANNEL, on_presets_update)
+    await shared_state.start()
+    # JIT-compile the fused effect tail before the first live chunk needs it
+    await asyncio.to_thread(warm_up_effect_tail)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if virtual_device.is_active:
+        await asyncio.to_thread(virtual_device.stop_virtual_device)
+    await shared_state.stop()
+    if client is not None:
+        client.close()
\ No newline at end of file
@@ -0,0 +1,220 @@
+"""
+Shared State Module
+Cross-worker / cross-node state and pub/sub for status and presets
+
+WebSocket connections are owned by the worker that accepted them, but the
+virtual device status and saved presets must look the same from every worker.
+Each worker publishes changes through a SharedStateBackend and re-broadcasts
+messages it receives to its own local subscribers.
+"""
+
+import asyncio
+import logging
+import re
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from pymongo import CursorType, ReturnDocument
+from pymongo.errors import CollectionInvalid
+
+Subscriber = Callable[[Dict[str, Any]], Awaitable[None]]
+
+EVENTS_RESUME_WINDOW = 64  # sequence numbers re-read when a tail cursor is reopened
+
+
+class SharedStateBackend:
+    """Key/value state plus channel pub/sub shared by every worker"""
+
+    def __init__(self):
+        self.node_id = str(uuid.uuid4())
+        self.subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+
+    async def start(self):
+        """Start background delivery (called on app startup)"""
+
+    async def stop(self):
+        """Stop background delivery (called on app shutdown)"""
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def get_all(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """Get every key starting with `prefix`"""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, callback: Subscriber):
+        """Register an async callback for messages published on `channel` by any worker"""
+        self.subscribers[channel].append(callback)
+
+    async def _deliver(self, channel: str, message: Dict[str, Any]):
+        for callback in list(self.subscribers.get(channel, [])):
+            try:
+                await callback(message)
+            except Exception as e:
+                logging.error(f"Error delivering shared state message on {channel}: {e}")
+
+
+class InMemoryStateBackend(SharedStateBackend):
+    """Process-local backend for single-worker deployments and tests
+
+    Several managers sharing one instance behave like several workers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.values: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.values.get(key)
+        return dict(value) if value is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        self.values[key] = dict(value)
+
+    async def delete(self, key: str):
+        self.values.pop(key, None)
+
+    async def get_all(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        return {key: dict(value) for key, value in self.values.items() if key.startswith(prefix)}
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self._deliver(channel, message)
+
+
+class MongoStateBackend(SharedStateBackend):
+    """MongoDB backend using the app's motor database
+
+    State lives in `shared_state` (one document per key). Messages are
+    appended to the capped collection `shared_events`, which every worker
+    tails with a tailable await cursor. Publishers deliver to their own
+    subscribers immediately and skip their own events when tailing.
+
+    The cursor stays open while it is alive. Reopening it (after an error or
+    when the collection was empty) needs a position, and ObjectIds are not
+    one: they start with their node's clock second. Every event instead
+    carries `seq` from one counter document, which is ordered across nodes.
+    Two publishers may still insert in the opposite order of their numbers,
+    so a reopened cursor re-reads the last EVENTS_RESUME_WINDOW numbers and
+    skips those already delivered.
+    """
+
+    def __init__(self, db, events_size_bytes: int = 1 << 20):
+        super().__init__()
+        self.db = db
+        self.state = db.shared_state
+        self.events = db.shared_events
+        self.counters = db.shared_counters
+        self.events_size_bytes = events_size_bytes
+        self._tail_task: Optional[asyncio.Task] = None
+        self._last_seq: Optional[int] = None
+        self._seen_seqs: Deque[int] = deque(maxlen=4 * EVENTS_RESUME_WINDOW)
+
+    async def start(self):
+        try:
+            await self.db.create_collection('shared_events', capped=True, size=self.events_size_bytes)
+        except CollectionInvalid:
+            pass  # Another worker created it
+        self._tail_task = asyncio.create_task(self._tail_events())
+
+    async def stop(self):
+        if self._tail_task is not None:
+            self._tail_task.cancel()
+            try:
+                await self._tail_task
+            except asyncio.CancelledError:
+                pass
+            self._tail_task = None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        document = await self.state.find_one({'_id': key})
+        return document['value'] if document else None
+
+    async def set(self, key: str, value: Dict[str, Any]):
+        await self.state.update_one(
+            {'_id': key},
+            {'$set': {'value': value, 'updated_at': datetime.utcnow(), 'node_id': self.node_id}},
+            upsert=True
+        )
+
+    async def delete(self, key: str):
+        await self.state.delete_one({'_id': key})
+
+    async def get_all(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        cursor = self.state.find({'_id': {'$regex': f'^{re.escape(prefix)}'}})
+        return {document['_id']: document['value'] async for document in cursor}
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        counter = await self.counters.find_one_and_update(
+            {'_id': 'shared_events'}, {'$inc': {'seq': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        await self.events.insert_one({
+            'seq': counter['seq'],
+            'channel': channel,
+            'message': message,
+            'node_id': self.node_id,
+            'timestamp': datetime.utcnow()
+        })
+        await self._deliver(channel, message)
+
+    async def _tail_events(self):
+        """Follow the capped events collection and deliver other workers' messages"""
+        # Events published before this worker started count as seen
+        recent = await self.events.find().sort('$natural', -1).limit(EVENTS_RESUME_WINDOW).to_list(
+            EVENTS_RESUME_WINDOW)
+        for event in reversed(recent):
+            self._mark_seen(event)
+
+        while True:
+            try:
+                cursor = self.events.find(self._resume_query(), cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        await self._receive(event)
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Shared state event tail failed, retrying: {e}")
+            await asyncio.sleep(1.0)
+
+    def _resume_query(self) -> Dict[str, Any]:
+        """Query for a reopened cursor: every event not yet seen, by sequence number"""
+        if self._last_seq is None:
+            return {}
+        return {'seq': {'$gt': self._last_seq - EVENTS_RESUME_WINDOW}}
+
+    def _mark_seen(self, event: Dict[str, Any]) -> bool:
+        """Remember the event's sequence number; False if it was already seen"""
+        seq = event.get('seq')
+        if seq is None or seq in self._seen_seqs:
+            return False
+        self._seen_seqs.append(seq)
+        self._last_seq = seq if self._last_seq is None else max(self._last_seq, seq)
+        return True
+
+    async def _receive(self, event: Dict[str, Any]):
+        if self._mark_seen(event) and event.get('node_id') != self.node_id:
+            await self._deliver(event['channel'], event['message'])
+
+
+def create_shared_state(backend: str, db=None) -> SharedStateBackend:
+    """Create the configured backend ('memory' or 'mongo')"""
+    if backend == 'mongo':
+        if db is None:
+            raise ValueError("The mongo shared state backend needs a database")
+        return MongoStateBackend(db)
+    if backend != 'memory':
+        logging.warning(f"Unknown shared state backend '{backend}', using in-memory state")
+    return InMemoryStateBackend()
@@ -0,0 +1,123 @@
+"""
+Spectral Backend Module
+Real-FFT STFT/ISTFT through scipy.fft with worker threads and cached windows
+
+librosa.stft/istft run single-threaded FFTs and rebuild the Hann window, the
+frame padding and the synthesis normalization on every call. Here transforms
+go through scipy.fft with FFT_WORKERS threads. The window is cached per
+n_fft. The inverse window-sum-square is cached per (n_fft, hop, frames), so a
+live session with a fixed chunk size computes it once. The results match
+librosa's centered, zero-padded Hann STFT and its ISTFT.
+
+`fft_workers()` applies the same worker count to library code that calls
+scipy.fft itself (noisereduce's STFTs).
+"""
+
+import os
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+from dtype_policy import AUDIO_DTYPE, as_audio
+
+FFT_WORKERS = int(os.environ.get('FFT_WORKERS', os.cpu_count() or 1))
+
+_workers = FFT_WORKERS
+
+
+def set_fft_workers(workers: int):
+    """Worker threads per transform in this process (segment workers use 1)"""
+    global _workers
+    _workers = max(int(workers), 1)
+
+
+def get_fft_workers() -> int:
+    return _workers
+
+
+def fft_workers():
+    """Context in which scipy.fft calls from any code use this process's worker count"""
+    return scipy.fft.set_workers(_workers)
+
+
+@lru_cache(maxsize=16)
+def get_window(n_fft: int) -> np.ndarray:
+    """Periodic Hann window, as librosa uses it"""
+    window = scipy.signal.get_window('hann', n_fft, fftbins=True).astype(AUDIO_DTYPE)
+    window.flags.writeable = False
+    return window
+
+
+@lru_cache(maxsize=64)
+def get_inverse_envelope(n_fft: int, hop_length: int, num_frames: int) -> np.ndarray:
+    """1 / sum of squared windows after overlap-add, 1 where the sum vanishes"""
+    squared = np.square(get_window(n_fft), dtype=np.float64)
+    total = n_fft + hop_length * (num_frames - 1)
+    envelope = np.zeros(total + hop_length)  # one hop of slack so every column view fits
+    for offset in range(0, n_fft, hop_length):
+        # Every frame contributes this slice of its window at its hop position
+        part = squared[offset:offset + hop_length]
+        view = envelope[offset:offset + hop_length * num_frames].reshape(num_frames, hop_length)
+        view[:, :len(part)] += part
+    envelope = envelope[:total]
+    tiny = np.finfo(AUDIO_DTYPE).tiny
+    inverse = np.divide(1.0, envelope, out=np.ones_like(envelope), where=envelope > tiny).astype(AUDIO_DTYPE)
+    inverse.flags.writeable = False
+    return inverse
+
+
+def rfft_frames(frames: np.ndarray) -> np.ndarray:
+    """Spectra of (..., frames, n_fft) frames under the cached Hann window"""
+    return scipy.fft.rfft(frames * get_window(frames.shape[-1]), axis=-1, workers=_workers, overwrite_x=True)
+
+
+def stft(audio: np.ndarray, n_fft: int = 2048, hop_length: int = 512,
+         out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Complex64 STFT of a (samples,) or (channels, samples) buffer
+
+    Shaped (..., n_fft // 2 + 1, frames) like librosa.stft with center=True.
+    Without `out` the result is a transposed view of the FFT output.
+    """
+    audio = as_audio(audio)
+    pad = n_fft // 2
+    padded = np.pad(audio, [(0, 0)] * (audio.ndim - 1) + [(pad, pad)])
+    frames = np.lib.stride_tricks.sliding_window_view(padded, n_fft, axis=-1)[..., ::hop_length, :]
+    spectrum = np.swapaxes(rfft_frames(frames), -1, -2)
+    if out is None:
+        return spectrum
+    np.copyto(out, spectrum)
+    return out
+
+
+def istft(stft_matrix: np.ndarray, hop_length: int = 512, length: Optional[int] = None,
+          out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Inverse of `stft` (librosa.istft semantics); `length` trims or zero-pads the result"""
+    n_fft = 2 * (stft_matrix.shape[-2] - 1)
+    num_frames = stft_matrix.shape[-1]
+    frames = scipy.fft.irfft(np.swapaxes(stft_matrix, -1, -2), n=n_fft, axis=-1, workers=_workers)
+    frames = frames.astype(AUDIO_DTYPE, copy=False)
+    frames *= get_window(n_fft)
+
+    # Overlap-add one hop-wide column of every frame at a time
+    leading = frames.shape[:-2]
+    total = n_fft + hop_length * (num_frames - 1)
+    signal = np.zeros(leading + (total + hop_length,), dtype=AUDIO_DTYPE)
+    for offset in range(0, n_fft, hop_length):
+        part = frames[..., offset:offset + hop_length]
+        view = signal[..., offset:offset + hop_length * num_frames].reshape(leading + (num_frames, hop_length))
+        view[..., :part.shape[-1]] += part
+    signal = signal[..., :total]
+    signal *= get_inverse_envelope(n_fft, hop_length, num_frames)
+
+    start = n_fft // 2
+    if length is None:
+        length = total - 2 * start
+    if out is None:
+        out = np.zeros(leading + (length,), dtype=AUDIO_DTYPE)
+    available = min(max(signal.shape[-1] - start, 0), length)
+    out[..., :available] = signal[..., start:start + available]
+    out[..., available:] = 0.0
+    return out
@@ -0,0 +1,145 @@
+"""
+Stream Decoder Module
+One long-lived FFmpeg process per live session decoding MediaRecorder WebM/Opus
+
+MediaRecorder started with a timeslice emits one WebM stream in fragments. The
+first fragment carries the EBML header and track info; later ones carry only
+clusters, so a fragment cannot be decoded on its own. convert_webm_to_wav
+spawns FFmpeg with temp files for each complete blob. A StreamDecoder instead
+keeps one FFmpeg per session reading the stream on stdin and writing mono
+float32 PCM at the session rate on stdout. Fragments are written as they
+arrive. PCM is cut into `chunk_size` frames as it comes out and handed to
+`on_chunk`.
+
+Opus at MediaRecorder's default bitrate is about a tenth of raw float32
+upstream. A fragment that starts with an EBML header begins a new stream
+(the recorder was restarted), so the decoder is restarted for it.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE
+
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'  # first bytes of every WebM stream
+READ_SIZE = 16 * 1024
+CLOSE_TIMEOUT = 2.0  # seconds FFmpeg gets to flush after stdin closes
+
+
+def ffmpeg_decode_command(sample_rate: int) -> List[str]:
+    """FFmpeg reading WebM on stdin and writing mono float32 PCM on stdout, without buffering"""
+    return [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-fflags', '+nobuffer', '-flags', 'low_delay', '-probesize', '32768', '-analyzeduration', '0',
+        '-f', 'webm', '-i', 'pipe:0',
+        '-vn', '-acodec', 'pcm_f32le', '-ac', '1', '-ar', str(sample_rate),
+        '-f', 'f32le', '-flush_packets', '1', 'pipe:1',
+    ]
+
+
+class StreamDecoder:
+    """A session's FFmpeg process, fed compressed fragments and drained into PCM chunks"""
+
+    def __init__(self, sample_rate: int, chunk_size: int, on_chunk: Callable[[bytes], None],
+                 command: Optional[List[str]] = None):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.on_chunk = on_chunk
+        self.command = command or ffmpeg_decode_command(sample_rate)
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.bytes_in = 0
+        self.samples_out = 0
+        self.chunks = 0
+        self._pcm = bytearray()
+        self._errors: Deque[str] = deque(maxlen=5)
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        self._tasks = [asyncio.create_task(self._read()), asyncio.create_task(self._read_errors())]
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    @property
+    def error(self) -> str:
+        """FFmpeg's last error lines"""
+        return '; '.join(self._errors) or 'decoder exited'
+
+    async def feed(self, fragment: bytes):
+        """Write one compressed fragment; waits while FFmpeg's stdin pipe is full"""
+        if not self.alive:
+            raise RuntimeError(self.error)
+        self.process.stdin.write(fragment)
+        await self.process.stdin.drain()
+        self.bytes_in += len(fragment)
+
+    async def _read(self):
+        frame_bytes = self.chunk_size * np.dtype(AUDIO_DTYPE).itemsize
+        while True:
+            data = await self.process.stdout.read(READ_SIZE)
+            if not data:
+                break
+            self._pcm += data
+            # The chunk size may change between reads
+            frame_bytes = self.chunk_size * np.dtype(AUDIO_DTYPE).itemsize
+            while len(self._pcm) >= frame_bytes:
+                self._emit(bytes(self._pcm[:frame_bytes]))
+                del self._pcm[:frame_bytes]
+        # Flush the tail of the stream as a zero-padded chunk
+        usable = len(self._pcm) - len(self._pcm) % np.dtype(AUDIO_DTYPE).itemsize
+        if usable:
+            self._emit(bytes(self._pcm[:usable]).ljust(frame_bytes, b'\0'))
+        self._pcm.clear()
+
+    def _emit(self, chunk: bytes):
+        self.samples_out += len(chunk) // np.dtype(AUDIO_DTYPE).itemsize
+        self.chunks += 1
+        self.on_chunk(chunk)
+
+    async def _read_errors(self):
+        async for line in self.process.stderr:
+            message = line.decode(errors='replace').strip()
+            if message:
+                self._errors.append(message)
+                logging.warning(f"Stream decoder: {message}")
+
+    async def close(self):
+        """End the stream, let FFmpeg flush the last chunk, then stop it"""
+        if self.process is None:
+            return
+        if self.alive:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), CLOSE_TIMEOUT)
+            except (asyncio.TimeoutError, ConnectionError):
+                self.kill()
+        try:
+            await asyncio.wait_for(asyncio.gather(*self._tasks), CLOSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        self.kill()
+
+    def kill(self):
+        """Stop at once (session gone); undecoded audio is discarded"""
+        for task in self._tasks:
+            task.cancel()
+        if self.alive:
+            self.process.kill()
+
+    def get_stats(self) -> dict:
+        pcm_bytes = self.samples_out * np.dtype(AUDIO_DTYPE).itemsize  # as raw float32 frames
+        return {
+            'bytes_in': self.bytes_in,
+            'samples_out': self.samples_out,
+            'chunks': self.chunks,
+            'bandwidth_ratio': pcm_bytes / self.bytes_in if self.bytes_in else None,
+        }
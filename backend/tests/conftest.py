@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture(scope='session')
+def speech():
+    """Two seconds of deterministic noisy synthetic speech at 16 kHz, float32"""
+    from benchmarks import add_noise, synthetic_speech
+    return add_noise(synthetic_speech(2.0, seed=0), 10.0, seed=1)
+
+
+@pytest.fixture(scope='session')
+def server_module(tmp_path_factory):
+    """The server module, with peaks and results written to a temp dir"""
+    os.environ.setdefault('PEAKS_DIR', str(tmp_path_factory.mktemp('peaks')))
+    os.environ.setdefault('RESULTS_DIR', str(tmp_path_factory.mktemp('results')))
+    import server
+    return server
@@ -0,0 +1,70 @@
+import threading
+
+import numpy as np
+import pytest
+
+from audio_routing import RingBuffer, _parse_spec
+from dtype_policy import AUDIO_DTYPE
+
+
+def test_capacity_rounds_up_to_a_power_of_two():
+    assert RingBuffer(1000).capacity == 1024
+    assert RingBuffer(1024).capacity == 1024
+
+
+def test_reads_follow_writes_across_the_wrap():
+    ring = RingBuffer(8)
+    out = np.zeros(8, dtype=AUDIO_DTYPE)
+    ring.write(np.arange(6, dtype=AUDIO_DTYPE))
+    assert ring.read_into(out[:4]) == 4
+    # Six more samples wrap around the end of the buffer
+    assert ring.write(np.arange(6, 12, dtype=AUDIO_DTYPE)) == 6
+    assert ring.available == 8 and ring.free == 0
+    assert ring.read_into(out) == 8
+    np.testing.assert_array_equal(out, np.arange(4, 12))
+    assert (ring.write_index, ring.read_index) == (12, 12)
+
+
+def test_overflow_drops_and_counts_the_newest_samples():
+    ring = RingBuffer(4)
+    assert ring.write(np.arange(6, dtype=AUDIO_DTYPE)) == 4
+    assert ring.overflows == 2
+    out = np.full(6, -1, dtype=AUDIO_DTYPE)
+    # Underrun: only what is available is read, the rest of `out` is untouched
+    assert ring.read_into(out) == 4
+    np.testing.assert_array_equal(out, [0, 1, 2, 3, -1, -1])
+
+
+def test_producer_and_consumer_threads_keep_sample_order():
+    ring = RingBuffer(64)
+    total = 4000
+    received = []
+
+    def produce():
+        written = 0
+        while written < total:
+            # Samples that did not fit are offered again
+            written += ring.write(np.arange(written, min(written + 37, total), dtype=np.float32))
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    out = np.empty(29, dtype=AUDIO_DTYPE)
+    while sum(len(block) for block in received) < total:
+        count = ring.read_into(out)
+        received.append(out[:count].copy())
+    producer.join()
+    np.testing.assert_array_equal(np.concatenate(received), np.arange(total))
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('/tmp/in', ('fifo', '/tmp/in')),
+    ('fifo:/tmp/in', ('fifo', '/tmp/in')),
+    ('unix:/tmp/voice.sock', ('unix', '/tmp/voice.sock')),
+])
+def test_endpoint_specs(spec, expected):
+    assert _parse_spec(spec) == expected
+
+
+def test_unknown_endpoint_kind():
+    with pytest.raises(ValueError, match='Unknown endpoint kind'):
+        _parse_spec('tcp:localhost')
@@ -0,0 +1,52 @@
+import numpy as np
+
+from buffer_pool import BufferPool, measure_allocations
+
+
+def test_acquire_counts_only_misses():
+    pool = BufferPool(chunk_size=256)
+    pool.begin_chunk()
+    first = pool.acquire('stage')
+    assert pool.acquire('stage') is first
+    assert pool.get_metrics()['allocations'] == 1
+
+    pool.begin_chunk()
+    pool.acquire('stage')
+    assert pool.get_metrics()['allocations'] == 0
+
+    pool.resize(512)
+    pool.begin_chunk()
+    assert len(pool.acquire('stage')) == 512
+    metrics = pool.get_metrics()
+    assert metrics['allocations'] == 1
+    assert metrics['allocating_stages'] == ['stage']
+    assert metrics['total_allocations'] == 2
+
+
+def test_measure_records_traced_stage_bytes():
+    pool = BufferPool(chunk_size=256)
+    pool.set_tracing(True)
+    try:
+        pool.begin_chunk()
+        with measure_allocations(pool, 'library'):
+            scratch = np.ones(100_000)
+            del scratch
+        with measure_allocations(pool, 'in_place'):
+            pass
+        metrics = pool.get_metrics()
+        assert metrics['stage_bytes']['library'] >= 800_000
+        # Only interpreter bookkeeping, no arrays
+        assert metrics['stage_bytes'].get('in_place', 0) < 4096
+        assert metrics['allocating_stages'][0] == 'library'
+    finally:
+        pool.set_tracing(False)
+
+
+def test_measure_is_free_without_tracing():
+    pool = BufferPool(chunk_size=256)
+    pool.begin_chunk()
+    with measure_allocations(pool, 'library'):
+        np.ones(100_000)
+    with measure_allocations(None, 'library'):
+        pass
+    assert pool.get_metrics()['stage_bytes'] == {}
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from dtype_policy import AUDIO_DTYPE, SPECTRUM_DTYPE, as_audio, check_audio_dtype
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from filters import butter_sos, zero_phase_filter
+from noise_reduction import NOISE_REDUCTION_ENGINES
+from spectral import istft, stft
+
+SAMPLE_RATE = 16000
+
+
+@pytest.fixture(scope='module')
+def processor():
+    return AdvancedVoiceProcessor(SAMPLE_RATE)
+
+
+def test_as_audio_does_not_copy_conforming_input(speech):
+    assert as_audio(speech) is speech
+    assert as_audio(speech.astype(np.float64)).dtype == AUDIO_DTYPE
+
+
+def test_check_audio_dtype_rejects_upcast(speech):
+    check_audio_dtype(speech, 'input')
+    with pytest.raises(TypeError, match='float64'):
+        check_audio_dtype(speech.astype(np.float64), 'stage')
+
+
+@pytest.mark.parametrize('order, cutoff, btype', [
+    (3, 2000, 'low'), (2, 300, 'high'), (4, (300, 3400), 'band'),
+])
+def test_filters_stay_float32(speech, order, cutoff, btype):
+    assert butter_sos(order, cutoff, btype, SAMPLE_RATE).dtype == AUDIO_DTYPE
+    filtered = zero_phase_filter(speech, order, cutoff, btype, SAMPLE_RATE)
+    assert filtered.dtype == AUDIO_DTYPE
+    assert filtered.shape == speech.shape
+
+
+def test_filters_stay_float32_per_channel(speech):
+    stereo = np.stack([speech, speech[::-1]])
+    assert zero_phase_filter(stereo, 3, 2000, 'low', SAMPLE_RATE).dtype == AUDIO_DTYPE
+
+
+def test_stft_round_trip_dtypes(speech):
+    spectrum = stft(speech, n_fft=1024, hop_length=256)
+    assert spectrum.dtype == SPECTRUM_DTYPE
+    restored = istft(spectrum, hop_length=256, length=len(speech))
+    assert restored.dtype == AUDIO_DTYPE
+    assert restored.shape == speech.shape
+
+
+PROCESSOR_STAGES = {
+    'spectral_subtraction': lambda p, audio: p._spectral_subtraction(audio),
+    'speech_enhancement': lambda p, audio: p._enhance_speech_segments(audio),
+    'formant_shift_up': lambda p, audio: p._apply_formant_shift(audio, 1.4),
+    'formant_shift_down': lambda p, audio: p._apply_formant_shift(audio, 0.7),
+    'brightness_up': lambda p, audio: p._adjust_brightness(audio, 1.3),
+    'brightness_down': lambda p, audio: p._adjust_brightness(audio, 0.6),
+    'robotize': lambda p, audio: p._robotize_voice(audio),
+    'alien_modulation': lambda p, audio: p._apply_alien_modulation(audio),
+    'horror_distortion': lambda p, audio: p._apply_horror_distortion(audio),
+    'radio_compression': lambda p, audio: p._apply_radio_compression(audio),
+    'vocoder': lambda p, audio: p._apply_vocoder_effect(audio),
+    'echo': lambda p, audio: p._apply_echo_effect(audio),
+    'reverb': lambda p, audio: p._apply_reverb_effect(audio),
+}
+
+
+@pytest.mark.parametrize('stage', sorted(PROCESSOR_STAGES))
+def test_processor_stage_stays_float32(processor, speech, stage):
+    output = PROCESSOR_STAGES[stage](processor, speech)
+    check_audio_dtype(output, stage)
+    assert output.shape == speech.shape
+
+
+@pytest.mark.parametrize('engine', sorted(NOISE_REDUCTION_ENGINES))
+def test_noise_reduction_stays_float32(processor, speech, engine):
+    output = processor.apply_noise_reduction(speech, engine)
+    check_audio_dtype(output, engine)
+    assert output.shape == speech.shape
+
+
+def test_presets_stay_float32(processor, speech):
+    for effect in processor.voice_effects:
+        settings = {'noise_reduction_enabled': True, 'voice_change_enabled': True, 'voice_effect': effect}
+        check_audio_dtype(processor.process_audio_chunk(speech, settings), f'preset {effect}')
+
+
+def test_server_fallback_stages_stay_float32(server_module, speech):
+    server = server_module
+    stages = {
+        'noise_reduction': lambda: server.apply_enhanced_noise_reduction(speech, SAMPLE_RATE),
+        'spectral_subtraction': lambda: server.apply_spectral_subtraction(speech, SAMPLE_RATE),
+        'brightness': lambda: server.adjust_brightness(speech, SAMPLE_RATE, 1.3),
+        'robotize': lambda: server.robotize_voice(speech, SAMPLE_RATE),
+        'alien_modulation': lambda: server.apply_alien_modulation(speech, SAMPLE_RATE),
+        'horror_distortion': lambda: server.apply_horror_distortion(speech, SAMPLE_RATE),
+        'radio_compression': lambda: server.apply_radio_compression(speech),
+        'vocoder': lambda: server.apply_vocoder_effect(speech, SAMPLE_RATE),
+        'echo': lambda: server.apply_echo_effect(speech, SAMPLE_RATE),
+        'reverb': lambda: server.apply_reverb_effect(speech, SAMPLE_RATE),
+    }
+    for effect in server.ENHANCED_VOICE_EFFECTS:
+        stages[f'effect_{effect}'] = lambda effect=effect: server.apply_enhanced_voice_effect(
+            speech, SAMPLE_RATE, effect)
+    for name, stage in stages.items():
+        output = stage()
+        check_audio_dtype(output, name)
+        assert output.shape == speech.shape, name
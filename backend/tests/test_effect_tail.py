@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from effect_tail import NUMBA_AVAILABLE, EffectTail
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from oscillator import OscillatorBank
+
+SAMPLE_RATE = 16000
+BACKENDS = ['numpy'] + (['numba'] if NUMBA_AVAILABLE else [])
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_fused_modulation_matches_wavetable_stages(speech, backend):
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    separate_bank, fused_bank = OscillatorBank(SAMPLE_RATE), OscillatorBank(SAMPLE_RATE)
+    expected = processor._robotize_voice(speech, separate_bank)
+    expected = processor._apply_alien_modulation(expected, separate_bank)
+
+    tail = EffectTail(SAMPLE_RATE, backend=backend)
+    tail.robotize(fused_bank)
+    tail.alien_modulation(fused_bank)
+    fused = tail.run(speech)
+
+    np.testing.assert_allclose(fused, expected, atol=1e-4)
+    for name in ('robot_carrier', 'robot_harmonic', 'alien_lfo', 'alien_carrier'):
+        difference = fused_bank.get(name, 0).phase - separate_bank.get(name, 0).phase
+        assert abs((difference + 0.5) % 1.0 - 0.5) < 1e-6  # phases in cycles, compared across the wrap
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_echo_continues_across_chunks(speech, backend):
+    whole = EffectTail(SAMPLE_RATE, backend=backend)
+    whole.echo(0.05, 0.5)
+    expected = whole.run(speech)
+
+    chunked = EffectTail(SAMPLE_RATE, backend=backend)
+    outputs = []
+    for start in range(0, len(speech), 1000):
+        chunked.echo(0.05, 0.5)
+        outputs.append(chunked.run(speech[start:start + 1000]))
+    np.testing.assert_allclose(np.concatenate(outputs), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_carrier_phase_holds_over_a_long_buffer(backend):
+    num_samples = SAMPLE_RATE * 60 * 10
+    audio = np.full(num_samples, 0.25, dtype=np.float32)
+    tail = EffectTail(SAMPLE_RATE, backend=backend)
+    tail.robotize(OscillatorBank(SAMPLE_RATE))
+    output = tail.run(audio)
+
+    # The last chunk on its own, from the phase the bank computes for its first sample
+    last = EffectTail(SAMPLE_RATE, backend=backend)
+    last.robotize(OscillatorBank(SAMPLE_RATE, start_sample=num_samples - 4096))
+    np.testing.assert_allclose(output[-4096:], last.run(audio[-4096:]), atol=1e-6)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from dtype_policy import AUDIO_DTYPE
+from gain_stage import DEFAULT_TARGET, GainStage, apply_output_gain
+from processing_state import ProcessingState
+
+SAMPLE_RATE = 16000
+
+
+def run(stage, audio, chunk_size, **kwargs):
+    return np.concatenate([stage.process(audio[..., i:i + chunk_size], **kwargs)
+                           for i in range(0, audio.shape[-1], chunk_size)], axis=-1)
+
+
+def test_output_is_the_input_delayed_by_the_lookahead(speech):
+    stage = GainStage(SAMPLE_RATE, lookahead_ms=5.0, max_gain_db=0.0)
+    quiet = speech * AUDIO_DTYPE(0.1)
+    output = run(stage, quiet, 1024)
+    assert stage.latency == 80
+    np.testing.assert_array_equal(output[:stage.latency], 0)
+    # Below target and without AGC boost the stage is a pure delay
+    np.testing.assert_allclose(output[stage.latency:], quiet[:-stage.latency], atol=1e-6)
+
+
+def test_peaks_never_exceed_target(speech):
+    loud = speech * AUDIO_DTYPE(5.0)
+    stereo = np.stack([loud, -0.5 * loud])
+    for audio in (loud, stereo):
+        output = run(GainStage(SAMPLE_RATE), audio, 2048)
+        assert output.dtype == AUDIO_DTYPE
+        assert np.abs(output).max() <= DEFAULT_TARGET + 1e-6
+
+
+def test_agc_boost_is_bounded(speech):
+    quiet = speech * AUDIO_DTYPE(0.01)
+    output = run(GainStage(SAMPLE_RATE, max_gain_db=12.0), quiet, 2048)
+    latency = 80
+    ratio = np.abs(output[latency:]).max() / np.abs(quiet[:-latency]).max()
+    assert 2.0 < ratio <= 10 ** (12 / 20) + 1e-3
+
+
+@pytest.mark.parametrize('chunk_size', [100, 1000, 4096])
+def test_output_does_not_depend_on_chunk_size(speech, chunk_size):
+    audio = speech * AUDIO_DTYPE(3.0)
+    reference = run(GainStage(SAMPLE_RATE), audio, len(audio))
+    np.testing.assert_allclose(run(GainStage(SAMPLE_RATE), audio, chunk_size), reference, atol=1e-5)
+
+
+def test_held_agc_keeps_its_gain(speech):
+    stage = GainStage(SAMPLE_RATE)
+    run(stage, speech * AUDIO_DTYPE(0.1), 2048)
+    envelope, ramp = stage._envelope, stage._ramp
+    run(stage, speech, 2048, hold_agc=True)
+    assert stage._envelope == envelope
+    assert stage._ramp[0] == stage._ramp[1] == ramp[1]
+
+
+def test_uploads_are_peak_normalized(speech):
+    output = apply_output_gain(speech.copy(), ProcessingState(SAMPLE_RATE), SAMPLE_RATE)
+    assert np.abs(output).max() == pytest.approx(DEFAULT_TARGET)
+    streaming = ProcessingState(SAMPLE_RATE, streaming=True)
+    apply_output_gain(speech, streaming, SAMPLE_RATE, {'gain_lookahead_ms': 10.0})
+    assert streaming.gain_stage.latency == 160
@@ -0,0 +1,10 @@
+import pytest
+
+import golden
+
+
+@pytest.mark.skipif(not (golden.GOLDEN_DIR / 'reference.npz').exists(), reason='no golden references')
+def test_outputs_match_golden_references():
+    results = golden.check([])
+    failures = {name: result['failures'] for name, result in results.items() if result['failures']}
+    assert not failures
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from dtype_policy import AUDIO_DTYPE
+from live_pipeline import LivePipeline, PipelineStage
+from processing_state import ProcessingState
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 512
+
+
+def halve(audio, settings, state, meta):
+    meta['halved'] = True
+    return audio * AUDIO_DTYPE(0.5)
+
+
+def add_offset(audio, settings, state, meta):
+    # Only chunks the first stage marked get the offset
+    return audio + AUDIO_DTYPE(settings['offset'] if meta.get('halved') else 100.0)
+
+
+def test_pipeline_runs_stages_in_worker_processes_in_order():
+    pipeline = LivePipeline([PipelineStage('halve', halve), PipelineStage('offset', add_offset)],
+                            SAMPLE_RATE, CHUNK_SIZE, slots=2)
+    chunks = [np.full(CHUNK_SIZE, index, dtype=AUDIO_DTYPE) for index in range(6)]
+    pipeline.start({'offset': 1.0})
+    try:
+        outputs = []
+        for index, chunk in enumerate(chunks):
+            # Settings changes reach the stages with the next chunk
+            pipeline.submit(chunk, {'offset': 1.0} if index < 3 else {'offset': 2.0})
+            if pipeline.in_flight == 2:
+                outputs.append(pipeline.receive())
+        while pipeline.in_flight:
+            outputs.append(pipeline.receive())
+        stats = pipeline.get_stats()
+    finally:
+        pipeline.close()
+
+    expected = [chunk * 0.5 + (1.0 if index < 3 else 2.0) for index, chunk in enumerate(chunks)]
+    for output, chunk in zip(outputs, expected):
+        np.testing.assert_array_equal(output, chunk)
+    assert stats['chunks'] == len(chunks)
+    assert [stage['name'] for stage in stats['stages']] == ['halve', 'offset']
+
+
+@pytest.mark.parametrize('noise_reduction', [False, True])
+def test_pipelined_stages_match_the_serial_chain(server_module, speech, noise_reduction):
+    server = server_module
+    settings = server.AdvancedAudioProcessingSettings(
+        noise_reduction_enabled=noise_reduction, voice_change_enabled=True, voice_effect='robotic')
+    # Quiet room tone around the speech, so some chunks take the silence fast path
+    room = np.random.default_rng(0).standard_normal(SAMPLE_RATE).astype(AUDIO_DTYPE) * AUDIO_DTYPE(1e-3)
+    audio = np.concatenate([room, speech, room])
+    chunk_size = 2048
+    serial = ProcessingState(SAMPLE_RATE, streaming=True, chunk_size=chunk_size)
+    stages = [ProcessingState(SAMPLE_RATE, streaming=True, chunk_size=chunk_size) for _ in range(2)]
+    for start in range(0, len(audio), chunk_size):
+        chunk = audio[start:start + chunk_size]
+        expected = server.process_audio_with_enhanced_effects(chunk, settings, serial, sample_rate=SAMPLE_RATE)
+        meta = {}
+        denoised = server.process_live_stage(chunk, settings, stages[0], meta, stage='noise_reduction')
+        output = server.process_live_stage(denoised, settings, stages[1], meta, stage='effects')
+        assert meta['speech'] == serial.vad.speech
+        np.testing.assert_allclose(output, expected, atol=1e-6)
+    stats = serial.vad.get_stats()
+    assert stats['bypassed_chunks'] > 0 and stats['full_chunks'] > 0
+    # Only the first stage runs the VAD; the effects stage follows its decisions
+    assert stages[1].vad is None
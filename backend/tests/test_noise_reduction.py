@@ -0,0 +1,37 @@
+import noisereduce as nr
+import numpy as np
+import pytest
+
+import noise_reduction
+from noise_reduction import NoiseReductionEngine, NoisereduceEngine
+
+SAMPLE_RATE = 16000
+
+
+def short_chunk_engine():
+    """An engine that splits the two-second test buffer into several noisereduce chunks"""
+    engine = NoisereduceEngine(SAMPLE_RATE)
+    engine.chunk_size, engine.padding = 12000, 3000
+    return engine
+
+
+def test_base_engine_is_abstract():
+    with pytest.raises(TypeError):
+        NoiseReductionEngine(SAMPLE_RATE)
+
+
+def test_chunk_loop_matches_noisereduce(speech):
+    expected = nr.reduce_noise(y=speech, sr=SAMPLE_RATE, stationary=False, chunk_size=12000, padding=3000)
+    np.testing.assert_allclose(short_chunk_engine().process(speech), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('internals', ['missing', 'changed'])
+def test_falls_back_to_the_public_call(speech, monkeypatch, internals):
+    if internals == 'missing':
+        monkeypatch.setattr(noise_reduction, 'SpectralGateNonStationary', None)
+    else:
+        def changed_gate(**kwargs):
+            raise TypeError("unexpected keyword argument 'use_tqdm'")
+        monkeypatch.setattr(noise_reduction, 'SpectralGateNonStationary', changed_gate)
+    expected = nr.reduce_noise(y=speech, sr=SAMPLE_RATE, stationary=False, chunk_size=12000, padding=3000)
+    np.testing.assert_allclose(short_chunk_engine().process(speech), expected, atol=1e-6)
@@ -0,0 +1,48 @@
+import pytest
+
+from oscillator import OscillatorBank
+
+SAMPLE_RATE = 16000
+
+
+def run_alien_bank(bank, num_samples, block=4096):
+    """Generate the alien LFO and FM carrier as the effect does, block by block"""
+    for start in range(0, num_samples, block):
+        length = min(block, num_samples - start)
+        lfo = bank.get('alien_lfo', 0.5).generate(length)
+        bank.get_fm('alien_carrier', 8, 'alien_lfo', 3).generate_fm(8 + 3 * lfo)
+
+
+def wrapped(difference):
+    return abs((difference + 0.5) % 1.0 - 0.5)
+
+
+@pytest.mark.parametrize('seconds', [0.7, 29.0, 61.3])
+def test_fm_carrier_starts_at_the_integrated_phase(seconds):
+    start_sample = int(seconds * SAMPLE_RATE)
+    generated = OscillatorBank(SAMPLE_RATE)
+    run_alien_bank(generated, start_sample)
+    segment = OscillatorBank(SAMPLE_RATE, start_sample)
+    segment.get('alien_lfo', 0.5)
+    carrier = segment.get_fm('alien_carrier', 8, 'alien_lfo', 3)
+    # Phases in cycles; the sum over samples differs from the integral by under 1e-3
+    assert wrapped(carrier.phase - generated.oscillators['alien_carrier'].phase) < 1e-3
+    assert wrapped(segment.oscillators['alien_lfo'].phase - generated.oscillators['alien_lfo'].phase) < 1e-9
+
+
+def test_advance_follows_the_fm_sweep():
+    generated, advanced = OscillatorBank(SAMPLE_RATE), OscillatorBank(SAMPLE_RATE)
+    run_alien_bank(generated, 12345)
+    run_alien_bank(advanced, 2345)
+    advanced.advance(10000)
+    for name in ('alien_lfo', 'alien_carrier'):
+        assert wrapped(advanced.oscillators[name].phase - generated.oscillators[name].phase) < 1e-3
+
+
+def test_reset_returns_to_the_start_phase():
+    bank = OscillatorBank(SAMPLE_RATE, start_sample=29 * SAMPLE_RATE)
+    bank.get('alien_lfo', 0.5)
+    start = bank.get_fm('alien_carrier', 8, 'alien_lfo', 3).phase
+    run_alien_bank(bank, 5000)
+    bank.reset()
+    assert bank.oscillators['alien_carrier'].phase == pytest.approx(start)
@@ -0,0 +1,130 @@
+import asyncio
+
+from outbound import OutboundQueue
+
+
+class FakeWebSocket:
+    """Records sent messages; `gate` blocks sends until it is set"""
+
+    def __init__(self, fail: bool = False):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.fail = fail
+
+    async def send_text(self, message):
+        await self.gate.wait()
+        if self.fail:
+            raise RuntimeError('connection closed')
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.send_text(message)
+
+
+async def drain(queue):
+    for _ in range(100):
+        if not queue.messages:
+            break
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+def test_messages_are_sent_in_order():
+    async def scenario():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, max_messages=8)
+        queue.start()
+        for message in ('a', b'b', 'c'):
+            assert queue.put_nowait(message)
+        await drain(queue)
+        queue.close()
+        return websocket.sent, queue.to_dict()
+
+    sent, stats = asyncio.run(scenario())
+    assert sent == ['a', b'b', 'c']
+    assert (stats['sent'], stats['queued'], stats['dropped']) == (3, 0, 0)
+
+
+def test_full_queue_drops_oldest_then_reports_a_slow_consumer():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()  # a stalled client
+        queue = OutboundQueue(websocket, max_messages=2, full_timeout=0.05)
+        queue.start()
+        results = [queue.put_nowait(str(index), droppable=True) for index in range(4)]
+        dropped = queue.dropped
+        # The writer takes '2' and blocks on the send; refill the queue past full
+        await asyncio.sleep(0)
+        results += [queue.put_nowait('4', droppable=True), queue.put_nowait('5', droppable=True)]
+        await asyncio.sleep(0.06)
+        results.append(queue.put_nowait('late', droppable=True))
+        remaining = [message for message, _ in queue.messages]
+        queue.close()
+        return results, dropped, remaining
+
+    results, dropped, remaining = asyncio.run(scenario())
+    assert results == [True] * 6 + [False]
+    assert dropped == 2
+    assert remaining == ['4', '5']
+
+
+def test_control_messages_are_never_dropped():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        queue = OutboundQueue(websocket, max_messages=3)
+        queue.start()
+        await asyncio.sleep(0)
+        queue.put_nowait('status')
+        for index in range(4):
+            queue.put_nowait(b'frame%d' % index, droppable=True)
+        # Control messages push out frames, then queue past the limit once none are left
+        for message in ('stats', 'error', 'done'):
+            queue.put_nowait(message)
+        queued = len(queue.messages)
+        websocket.gate.set()
+        await drain(queue)
+        queue.close()
+        return websocket.sent, queue.dropped, queued
+
+    sent, dropped, queued = asyncio.run(scenario())
+    assert sent == ['status', 'stats', 'error', 'done']
+    assert (dropped, queued) == (4, 4)
+
+
+def test_draining_to_half_resets_the_full_timer():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        queue = OutboundQueue(websocket, max_messages=2, full_timeout=0.05)
+        queue.start()
+        await asyncio.sleep(0)
+        for index in range(4):
+            queue.put_nowait(str(index), droppable=True)
+        assert queue.full_since is not None
+        websocket.gate.set()
+        await drain(queue)
+        full_since = queue.full_since
+        await asyncio.sleep(0.06)
+        accepted = queue.put_nowait('after')
+        await drain(queue)
+        queue.close()
+        return full_since, accepted, websocket.sent
+
+    full_since, accepted, sent = asyncio.run(scenario())
+    assert full_since is None
+    assert accepted
+    assert sent == ['2', '3', 'after']
+
+
+def test_failed_send_closes_the_queue():
+    async def scenario():
+        queue = OutboundQueue(FakeWebSocket(fail=True))
+        queue.start()
+        queue.put_nowait('a')
+        await drain(queue)
+        # Messages to a closed queue are accepted and discarded
+        return queue.closed, queue.put_nowait('b'), len(queue.messages)
+
+    assert asyncio.run(scenario()) == (True, True, 0)
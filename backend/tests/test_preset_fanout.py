@@ -0,0 +1,62 @@
+import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from preset_fanout import _render, render_presets, share_analysis
+from segmented import get_worker_context
+from world_vocoder import PYWORLD_AVAILABLE, WorldAnalysis, analyze
+
+SAMPLE_RATE = 16000
+
+
+def test_shared_analysis_round_trip():
+    rng = np.random.default_rng(0)
+    channels = [(rng.random(40), rng.random((40, 257)), rng.random((40, 257))) for _ in range(2)]
+    analysis = WorldAnalysis(SAMPLE_RATE, 3200, channels, mono=False)
+    shm, layout = share_analysis(analysis)
+    try:
+        loaded = layout.load()
+    finally:
+        shm.close()
+        shm.unlink()
+    assert (loaded.sample_rate, loaded.length, loaded.mono) == (SAMPLE_RATE, 3200, False)
+    for expected, actual in zip(analysis.channels, loaded.channels):
+        for expected_array, actual_array in zip(expected, actual):
+            np.testing.assert_array_equal(actual_array, expected_array)
+
+
+@pytest.mark.skipif(not PYWORLD_AVAILABLE, reason='pyworld is not installed')
+def test_worker_renders_match_inline_renders(speech):
+    audio = speech[:SAMPLE_RATE]
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    process_fn = partial(processor.process_audio_chunk)
+    presets = {name: {'noise_reduction_enabled': False, 'voice_change_enabled': True, 'voice_effect': name,
+                      'pitch_engine': 'world'}
+               for name in ('female', 'old_man')}
+    analysis = analyze(audio, SAMPLE_RATE)
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_worker_context()) as executor:
+        rendered = render_presets(audio, SAMPLE_RATE, presets, process_fn, analysis, executor)
+    for name, settings in presets.items():
+        np.testing.assert_array_equal(rendered[name], _render(audio, SAMPLE_RATE, process_fn, settings, analysis))
+
+
+def test_tracks_match_separate_renders(server_module, speech):
+    server = server_module
+    buffer = io.BytesIO()
+    sf.write(buffer, speech, SAMPLE_RATE, format='WAV', subtype='FLOAT')
+    session = server.UploadSession(buffer.getvalue(), 'speech.wav', 'audio/wav')
+    settings = server.AdvancedAudioProcessingSettings(noise_reduction_enabled=True)
+    presets = ['none', 'female', 'robotic', 'horror']
+    rendered, sample_rate, _ = server.render_preset_set(session, settings, presets)
+
+    decoded, _ = server.decode_upload(session.contents, session.filename, session.content_type, settings)
+    for name in presets:
+        separate = server.process_upload_audio(decoded, server.AdvancedAudioProcessingSettings(
+            noise_reduction_enabled=True, voice_change_enabled=name != 'none', voice_effect=name), sample_rate)
+        # The 'none' track is normalized once more than a separate run
+        np.testing.assert_allclose(rendered[name], separate, rtol=0, atol=1e-7 if name == 'none' else 0)
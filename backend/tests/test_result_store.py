@@ -0,0 +1,39 @@
+import pytest
+
+from result_store import iter_file_range, parse_byte_range
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-9', (0, 9)),
+    ('bytes=10-', (10, 99)),
+    ('bytes=90-200', (90, 99)),
+    ('bytes=-10', (90, 99)),
+    ('bytes=-500', (0, 99)),
+    (' bytes=5-5 ', (5, 5)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert parse_byte_range(header, 100) == expected
+
+
+@pytest.mark.parametrize('header', [
+    None, '', 'bytes=-', 'items=0-9', 'bytes=0-9,20-29', 'bytes=abc',
+    # last-pos before first-pos is an invalid range-spec: send the whole file
+    'bytes=9-5',
+])
+def test_ignored_headers_send_the_whole_file(header):
+    assert parse_byte_range(header, 100) is None
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=100-', 100), ('bytes=100-150', 100), ('bytes=-0', 100), ('bytes=-10', 0),
+])
+def test_unsatisfiable_ranges(header, size):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, size)
+
+
+def test_iter_file_range_reads_inclusive_end(tmp_path):
+    path = tmp_path / 'result.wav'
+    path.write_bytes(bytes(range(256)) * 1024)
+    data = b''.join(iter_file_range(path, 10, 100_000))
+    assert data == path.read_bytes()[10:100_001]
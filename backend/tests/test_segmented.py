@@ -0,0 +1,111 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import world_vocoder
+from dtype_policy import AUDIO_DTYPE
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from processing_state import ProcessingState
+from resampling import to_mono
+from segmented import (SEGMENT_ALIGN, _init_worker, crossfade_weights, get_worker_context, plan_segments,
+                       process_segmented)
+from vad import blockwise_frame_energy, frame_energy, frame_signal
+from world_vocoder import WorldAnalysis, WorldAnalysisCache
+
+SAMPLE_RATE = 16000
+
+
+def test_plan_covers_the_buffer_with_overlapping_segments():
+    length = 95 * SAMPLE_RATE
+    plan = plan_segments(length, SAMPLE_RATE)
+    assert len(plan) == 3
+    assert plan[0][0] == 0 and plan[-1][1] == length
+    for (_, keep_end, _, _), (next_start, _, _, _) in zip(plan, plan[1:]):
+        assert keep_end - next_start == int(0.25 * SAMPLE_RATE)
+    for keep_start, keep_end, process_start, process_end in plan:
+        assert process_start <= keep_start < keep_end <= process_end <= length
+        assert process_start % SEGMENT_ALIGN == 0
+
+
+def test_crossfade_weights_sum_to_one_in_the_overlap():
+    fade_out = crossfade_weights(1000, 100, fade_in=False, fade_out=True)
+    fade_in = crossfade_weights(1000, 100, fade_in=True, fade_out=False)
+    np.testing.assert_allclose(fade_out[-100:] + fade_in[:100], 1.0, atol=1e-6)
+    assert fade_out[0] == fade_in[-1] == 1.0
+
+
+@pytest.mark.parametrize('shape', [(50_000,), (2, 50_000)])
+def test_blockwise_energy_matches_whole_buffer(shape):
+    audio = np.random.default_rng(0).standard_normal(shape).astype(AUDIO_DTYPE)
+    expected = frame_energy(frame_signal(to_mono(audio)))
+    np.testing.assert_array_equal(blockwise_frame_energy(audio, block_frames=7), expected)
+
+
+def test_segments_run_in_forkserver_workers(speech):
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    settings = SimpleNamespace(noise_reduction_enabled=False, noise_reduction_engine='noisereduce',
+                               echo_enabled=False)
+    process_fn = partial(processor.process_audio_chunk,
+                         settings={'noise_reduction_enabled': False, 'voice_change_enabled': True,
+                                   'voice_effect': 'robotic', 'normalize': False})
+    audio = np.tile(speech, 3)
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_worker_context()) as executor:
+        stitched = process_segmented(audio, SAMPLE_RATE, settings, process_fn, executor)
+    assert stitched.dtype == AUDIO_DTYPE and stitched.shape == audio.shape
+    assert np.abs(stitched).max() > 0
+
+
+@pytest.mark.parametrize('effect', ['robotic', 'alien'])
+def test_stitched_modulation_matches_one_piece(speech, effect):
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    settings = SimpleNamespace(noise_reduction_enabled=False, noise_reduction_engine='noisereduce',
+                               echo_enabled=False)
+    process_fn = partial(processor.process_audio_chunk,
+                         settings={'noise_reduction_enabled': False, 'voice_change_enabled': True,
+                                   'voice_effect': effect, 'normalize': False})
+    audio = np.tile(speech, 38)  # 76 s: three segments, the seams well into the alien LFO's sweep
+    whole = process_fn(audio, state=ProcessingState(SAMPLE_RATE))
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_worker_context()) as executor:
+        stitched = process_segmented(audio, SAMPLE_RATE, settings, process_fn, executor)
+    np.testing.assert_allclose(stitched, whole, atol=5e-4)
+
+
+def reuse_world_analysis(segment, state):
+    """Stands in for the WORLD stage: ones where the cache had the analysis, zeros where it was made"""
+    cache = state.analysis_cache
+    if cache.get(segment, SAMPLE_RATE) is not None:
+        return np.ones_like(segment)
+    channel = (np.zeros(1), np.zeros((1, 3)), np.zeros((1, 3)))
+    cache.put(segment, SAMPLE_RATE, WorldAnalysis(SAMPLE_RATE, 80, [channel], mono=True))
+    return np.zeros_like(segment)
+
+
+def test_session_renders_reuse_segment_analyses(speech):
+    settings = SimpleNamespace(noise_reduction_enabled=False, noise_reduction_engine='noisereduce',
+                               echo_enabled=False)
+    audio = np.tile(speech, 23)  # 46 s: two segments
+    cache = WorldAnalysisCache(max_entries=16)
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_worker_context()) as executor:
+        first = process_segmented(audio, SAMPLE_RATE, settings, reuse_world_analysis, executor,
+                                  analysis_cache=cache)
+        assert cache.misses == 2 and cache.nbytes > 0
+        second = process_segmented(audio, SAMPLE_RATE, settings, reuse_world_analysis, executor,
+                                   analysis_cache=cache)
+    np.testing.assert_array_equal(first, 0)
+    np.testing.assert_allclose(second, 1.0, atol=1e-6)
+    assert cache.hits == 2
+
+
+def cache_bounds():
+    cache = world_vocoder.analysis_cache
+    return cache.max_entries, cache.max_bytes
+
+
+def test_pool_workers_keep_no_process_wide_analyses():
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_worker_context(),
+                             initializer=_init_worker) as executor:
+        assert executor.submit(cache_bounds).result() == (0, 0)
+    assert cache_bounds() == (world_vocoder.WORLD_CACHE_SIZE, world_vocoder.WORLD_CACHE_MAX_BYTES)
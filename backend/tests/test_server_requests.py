@@ -0,0 +1,57 @@
+import asyncio
+import functools
+import io
+import time
+
+import pytest
+import soundfile as sf
+from fastapi.testclient import TestClient
+
+from cancellation import check_cancelled, run_cancellable
+
+SAMPLE_RATE = 16000
+
+
+def wav_bytes(audio):
+    buffer = io.BytesIO()
+    sf.write(buffer, audio, SAMPLE_RATE, format='WAV')
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('format', ['json', 'wav'])
+def test_upload_timeout_answers_504(server_module, speech, monkeypatch, format):
+    server = server_module
+
+    def stalled_render(*args):
+        while True:
+            check_cancelled()
+            time.sleep(0.01)
+
+    monkeypatch.setattr(server, 'render_upload', stalled_render)
+    monkeypatch.setattr(server, 'run_cancellable', functools.partial(run_cancellable, timeout=0.1))
+    response = TestClient(server.app).post(
+        '/api/process-audio-enhanced', params={'format': format},
+        files={'file': ('speech.wav', wav_bytes(speech), 'audio/wav')})
+    assert response.status_code == 504
+    assert response.json() == {'detail': 'Processing timed out'}
+
+
+def test_binary_results_are_stored_off_the_event_loop(server_module, speech, monkeypatch):
+    server = server_module
+    stored_on_loop = []
+    respond = server.binary_result_response
+
+    def recording_response(*args):
+        try:
+            asyncio.get_running_loop()
+            stored_on_loop.append(True)
+        except RuntimeError:
+            stored_on_loop.append(False)
+        return respond(*args)
+
+    monkeypatch.setattr(server, 'binary_result_response', recording_response)
+    response = TestClient(server.app).post(
+        '/api/process-audio-enhanced', params={'format': 'wav'},
+        files={'file': ('speech.wav', wav_bytes(speech[:SAMPLE_RATE // 2]), 'audio/wav')})
+    assert response.status_code == 200
+    assert stored_on_loop == [False]
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import types
+import uuid
+
+import pytest
+
+from shared_state import EVENTS_RESUME_WINDOW, InMemoryStateBackend, MongoStateBackend
+
+MONGO_TEST_URL = os.environ.get('MONGO_TEST_URL')
+
+
+def collect(backend, channel):
+    received = []
+
+    async def callback(message):
+        received.append(message)
+
+    backend.subscribe(channel, callback)
+    return received
+
+
+def test_in_memory_publish_reaches_every_subscriber():
+    backend = InMemoryStateBackend()
+    first, second = collect(backend, 'status'), collect(backend, 'status')
+    other = collect(backend, 'presets')
+    asyncio.run(backend.publish('status', {'active': True}))
+    assert first == second == [{'active': True}]
+    assert other == []
+
+
+def test_in_memory_values_are_copies():
+    backend = InMemoryStateBackend()
+
+    async def scenario():
+        value = {'name': 'deep'}
+        await backend.set('preset:1', value)
+        value['name'] = 'changed'
+        await backend.set('other', {'name': 'other'})
+        stored = await backend.get('preset:1')
+        stored['name'] = 'changed too'
+        return await backend.get('preset:1'), await backend.get_all('preset:')
+
+    stored, presets = asyncio.run(scenario())
+    assert stored == {'name': 'deep'}
+    assert presets == {'preset:1': {'name': 'deep'}}
+
+
+def offline_mongo_backend():
+    db = types.SimpleNamespace(shared_state=None, shared_events=None, shared_counters=None)
+    return MongoStateBackend(db)
+
+
+def test_mongo_resume_query_rereads_window_and_skips_seen_events():
+    backend = offline_mongo_backend()
+    received = collect(backend, 'status')
+    assert backend._resume_query() == {}
+
+    async def receive(*seqs, node_id='other'):
+        for seq in seqs:
+            await backend._receive({'seq': seq, 'channel': 'status', 'message': {'seq': seq},
+                                    'node_id': node_id})
+
+    # A cursor that died after 100 reopens before it, by sequence number
+    asyncio.run(receive(99, 100))
+    assert backend._resume_query() == {'seq': {'$gt': 100 - EVENTS_RESUME_WINDOW}}
+
+    # The reopened cursor returns 99 and 100 again plus 98, inserted late by a slower publisher
+    asyncio.run(receive(98, 99, 100, 101))
+    asyncio.run(receive(102, node_id=backend.node_id))
+    assert [message['seq'] for message in received] == [99, 100, 98, 101]
+    assert backend._last_seq == 102
+
+
+@pytest.mark.skipif(not MONGO_TEST_URL, reason='MONGO_TEST_URL is not set')
+def test_mongo_backends_deliver_each_others_events():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(MONGO_TEST_URL)
+        db = client[f'shared_state_test_{uuid.uuid4().hex[:8]}']
+        first, second = MongoStateBackend(db), MongoStateBackend(db)
+        first_received, second_received = collect(first, 'status'), collect(second, 'status')
+        try:
+            await first.start()
+            await second.start()
+            await second.publish('status', {'from': 'second'})
+            await first.publish('status', {'from': 'first'})
+            for _ in range(50):
+                if len(first_received) == 2 and len(second_received) == 2:
+                    break
+                await asyncio.sleep(0.1)
+            await first.set('preset:1', {'name': 'deep'})
+            value = await second.get('preset:1')
+        finally:
+            await first.stop()
+            await second.stop()
+            await client.drop_database(db.name)
+            client.close()
+        return first_received, second_received, value
+
+    first_received, second_received, value = asyncio.run(scenario())
+    # Own events arrive at once, the other worker's through the tail cursor
+    for received in (first_received, second_received):
+        assert sorted(message['from'] for message in received) == ['first', 'second']
+    assert value == {'name': 'deep'}
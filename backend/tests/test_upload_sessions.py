@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+
+from upload_sessions import MAX_STAGE_RESULTS, UploadSession, UploadSessionStore
+from world_vocoder import WorldAnalysis
+
+SAMPLE_RATE = 16000
+
+
+def tiny_analysis():
+    channel = (np.zeros(1), np.zeros((1, 3)), np.zeros((1, 3)))
+    return WorldAnalysis(SAMPLE_RATE, 80, [channel], mono=True)
+
+
+def test_session_bytes_follow_stage_eviction():
+    session = UploadSession(b'x' * 100, 'speech.wav', 'audio/wav')
+    for index in range(MAX_STAGE_RESULTS + 2):
+        session.stage(('decode', index), lambda: (np.zeros(1000, dtype=np.float32), SAMPLE_RATE))
+    assert session.nbytes == 100 + MAX_STAGE_RESULTS * 4000
+    reused = []
+    session.stage(('decode', MAX_STAGE_RESULTS + 1), lambda: None, reused)
+    assert reused == ['decode']
+    assert session.info()['cached_stages'] == ['decode'] * MAX_STAGE_RESULTS
+
+
+def test_store_can_be_read_while_sessions_render():
+    store = UploadSessionStore(max_bytes=10 ** 9)
+    sessions = [store.add(UploadSession(b'', None, None)) for _ in range(4)]
+    stop = threading.Event()
+
+    def render(session):
+        index = 0
+        while not stop.is_set():
+            session.stage(('noise_reduction', index % 50), lambda: np.zeros(10))
+            session.analyses.put(np.full(10, index % 50, dtype=np.float32), SAMPLE_RATE, tiny_analysis())
+            index += 1
+
+    threads = [threading.Thread(target=render, args=(session,)) for session in sessions]
+    for thread in threads:
+        thread.start()
+    try:
+        # Each read used to iterate the dicts the render threads were changing
+        for _ in range(2000):
+            store.enforce_limits()
+            assert store.get(sessions[0].id) is sessions[0]
+            assert sessions[1].info()['cached_bytes'] >= 0
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from dtype_policy import AUDIO_DTYPE
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from vad import HOP_LENGTH, StreamingVAD
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 2048
+
+
+def noise(seconds, level, seed):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * level).astype(AUDIO_DTYPE)
+
+
+def tone(seconds, level):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 220 * t) * level).astype(AUDIO_DTYPE)
+
+
+def decisions(vad, audio, chunk_size=CHUNK_SIZE):
+    return [vad.is_speech(audio[i:i + chunk_size]) for i in range(0, len(audio), chunk_size)]
+
+
+def test_noise_alone_is_not_speech():
+    assert not any(decisions(StreamingVAD(SAMPLE_RATE), noise(2.0, 0.01, seed=0)))
+
+
+def test_speech_onset_and_hangover():
+    vad = StreamingVAD(SAMPLE_RATE, hangover_ms=400.0)
+    room = noise(3.0, 0.01, seed=0)
+    audio = room.copy()
+    audio[SAMPLE_RATE:2 * SAMPLE_RATE] += tone(1.0, 0.3)
+    speech = decisions(vad, audio)
+    chunk_seconds = np.arange(len(speech)) * CHUNK_SIZE / SAMPLE_RATE
+
+    assert not any(speech[i] for i, t in enumerate(chunk_seconds) if t < 0.8)
+    assert all(speech[i] for i, t in enumerate(chunk_seconds) if 1.0 <= t < 2.0)
+    # Speech holds for the hangover after the tone ends, then stops
+    assert all(speech[i] for i, t in enumerate(chunk_seconds) if 2.0 <= t < 2.2)
+    assert not any(speech[i] for i, t in enumerate(chunk_seconds) if t >= 2.6)
+
+
+@pytest.mark.parametrize('chunk_size', [HOP_LENGTH // 2, 1000, 4096])
+def test_decisions_do_not_depend_on_chunk_size(chunk_size):
+    audio = noise(3.0, 0.01, seed=2)
+    audio[SAMPLE_RATE:2 * SAMPLE_RATE] += tone(1.0, 0.3)
+    reference, candidate = StreamingVAD(SAMPLE_RATE), StreamingVAD(SAMPLE_RATE)
+    decisions(reference, audio, chunk_size=len(audio))
+    decisions(candidate, audio, chunk_size=chunk_size)
+    # Frames run across chunk boundaries; only the floor's update points differ
+    assert candidate._since_speech == reference._since_speech
+    assert candidate.noise_floor == pytest.approx(reference.noise_floor, rel=0.2)
+
+
+def test_stats_estimate_cpu_saved():
+    vad = StreamingVAD(SAMPLE_RATE)
+    assert vad.get_stats()['cpu_seconds_saved'] is None
+    vad.record(False, 0.04)
+    vad.record(False, 0.02)
+    vad.record(True, 0.001)
+    stats = vad.get_stats()
+    assert (stats['full_chunks'], stats['bypassed_chunks']) == (2, 1)
+    assert stats['cpu_seconds_saved'] == pytest.approx(0.029)
+
+
+def test_speech_enhancement_gain_ramps_between_frames():
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    audio = np.ones(SAMPLE_RATE, dtype=AUDIO_DTYPE)
+    # Bright speech in the second half only
+    audio[SAMPLE_RATE // 2:] += noise(0.5, 1.0, seed=3)
+    gains = processor._enhance_speech_segments(audio, energy_threshold=0.0) / audio
+    assert gains.min() == pytest.approx(1.0) and gains.max() == pytest.approx(1.1)
+    # No sample-to-sample step larger than one frame-to-frame ramp allows
+    assert np.abs(np.diff(gains)).max() <= 0.1 / HOP_LENGTH + 1e-6
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from dtype_policy import AUDIO_DTYPE
+from enhanced_voice_processor import AdvancedVoiceProcessor
+from processing_state import ProcessingState
+from world_vocoder import PYWORLD_AVAILABLE, WorldAnalysis, WorldAnalysisCache
+
+SAMPLE_RATE = 16000
+
+
+def fake_analysis(frames, bins=257):
+    """A WorldAnalysis of the given size without running pyworld"""
+    channel = (np.zeros(frames), np.zeros((frames, bins)), np.zeros((frames, bins)))
+    return WorldAnalysis(SAMPLE_RATE, frames * 80, [channel], mono=True)
+
+
+def test_cache_key_depends_on_content_shape_and_rate(speech):
+    key = WorldAnalysisCache.key(speech, SAMPLE_RATE)
+    assert WorldAnalysisCache.key(speech.copy(), SAMPLE_RATE) == key
+    assert WorldAnalysisCache.key(speech, 22050) != key
+    assert WorldAnalysisCache.key(speech.reshape(2, -1), SAMPLE_RATE) != key
+    changed = speech.copy()
+    changed[0] += 1
+    assert WorldAnalysisCache.key(changed, SAMPLE_RATE) != key
+
+
+def test_cache_evicts_least_recently_used_by_count():
+    cache = WorldAnalysisCache(max_entries=2)
+    inputs = [np.full(100, value, dtype=AUDIO_DTYPE) for value in range(3)]
+    analyses = [fake_analysis(10) for _ in inputs]
+    cache.put(inputs[0], SAMPLE_RATE, analyses[0])
+    cache.put(inputs[1], SAMPLE_RATE, analyses[1])
+    assert cache.get_or_analyze(inputs[0], SAMPLE_RATE) is analyses[0]
+    cache.put(inputs[2], SAMPLE_RATE, analyses[2])
+    assert cache.get_or_analyze(inputs[0], SAMPLE_RATE) is analyses[0]
+    assert cache.get_or_analyze(inputs[2], SAMPLE_RATE) is analyses[2]
+    assert cache.hits == 3 and cache.misses == 0
+    assert len(cache._entries) == 2 and WorldAnalysisCache.key(inputs[1], SAMPLE_RATE) not in cache._entries
+
+
+def test_cache_is_bounded_by_bytes():
+    entry_bytes = fake_analysis(10).nbytes
+    cache = WorldAnalysisCache(max_entries=8, max_bytes=2 * entry_bytes)
+    for value in range(3):
+        cache.put(np.full(100, value, dtype=AUDIO_DTYPE), SAMPLE_RATE, fake_analysis(10))
+    assert cache.nbytes == 2 * entry_bytes
+    # Larger than the whole bound: returned by the caller but never cached
+    cache.put(np.full(100, 9, dtype=AUDIO_DTYPE), SAMPLE_RATE, fake_analysis(40))
+    assert cache.nbytes == 2 * entry_bytes
+    # Storing a key again replaces its entry instead of counting it twice
+    cache.put(np.full(100, 2, dtype=AUDIO_DTYPE), SAMPLE_RATE, fake_analysis(10))
+    assert cache.nbytes == 2 * entry_bytes
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+@pytest.mark.skipif(not PYWORLD_AVAILABLE, reason='pyworld is not installed')
+def test_cache_analyses_once(speech):
+    cache = WorldAnalysisCache()
+    first = cache.get_or_analyze(speech[:8000], SAMPLE_RATE)
+    assert cache.get_or_analyze(speech[:8000].copy(), SAMPLE_RATE) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_streaming_sessions_ignore_the_world_engine(speech):
+    processor = AdvancedVoiceProcessor(SAMPLE_RATE)
+    chunk = speech[:4096]
+    outputs = {}
+    for engine in ('librosa', 'world'):
+        state = ProcessingState(SAMPLE_RATE, streaming=True, chunk_size=4096)
+        outputs[engine] = np.array(processor.apply_voice_effect(chunk, 'female', state=state,
+                                                                pitch_engine=engine))
+    np.testing.assert_array_equal(outputs['world'], outputs['librosa'])
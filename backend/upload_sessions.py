@@ -0,0 +1,148 @@
+"""
+Upload Sessions Module
+Cached decode and intermediate stages of an uploaded file for fast re-rendering
+
+A session keeps the uploaded bytes and the results of the upstream stages
+(decoded PCM, denoised intermediate) keyed by the settings each stage
+depends on, plus its own WORLD analysis cache. A re-render with new settings
+recomputes only the stages whose key changed. Sessions live in a store
+bounded by count, total bytes and an idle TTL.
+"""
+
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from world_vocoder import WorldAnalysisCache
+
+UPLOAD_SESSION_TTL = float(os.environ.get('UPLOAD_SESSION_TTL', 30 * 60))  # seconds since last use
+UPLOAD_SESSION_MAX = int(os.environ.get('UPLOAD_SESSION_MAX', 32))
+UPLOAD_SESSION_MAX_BYTES = int(os.environ.get('UPLOAD_SESSION_MAX_BYTES', 1024 * 1024 * 1024))
+MAX_STAGE_RESULTS = 6  # stage results kept per session, least recently used dropped first
+MAX_SESSION_ANALYSES = 16  # WORLD analyses kept per session; long uploads keep one per segment
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class UploadSession:
+    """One uploaded file and its cached stage results"""
+
+    def __init__(self, contents: bytes, filename: Optional[str], content_type: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.contents = contents
+        self.filename = filename
+        self.content_type = content_type
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.renders = 0
+        self.analyses = WorldAnalysisCache(max_entries=MAX_SESSION_ANALYSES)
+        self._stages: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._stage_bytes = 0
+        # Renders of one session run one at a time, so a stage is never computed twice
+        self.lock = threading.Lock()
+        # Guards _stages itself; held only briefly, so the event loop can read a session mid-render
+        self._stages_lock = threading.Lock()
+
+    def stage(self, key: Hashable, compute: Callable[[], Any], reused: Optional[List[str]] = None) -> Any:
+        """Result of the stage identified by `key`, computed on first use
+
+        `key` starts with the stage name, followed by every setting the stage
+        depends on. The name is appended to `reused` on a cache hit.
+        """
+        with self._stages_lock:
+            if key in self._stages:
+                self._stages.move_to_end(key)
+                if reused is not None:
+                    reused.append(key[0])
+                return self._stages[key]
+        value = compute()
+        with self._stages_lock:
+            self._stages[key] = value
+            self._stage_bytes += _nbytes(value)
+            while len(self._stages) > MAX_STAGE_RESULTS:
+                _, evicted = self._stages.popitem(last=False)
+                self._stage_bytes -= _nbytes(evicted)
+        return value
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.contents) + self._stage_bytes + self.analyses.nbytes
+
+    def expired(self, now: float, ttl: float) -> bool:
+        return now - self.last_used > ttl
+
+    def info(self, ttl: float = UPLOAD_SESSION_TTL) -> Dict:
+        with self._stages_lock:
+            cached_stages = [key[0] for key in self._stages]
+        return {
+            'session_id': self.id,
+            'filename': self.filename,
+            'renders': self.renders,
+            'cached_stages': cached_stages,
+            'cached_bytes': self.nbytes,
+            'expires_in': max(ttl - (time.monotonic() - self.last_used), 0.0),
+        }
+
+
+class UploadSessionStore:
+    """LRU of upload sessions with an idle TTL and bounds on count and total bytes"""
+
+    def __init__(self, max_sessions: int = UPLOAD_SESSION_MAX, max_bytes: int = UPLOAD_SESSION_MAX_BYTES,
+                 ttl: float = UPLOAD_SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sessions: 'OrderedDict[str, UploadSession]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session: UploadSession) -> UploadSession:
+        with self._lock:
+            self._sessions[session.id] = session
+            self._evict()
+        return session
+
+    def get(self, session_id: str) -> Optional[UploadSession]:
+        """The session, marked as used, or None if unknown or expired"""
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def enforce_limits(self):
+        """Evict after a render has grown a session's cache"""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        now = time.monotonic()
+        for session_id in [session_id for session_id, session in self._sessions.items()
+                           if session.expired(now, self.ttl)]:
+            del self._sessions[session_id]
+        # Keep the most recently used session even if it alone exceeds the byte bound
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.nbytes > self.max_bytes):
+            self._sessions.popitem(last=False)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(session.nbytes for session in self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
@@ -0,0 +1,195 @@
+"""
+Voice Activity Module
+Vectorized frame features and a streaming VAD that lets silent live chunks skip the heavy stages
+
+Between utterances a live stream is silence or room noise, yet every chunk
+went through noise reduction, pitch shifting and the vocoder. A StreamingVAD
+looks at each live chunk first. Frame energies are compared with a tracked
+noise floor. Speech starts `onset_db` above it and holds while the energy
+stays `offset_db` above it, plus a hangover. A chunk without speech takes
+`bypass_silence` instead of the chain: an attenuated passthrough or comfort
+noise. The stateful stages are kept consistent:
+
+- oscillators advance by the chunk, so modulation resumes in phase
+- noise engines take the chunk as noise (`NoiseReductionEngine.skip`)
+- the effect tail is reset, so echo and reverb end with the hangover
+- the gain stage still runs on the output, with its AGC held
+
+CPU time of full and bypassed chunks is tracked per session to estimate the
+CPU saved.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE
+from resampling import num_samples, to_mono
+from spectral import rfft_frames
+
+FRAME_LENGTH = 1024
+HOP_LENGTH = 512
+MIN_SPEECH_ENERGY = 10 ** (-60 / 10)  # frames quieter than -60 dBFS are never speech
+MIN_NOISE_FLOOR = 1e-10
+NOISE_FLOOR_RISE_DB_PER_S = 3.0  # how fast the floor follows a louder room
+ENERGY_BLOCK_FRAMES = 2048  # frames mixed down at a time by `blockwise_frame_energy`
+
+
+def frame_signal(audio: np.ndarray) -> np.ndarray:
+    """(frames, FRAME_LENGTH) view of a mono buffer, one frame per HOP_LENGTH"""
+    return np.lib.stride_tricks.sliding_window_view(audio, FRAME_LENGTH)[::HOP_LENGTH]
+
+
+def frame_energy(frames: np.ndarray) -> np.ndarray:
+    """Sum of squares per frame"""
+    return np.einsum('ij,ij->i', frames, frames, dtype=np.float64)
+
+
+def blockwise_frame_energy(audio: np.ndarray, block_frames: int = ENERGY_BLOCK_FRAMES) -> np.ndarray:
+    """Frame energies of the channel mix of a long buffer, one block of frames at a time
+
+    The same values as framing the whole mix, without mixing down the whole
+    buffer at once.
+    """
+    total_frames = max((num_samples(audio) - FRAME_LENGTH) // HOP_LENGTH + 1, 0)
+    energies = [np.zeros(0)]
+    for first in range(0, total_frames, block_frames):
+        last = min(first + block_frames, total_frames)
+        block = audio[..., first * HOP_LENGTH:(last - 1) * HOP_LENGTH + FRAME_LENGTH]
+        energies.append(frame_energy(frame_signal(to_mono(block))))
+    return np.concatenate(energies)
+
+
+def spectral_centroid(frames: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Magnitude-weighted mean frequency per Hann-windowed frame, in Hz"""
+    magnitude = np.abs(rfft_frames(frames))
+    frequencies = np.fft.rfftfreq(FRAME_LENGTH, 1.0 / sample_rate)
+    total = magnitude.sum(axis=-1)
+    return np.divide(magnitude @ frequencies, total, out=np.zeros_like(total), where=total > 0)
+
+
+class StreamingVAD:
+    """Speech decisions per live chunk with hysteresis and hangover
+
+    Frames run across chunk boundaries, so decisions do not depend on the
+    chunk size. Also keeps the session's full and bypassed chunk CPU times.
+    """
+
+    def __init__(self, sample_rate: int, onset_db: float = 9.0, offset_db: float = 4.0,
+                 hangover_ms: float = 400.0):
+        self.sample_rate = sample_rate
+        self.configure(onset_db, offset_db, hangover_ms)
+        self.reset()
+
+    def configure(self, onset_db: float, offset_db: float, hangover_ms: float):
+        self.onset = 10 ** (onset_db / 10)
+        self.offset = 10 ** (min(offset_db, onset_db) / 10)
+        self.hangover = max(int(round(hangover_ms * self.sample_rate / 1000 / HOP_LENGTH)), 0)
+        self.floor_rise = 10 ** (NOISE_FLOOR_RISE_DB_PER_S / 10 * HOP_LENGTH / self.sample_rate)
+
+    def reset(self):
+        self._tail = np.zeros(0, dtype=AUDIO_DTYPE)  # samples not yet in a complete frame hop
+        self.noise_floor: Optional[float] = None  # mean square
+        self._active = False
+        self._since_speech = 1 << 30  # frames since the last speech frame
+        self.speech = False
+        self.rng = np.random.default_rng()
+        self.full_chunks = 0
+        self.full_seconds = 0.0
+        self.bypassed_chunks = 0
+        self.bypassed_seconds = 0.0
+
+    def is_speech(self, audio: np.ndarray) -> bool:
+        """Whether the chunk holds speech or lies within the hangover of it"""
+        samples = np.concatenate([self._tail, to_mono(audio)])
+        if len(samples) < FRAME_LENGTH:
+            self._tail = samples
+            return self.speech
+        frames = frame_signal(samples)
+        self._tail = samples[len(frames) * HOP_LENGTH:]
+        energy = frame_energy(frames) / FRAME_LENGTH
+        if self.noise_floor is None:
+            self.noise_floor = max(float(energy.min()), MIN_NOISE_FLOOR)
+
+        # Speech switches on at onset frames and off at frames under the offset; others keep the state
+        onset = (energy > self.noise_floor * self.onset) & (energy > MIN_SPEECH_ENERGY)
+        switches = onset | (energy <= self.noise_floor * self.offset)
+        positions = np.arange(len(energy))
+        last_switch = np.maximum.accumulate(np.where(switches, positions, -1))
+        active = np.where(last_switch >= 0, onset[np.maximum(last_switch, 0)], self._active)
+
+        # Hangover: frames within `hangover` of a speech frame still count
+        last_speech = np.maximum.accumulate(np.where(active, positions, -1 - self._since_speech))
+        since_speech = positions - last_speech
+        self._active = bool(active[-1])
+        self._since_speech = int(since_speech[-1])
+        self.speech = bool((since_speech <= self.hangover).any())
+
+        # Minimum tracking: the floor rises slowly and drops to any quieter frame
+        self.noise_floor = max(min(self.noise_floor * self.floor_rise ** len(energy), float(energy.min())),
+                               MIN_NOISE_FLOOR)
+        return self.speech
+
+    def record(self, bypassed: bool, seconds: float):
+        if bypassed:
+            self.bypassed_chunks += 1
+            self.bypassed_seconds += seconds
+        else:
+            self.full_chunks += 1
+            self.full_seconds += seconds
+
+    def get_stats(self) -> dict:
+        """Chunk counts, mean CPU time per chunk and the CPU the bypass saved
+
+        The saving assumes a bypassed chunk would have cost the mean full
+        chunk; it is None until a chunk has gone through the full chain.
+        """
+        full_mean = self.full_seconds / self.full_chunks if self.full_chunks else None
+        bypassed_mean = self.bypassed_seconds / self.bypassed_chunks if self.bypassed_chunks else None
+        saved = None
+        if full_mean is not None:
+            saved = max(self.bypassed_chunks * full_mean - self.bypassed_seconds, 0.0)
+        return {
+            'speech': self.speech,
+            'full_chunks': self.full_chunks,
+            'bypassed_chunks': self.bypassed_chunks,
+            'full_chunk_ms': full_mean * 1000.0 if full_mean is not None else None,
+            'bypassed_chunk_ms': bypassed_mean * 1000.0 if bypassed_mean is not None else None,
+            'cpu_seconds_saved': saved,
+        }
+
+
+def get_vad(state, sample_rate: int, settings: Optional[dict] = None) -> StreamingVAD:
+    """The session's VAD, created on first use and kept in sync with `settings`"""
+    settings = settings or {}
+    params = (settings.get('vad_onset_db', 9.0), settings.get('vad_offset_db', 4.0),
+              settings.get('vad_hangover_ms', 400.0))
+    if state.vad is None:
+        state.vad = StreamingVAD(sample_rate, *params)
+    else:
+        state.vad.configure(*params)
+    return state.vad
+
+
+def skip_silence(audio: np.ndarray, state):
+    """Keep the session's stages consistent across a chunk that bypasses them"""
+    state.oscillators.advance(num_samples(audio))
+    for engine in state.noise_engines.values():
+        engine.skip(audio)
+    if state.effect_tail is not None:
+        state.effect_tail.reset()
+
+
+def bypass_silence(audio: np.ndarray, state, settings: Optional[dict] = None,
+                   out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Near-free output for a chunk without speech, keeping the session's stages consistent"""
+    settings = settings or {}
+    skip_silence(audio, state)
+
+    gain = AUDIO_DTYPE(10 ** (settings.get('silence_gain_db', -20.0) / 20))
+    if settings.get('silence_mode', 'attenuate') == 'comfort_noise' and state.vad is not None:
+        # White noise at the tracked noise floor
+        level = np.sqrt(state.vad.noise_floor or 0.0) * gain
+        noise = state.vad.rng.standard_normal(audio.shape, dtype=AUDIO_DTYPE)
+        return np.multiply(noise, AUDIO_DTYPE(level), out=out)
+    return np.multiply(audio, gain, out=out)
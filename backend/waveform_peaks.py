@@ -0,0 +1,203 @@
+"""
+Waveform Peaks Module
+Multi-resolution min/max/RMS peak pyramids for drawing processed results
+
+Level 0 summarizes BASE_BLOCK samples per peak; every level above it merges
+DECIMATION peaks of the level below, until a level has fewer than MIN_PEAKS.
+A pyramid costs about 1/BASE_BLOCK of the audio it describes, so the UI can
+draw an hour-long file, or zoom into any range of it, from a few kilobytes
+instead of decoding the whole result.
+
+Pyramids are built from the processed buffer right before it is encoded and
+saved to PEAKS_DIR under a random id returned with the result.
+"""
+
+import os
+import re
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE
+from resampling import num_samples
+
+PEAKS_DIR = Path(os.environ.get('PEAKS_DIR', Path(__file__).parent / 'peaks'))
+PEAKS_MAX_FILES = int(os.environ.get('PEAKS_MAX_FILES', 500))  # oldest pyramids are pruned beyond this
+BASE_BLOCK = 256  # samples per peak at level 0
+DECIMATION = 4  # peaks of one level merged into each peak of the next
+MIN_PEAKS = 64  # no level is built with fewer peaks than this
+DEFAULT_WIDTH = 1000  # peaks wanted when neither level nor width is given
+
+_PEAKS_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class PeakLevel:
+    """Per-channel min, max and mean square of consecutive blocks"""
+
+    def __init__(self, block: int, minimum: np.ndarray, maximum: np.ndarray,
+                 mean_square: np.ndarray, counts: np.ndarray):
+        self.block = block  # samples per peak
+        self.min = minimum  # (channels, peaks)
+        self.max = maximum
+        self.mean_square = mean_square
+        self.counts = counts  # samples per peak; only the last one can be short
+
+    @property
+    def num_peaks(self) -> int:
+        return self.min.shape[-1]
+
+    def merge(self, factor: int) -> 'PeakLevel':
+        """The next level: every `factor` peaks merged into one"""
+        pad = -self.num_peaks % factor
+        channels = self.min.shape[0]
+
+        def grouped(values, fill):
+            if pad:
+                values = np.concatenate([values, np.full(values.shape[:-1] + (pad,), fill, values.dtype)], axis=-1)
+            return values.reshape(values.shape[:-1] + (-1, factor))
+
+        counts = grouped(self.counts, 0)
+        total = counts.sum(axis=-1)
+        weighted = grouped(self.mean_square * self.counts, 0).sum(axis=-1)
+        return PeakLevel(
+            self.block * factor,
+            grouped(self.min, np.inf).min(axis=-1),
+            grouped(self.max, -np.inf).max(axis=-1),
+            (weighted / np.maximum(total, 1)).astype(AUDIO_DTYPE).reshape(channels, -1),
+            total
+        )
+
+
+class PeakPyramid:
+    """All levels of one result"""
+
+    def __init__(self, sample_rate: int, num_samples: int, levels: List[PeakLevel]):
+        self.sample_rate = sample_rate
+        self.num_samples = num_samples
+        self.levels = levels
+
+    @property
+    def channels(self) -> int:
+        return self.levels[0].min.shape[0]
+
+    def choose_level(self, start: int, end: int, width: int) -> int:
+        """Coarsest level that still has at least `width` peaks in [start, end)"""
+        for index in range(len(self.levels) - 1, 0, -1):
+            if (end - start) / self.levels[index].block >= width:
+                return index
+        return 0
+
+    def query(self, start: float = 0.0, end: Optional[float] = None, level: Optional[int] = None,
+              width: Optional[int] = None) -> Dict:
+        """Peaks covering [start, end) seconds at `level`, or at the level that fits `width`
+
+        The returned range is widened to whole peaks.
+        """
+        start_sample = min(max(int(start * self.sample_rate), 0), self.num_samples)
+        end_sample = self.num_samples if end is None else int(end * self.sample_rate)
+        end_sample = min(max(end_sample, start_sample), self.num_samples)
+        if level is None:
+            level = self.choose_level(start_sample, end_sample, width or DEFAULT_WIDTH)
+        if not 0 <= level < len(self.levels):
+            raise ValueError(f"level must be between 0 and {len(self.levels) - 1}")
+
+        peaks = self.levels[level]
+        first = start_sample // peaks.block
+        last = max(-(-end_sample // peaks.block), first)
+
+        def values(array):
+            return np.round(array[:, first:last].astype(np.float64), 4).tolist()
+
+        return {
+            'sample_rate': self.sample_rate,
+            'duration': self.num_samples / self.sample_rate,
+            'channels': self.channels,
+            'levels': len(self.levels),
+            'level': level,
+            'samples_per_peak': peaks.block,
+            'start': first * peaks.block / self.sample_rate,
+            'end': min(last * peaks.block, self.num_samples) / self.sample_rate,
+            'min': values(peaks.min),
+            'max': values(peaks.max),
+            'rms': values(np.sqrt(peaks.mean_square)),
+        }
+
+    def save(self, path: Path):
+        arrays = {'info': np.array([self.sample_rate, self.num_samples], dtype=np.int64)}
+        for index, level in enumerate(self.levels):
+            arrays[f'min_{index}'] = level.min
+            arrays[f'max_{index}'] = level.max
+            arrays[f'mean_square_{index}'] = level.mean_square
+            arrays[f'counts_{index}'] = level.counts
+        with open(path, 'wb') as file:
+            np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> 'PeakPyramid':
+        with np.load(path) as data:
+            sample_rate, total = (int(value) for value in data['info'])
+            levels = []
+            block = BASE_BLOCK
+            while f'min_{len(levels)}' in data:
+                index = len(levels)
+                levels.append(PeakLevel(block, data[f'min_{index}'], data[f'max_{index}'],
+                                        data[f'mean_square_{index}'], data[f'counts_{index}']))
+                block *= DECIMATION
+        return cls(sample_rate, total, levels)
+
+
+def build_pyramid(audio: np.ndarray, sample_rate: int) -> PeakPyramid:
+    """Peak pyramid of a (samples,) or (channels, samples) buffer"""
+    frames = np.atleast_2d(audio)
+    length = num_samples(frames)
+    full = length // BASE_BLOCK * BASE_BLOCK
+
+    blocks = frames[:, :full].reshape(frames.shape[0], -1, BASE_BLOCK)
+    minimum, maximum = blocks.min(axis=-1), blocks.max(axis=-1)
+    mean_square = np.einsum('cbs,cbs->cb', blocks, blocks) / BASE_BLOCK
+    counts = np.full(blocks.shape[1], BASE_BLOCK, dtype=np.int64)
+    if full < length:
+        tail = frames[:, full:]
+        minimum = np.concatenate([minimum, tail.min(axis=-1, keepdims=True)], axis=-1)
+        maximum = np.concatenate([maximum, tail.max(axis=-1, keepdims=True)], axis=-1)
+        mean_square = np.concatenate([mean_square, np.mean(np.square(tail), axis=-1, keepdims=True)], axis=-1)
+        counts = np.append(counts, length - full)
+
+    levels = [PeakLevel(BASE_BLOCK, minimum.astype(AUDIO_DTYPE), maximum.astype(AUDIO_DTYPE),
+                        mean_square.astype(AUDIO_DTYPE), counts)]
+    while levels[-1].num_peaks >= MIN_PEAKS * DECIMATION:
+        levels.append(levels[-1].merge(DECIMATION))
+    return PeakPyramid(sample_rate, length, levels)
+
+
+def _prune():
+    paths = sorted(PEAKS_DIR.glob('*.npz'), key=lambda path: path.stat().st_mtime)
+    for path in paths[:max(len(paths) - PEAKS_MAX_FILES, 0)]:
+        path.unlink(missing_ok=True)
+
+
+def save_peaks(audio: np.ndarray, sample_rate: int) -> str:
+    """Build and store the pyramid of a processed result; returns its id"""
+    peaks_id = uuid.uuid4().hex
+    PEAKS_DIR.mkdir(parents=True, exist_ok=True)
+    build_pyramid(audio, sample_rate).save(PEAKS_DIR / f"{peaks_id}.npz")
+    _prune()
+    return peaks_id
+
+
+@lru_cache(maxsize=32)
+def _load(path: Path) -> PeakPyramid:
+    return PeakPyramid.load(path)
+
+
+def get_peaks(peaks_id: str) -> Optional[PeakPyramid]:
+    """Stored pyramid, or None for unknown, pruned or malformed ids"""
+    if not _PEAKS_ID.match(peaks_id):
+        return None
+    path = PEAKS_DIR / f"{peaks_id}.npz"
+    if not path.exists():
+        return None
+    return _load(path)
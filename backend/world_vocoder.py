@@ -0,0 +1,205 @@
+"""
+WORLD Vocoder Module
+Pitch and formant shifting from a single WORLD analysis (pyworld)
+
+The librosa path shifts pitch (STFT, time-stretch, resample) and then warps
+formants (another STFT/ISTFT), two full analysis/synthesis passes. Here the
+input is analysed once into F0, spectral envelope and aperiodicity; the pitch
+ratio scales F0 and the formant ratio warps the envelope along frequency,
+both plain array operations, and the result is synthesised once.
+
+Analyses are cached by input content, so re-rendering the same audio with
+other parameters only runs synthesis. Unlike librosa's pitch shift, WORLD keeps
+the spectral envelope in place when F0 moves: formants move only by the
+formant ratio.
+
+WORLD is for whole buffers (uploads, upload sessions, segments). Live
+sessions ignore the 'world' engine and shift with librosa: each chunk would
+be analysed cold, with nothing to reuse and artefacts at every chunk edge.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from dtype_policy import AUDIO_DTYPE, as_audio
+
+try:
+    import pyworld
+    PYWORLD_AVAILABLE = True
+except ImportError:
+    PYWORLD_AVAILABLE = False
+
+PITCH_ENGINES = ('librosa', 'world')
+DEFAULT_PITCH_ENGINE = 'librosa'
+FRAME_PERIOD_MS = 5.0
+# Analyses kept by the server process; pool workers keep none (see disable_process_cache)
+WORLD_CACHE_SIZE = int(os.environ.get('WORLD_CACHE_SIZE', 8))
+# Envelope and aperiodicity are 2 x frames x (fft_size/2 + 1) float64: ~100 MB per minute at 16 kHz
+WORLD_CACHE_MAX_BYTES = int(os.environ.get('WORLD_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# (f0, spectral envelope, aperiodicity) of one channel
+ChannelParameters = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class WorldAnalysis:
+    """WORLD parameters of a (samples,) or (channels, samples) buffer"""
+
+    def __init__(self, sample_rate: int, length: int, channels: List[ChannelParameters], mono: bool):
+        self.sample_rate = sample_rate
+        self.length = length
+        self.channels = channels
+        self.mono = mono
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for parameters in self.channels for array in parameters)
+
+
+def analyze(audio: np.ndarray, sample_rate: int, frame_period: float = FRAME_PERIOD_MS) -> WorldAnalysis:
+    """F0 (DIO refined by StoneMask), CheapTrick envelope and D4C aperiodicity per channel"""
+    frames = np.atleast_2d(audio)
+    channels = []
+    for channel in frames:
+        # pyworld works in float64
+        samples = np.ascontiguousarray(channel, dtype=np.float64)
+        f0, times = pyworld.dio(samples, sample_rate, frame_period=frame_period)
+        f0 = pyworld.stonemask(samples, f0, times, sample_rate)
+        envelope = pyworld.cheaptrick(samples, f0, times, sample_rate)
+        aperiodicity = pyworld.d4c(samples, f0, times, sample_rate)
+        channels.append((f0, envelope, aperiodicity))
+    return WorldAnalysis(sample_rate, frames.shape[-1], channels, mono=audio.ndim == 1)
+
+
+def warp_envelope(envelope: np.ndarray, ratio: float) -> np.ndarray:
+    """Move the envelope at bin b to bin b * ratio for every frame
+
+    Bins whose source lies past Nyquist hold the last bin, as in the STFT
+    formant shift.
+    """
+    num_bins = envelope.shape[-1]
+    source = np.minimum(np.arange(num_bins) / ratio, num_bins - 1)
+    lower = np.minimum(source.astype(np.intp), num_bins - 2)
+    frac = source - lower
+    return envelope[:, lower] * (1.0 - frac) + envelope[:, lower + 1] * frac
+
+
+def synthesize(analysis: WorldAnalysis, pitch_ratio: float = 1.0, formant_ratio: float = 1.0,
+               frame_period: float = FRAME_PERIOD_MS) -> np.ndarray:
+    """Resynthesise with F0 scaled by `pitch_ratio` and formants by `formant_ratio`"""
+    output = np.zeros((len(analysis.channels), analysis.length), dtype=AUDIO_DTYPE)
+    for index, (f0, envelope, aperiodicity) in enumerate(analysis.channels):
+        if formant_ratio != 1.0:
+            envelope = np.ascontiguousarray(warp_envelope(envelope, formant_ratio))
+        # Unvoiced frames have f0 == 0 and stay unvoiced
+        synthesized = pyworld.synthesize(f0 * pitch_ratio, envelope, aperiodicity,
+                                         analysis.sample_rate, frame_period=frame_period)
+        length = min(len(synthesized), analysis.length)
+        output[index, :length] = synthesized[:length]
+    return output[0] if analysis.mono else output
+
+
+class WorldAnalysisCache:
+    """LRU of analyses keyed by the content, shape and rate of the input
+
+    Bounded by entry count and total bytes; an analysis larger than the byte
+    bound is returned without being cached.
+    """
+
+    def __init__(self, max_entries: int = WORLD_CACHE_SIZE, max_bytes: int = WORLD_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, WorldAnalysis]' = OrderedDict()
+        self._nbytes = 0  # kept under the lock, so readers never iterate the entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(audio: np.ndarray, sample_rate: int) -> str:
+        digest = hashlib.blake2b(np.ascontiguousarray(audio).data, digest_size=16)
+        digest.update(f"{audio.shape}:{audio.dtype}:{sample_rate}".encode())
+        return digest.hexdigest()
+
+    def get(self, audio: np.ndarray, sample_rate: int) -> Optional[WorldAnalysis]:
+        """The cached analysis of `audio`, or None without analysing it"""
+        return self._lookup(self.key(audio, sample_rate))
+
+    def get_or_analyze(self, audio: np.ndarray, sample_rate: int) -> WorldAnalysis:
+        key = self.key(audio, sample_rate)
+        analysis = self._lookup(key)
+        if analysis is not None:
+            return analysis
+        # Analyse outside the lock; two threads may analyse the same input once each
+        analysis = analyze(audio, sample_rate)
+        self._store(key, analysis)
+        return analysis
+
+    def _lookup(self, key: str) -> Optional[WorldAnalysis]:
+        with self._lock:
+            analysis = self._entries.get(key)
+            if analysis is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return analysis
+
+    def put(self, audio: np.ndarray, sample_rate: int, analysis: WorldAnalysis):
+        """Seed the cache with an analysis of `audio` made elsewhere"""
+        self._store(self.key(audio, sample_rate), analysis)
+
+    def _store(self, key: str, analysis: WorldAnalysis):
+        if analysis.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._entries[key] = analysis
+            self._nbytes += analysis.nbytes
+            while len(self._entries) > self.max_entries or self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+
+analysis_cache = WorldAnalysisCache()
+
+
+def disable_process_cache():
+    """Stop caching analyses in this process's `analysis_cache`
+
+    For pool workers: segments are cut anew for each request, so a worker
+    would never see its input again and each worker would hold its own
+    WORLD_CACHE_MAX_BYTES. Their callers pass a cache in the state instead.
+    """
+    analysis_cache.max_entries = analysis_cache.max_bytes = 0
+    analysis_cache.clear()
+
+
+def shift_pitch_and_formants(audio: np.ndarray, sample_rate: int, semitones: float = 0.0,
+                             formant_ratio: float = 1.0,
+                             cache: Optional[WorldAnalysisCache] = analysis_cache) -> np.ndarray:
+    """Pitch shift by `semitones` and formant warp by `formant_ratio` in one synthesis
+
+    Pass `cache=None` for audio that will not be seen again.
+    """
+    audio = as_audio(audio)
+    if cache is not None:
+        analysis = cache.get_or_analyze(audio, sample_rate)
+    else:
+        analysis = analyze(audio, sample_rate)
+    return synthesize(analysis, 2.0 ** (semitones / 12.0), formant_ratio)
@@ -197,6 +197,7 @@ function App() {
   const mediaRecorderRef = useRef(null);
   const audioContextRef = useRef(null);
   const websocketRef = useRef(null);
+  const frameSeqRef = useRef(0);
   const streamRef = useRef(null);
   const analyserRef = useRef(null);
   const audioChunksRef = useRef([]);
@@ -427,7 +428,9 @@ function App() {
               
               websocketRef.current.send(JSON.stringify({
                 type: 'audio_data',
-                audio_data: audioBase64
+                audio_data: audioBase64,
+                seq: frameSeqRef.current++,
+                capture_ts: performance.now()
               }));
         }
       };
@@ -565,28 +568,24 @@ function App() {
       
       console.log('Uploading audio blob, size:', audioBlob.size, 'bytes');
       
-      const apiResponse = await axios.post(`${API}/process-audio-enhanced`, formData, {
+      // The WAV itself rather than base64 in JSON; failures come back as HTTP errors
+      const apiResponse = await axios.post(`${API}/process-audio-enhanced?format=wav`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
-        responseType: 'json'
+        responseType: 'blob'
       });
       
-      if (apiResponse.data.success) {
-        const audioBytes = Uint8Array.from(atob(apiResponse.data.audio_data), c => c.charCodeAt(0));
-        const processedAudioBlob = new Blob([audioBytes], { type: 'audio/wav' });
-        
-        // Create a new blob URL for the processed audio
-        const processedAudioUrl = URL.createObjectURL(processedAudioBlob);
-        setRecordedAudio(processedAudioUrl);
-        
-        // Store processed audio for comparison
-        setProcessedAudio(processedAudioUrl);
-        setShowComparison(true); // Show comparison after processing
-        
-        console.log('Audio processed successfully, size:', processedAudioBlob.size, 'bytes');
-        console.log('Processed audio URL:', processedAudioUrl);
-      } else {
-        alert('Error processing recording: ' + apiResponse.data.message);
-      }
+      const processedAudioBlob = apiResponse.data;
+      
+      // Create a new blob URL for the processed audio
+      const processedAudioUrl = URL.createObjectURL(processedAudioBlob);
+      setRecordedAudio(processedAudioUrl);
+      
+      // Store processed audio for comparison
+      setProcessedAudio(processedAudioUrl);
+      setShowComparison(true); // Show comparison after processing
+      
+      console.log('Audio processed successfully, size:', processedAudioBlob.size, 'bytes');
+      console.log('Processed audio URL:', processedAudioUrl);
     } catch (error) {
       console.error('Error processing recording:', error);
       alert('Error processing recording. Please try again.');
@@ -731,7 +730,8 @@ function App() {
       
       const response = await axios.post(endpoint, formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
-        responseType: uploadedFile.type.startsWith('video/') ? 'blob' : 'json'
+        params: uploadedFile.type.startsWith('video/') ? {} : { format: 'wav' },
+        responseType: 'blob'
       });
       
       if (uploadedFile.type.startsWith('video/')) {
@@ -739,16 +739,9 @@ function App() {
         const videoUrl = URL.createObjectURL(videoBlob);
         setUploadedProcessedAudio(videoUrl);
       } else {
-        if (response.data.success) {
-          const audioBlob = new Blob([
-            Uint8Array.from(atob(response.data.audio_data), c => c.charCodeAt(0))
-          ], { type: 'audio/wav' });
-          const audioUrl = URL.createObjectURL(audioBlob);
-          setUploadedProcessedAudio(audioUrl);
-          setProcessingTime(response.data.processing_time || 0);
-        } else {
-          alert('Error processing file: ' + response.data.message);
-        }
+        const audioUrl = URL.createObjectURL(response.data);
+        setUploadedProcessedAudio(audioUrl);
+        setProcessingTime(parseFloat(response.headers['x-processing-time']) || 0);
       }
     } catch (error) {
       console.error('Error processing file:', error);